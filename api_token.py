@@ -0,0 +1,43 @@
+import os
+import secrets
+from getpass import getuser
+from pathlib import Path
+from tempfile import gettempdir
+
+
+def default_path() -> Path:
+    return Path(gettempdir()) / f'better-mute-{getuser()}.api-token'
+
+
+def _check_owner(fd: int, path: Path):
+    # The temp directory may be shared, a file someone else planted there is not our token
+    if not hasattr(os, 'getuid'):
+        return
+    st = os.fstat(fd)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('%s is not owned by and private to the current user' % path)
+
+
+def load(create: bool=False, path: Path | None=None) -> str | None:
+    # Created on first use when `create` is set; raises PermissionError for a file someone else owns or can read
+    path = default_path() if path is None else Path(path)
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except FileNotFoundError:
+        if not create:
+            return None
+    else:
+        with os.fdopen(fd, 'r') as f:
+            _check_owner(f.fileno(), path)
+            token = f.read().strip()
+        # Empty when the process that created it died before writing
+        if token or not create:
+            return token or None
+        path.unlink()
+
+    token = secrets.token_hex(16)
+    # Fails if the file appeared since, rather than writing into someone else's
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
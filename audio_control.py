@@ -1,15 +1,34 @@
 import logging
+import os
 import threading
 from time import time
-from typing import Callable, Dict, List, Tuple, Type
-from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume, IAudioEndpointVolumeCallback, IMMNotificationClient, EDataFlow, ERole, IMMDevice, AUDIO_VOLUME_NOTIFICATION_DATA, IAudioMeterInformation
-from comtypes import COMObject, CLSCTX_ALL, CoInitializeEx, CoUninitialize, COINIT_MULTITHREADED, GUID
-
+from typing import Callable, Dict, List, Mapping, Tuple, Type
+
+if os.environ.get('BETTER_MUTE_BACKEND') == 'sim':
+    from sim_backend import AudioUtilities, IAudioEndpointVolume, IAudioEndpointVolumeCallback, IMMNotificationClient, EDataFlow, ERole, IMMDevice, AUDIO_VOLUME_NOTIFICATION_DATA, IAudioMeterInformation
+    from sim_backend import COMObject, CLSCTX_ALL, CoInitializeEx, CoUninitialize, COINIT_MULTITHREADED, GUID
+else:
+    from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume, IAudioEndpointVolumeCallback, IMMNotificationClient, EDataFlow, ERole, IMMDevice, AUDIO_VOLUME_NOTIFICATION_DATA, IAudioMeterInformation
+    from comtypes import COMObject, CLSCTX_ALL, CoInitializeEx, CoUninitialize, COINIT_MULTITHREADED, GUID
+
+import event_trace
+import timeline
+import tracing
 from commons import MicStatus
+from device_guard import CLOSED, CONFIG as GUARD_CONFIG, METRICS as GUARD_METRICS, DeviceGuard, DeviceTimeout, DeviceUnavailable, use_deadline
+from device_table import SnapshotTable
+from gain_ramp import CONFIG as RAMP_CONFIG, Ramp, RampScheduler
+from listeners import IntervalRequests, ListenerSet, PeriodicWorker, StateSync
+from reconcile import MuteReconciler, ReconcileResult
+from settings import Settings
+from state_cache import RampVolumes, StateCache
 
 
 AUDIO_CONTROLLER_EVENT_GUID = GUID("{E005B3BF-A746-4300-9939-E1BBCC94C6C1}")
+# Volume steps of a mute ramp, not status changes
+RAMP_EVENT_GUID = GUID("{E005B3BF-A746-4300-9939-E1BBCC94C6C2}")
 EMPTY_DEVICE_ID = '{0.0.0.00000000}.{c424cab4-9985-4b21-b259-ffffffffffff}'
+LEVEL_POLLING_INTERVAL = 0.1
 
 def strip_guid(input: str) -> str:
     # Split by the last dot and take the second part
@@ -19,6 +38,11 @@ def strip_guid(input: str) -> str:
     guid = guid.split('-')[-1]
     return guid
 
+def _init_worker():
+    # Our own background loops must keep going past a hung device, their device calls run under the deadline
+    CoInitializeEx(COINIT_MULTITHREADED)
+    use_deadline()
+
 class _VolumeCallback(COMObject):
     _com_interfaces_ = [IAudioEndpointVolumeCallback]
 
@@ -26,23 +50,32 @@ class _VolumeCallback(COMObject):
         super().__init__()
         self.callback = callback
         self.dev_id = dev_id
-        self.logger = logging.getLogger(str(self))
+        # Last mute state reported by the device, whoever changed it
+        self.muted: bool | None = None
+        # Correlation id of our last write, its notification arrives on a COM thread
+        self.cid = 0
+        # One shared logger, a logger per device id is never freed
+        self.logger = logging.getLogger('VolumeCallback')
 
     def OnNotify(self, pNotify):
         notification_data: Type[AUDIO_VOLUME_NOTIFICATION_DATA] = pNotify.contents
         
         bMuted           = notification_data.bMuted
         guidEventContext = notification_data.guidEventContext
+        self.muted = bool(bMuted)
+
+        event_trace.record_volume_notify(self.dev_id, bMuted, guidEventContext == AUDIO_CONTROLLER_EVENT_GUID)
         
         if guidEventContext != AUDIO_CONTROLLER_EVENT_GUID:
             return
         
-        self.logger.debug('OnNotify (pNotify.bMuted=%s)', bMuted)
+        self.logger.debug('%s OnNotify (pNotify.bMuted=%s)', self, bMuted)
 
-        try:
-            self.callback()
-        except Exception as e:
-            self.logger.error('OnNotify:', exc_info=e)
+        with tracing.adopt(self.cid), tracing.span('device.OnNotify', muted=bool(bMuted)):
+            try:
+                self.callback()
+            except Exception as e:
+                self.logger.error('%s OnNotify:', self, exc_info=e)
     
     def destroy(self):
         self.callback = None
@@ -64,6 +97,8 @@ class _DeviceCallback(COMObject):
     def OnDefaultDeviceChanged(self, flow, role, pwstrDefaultDeviceId):
         if flow != EDataFlow.eCapture.value:
             return
+
+        event_trace.record_device_changed(role, pwstrDefaultDeviceId)
         
         self.logger.debug('OnDefaultDeviceChanged (flow=%s, role=%s, id=%s)', EDataFlow(flow), ERole(role), pwstrDefaultDeviceId)
 
@@ -95,21 +130,31 @@ class _DeviceCallback(COMObject):
         self.callback = None
 
 DEVICE_CALLBACK = _DeviceCallback(None)
+RAMPS = RampScheduler(setup=lambda: CoInitializeEx(COINIT_MULTITHREADED), teardown=CoUninitialize)
+RAMP_VOLUMES = RampVolumes()
 
 class Device:
     def __init__(self, dev: IMMDevice | None):
         self._id = EMPTY_DEVICE_ID
         self._destroyed = True
         self._volume_callback: Type[_VolumeCallback] = None
+        self._guard: DeviceGuard | None = None
+        # A running mute ramp, the mute state it ends in and the volume it leaves behind
+        self._ramp: Ramp | None = None
+        self._ramp_muted = False
+        self._ramp_volume = 1.0
+        self._ramp_lock = threading.Lock()
 
         if dev is not None:
             self._dev: Type[IMMDevice] = dev
             self._id = dev.GetId()
             self._control: Type[IAudioEndpointVolume] = dev.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None).QueryInterface(IAudioEndpointVolume)
             self._meter: Type[IAudioMeterInformation] = dev.Activate(IAudioMeterInformation._iid_, CLSCTX_ALL, None).QueryInterface(IAudioMeterInformation)
+            # Every endpoint call runs under a deadline, a hanging driver only degrades this device
+            self._guard = DeviceGuard(strip_guid(self._id), setup=lambda: CoInitializeEx(COINIT_MULTITHREADED), teardown=CoUninitialize)
             self._destroyed = False
         
-        self.logger = logging.getLogger(str(self))
+        self.logger = logging.getLogger('Device')
     
     @property
     def id(self):
@@ -120,54 +165,179 @@ class Device:
         pass
     
     def mute(self):
-        self.logger.debug('mute()')
-        self._control.SetMute(1, AUDIO_CONTROLLER_EVENT_GUID)
+        self.logger.debug('%s mute()', self)
+        if RAMP_CONFIG.duration:
+            self._ramp_to(True)
+            return
+        self._write_mute(True)
 
     def unmute(self):
-        self.logger.debug('unmute()')
-        self._control.SetMute(0, AUDIO_CONTROLLER_EVENT_GUID)
-    
-    def toggle(self):
-        self.logger.debug('toggle()')
-        if self._dev.GetMute():
-            self.unmute()
+        self.logger.debug('%s unmute()', self)
+        if RAMP_CONFIG.duration:
+            self._ramp_to(False)
+            return
+        self._write_mute(False)
+
+    def _write_mute(self, muted: bool):
+        callback = self._volume_callback
+        if callback is not None:
+            callback.cid = tracing.current()
+        with tracing.span('device.SetMute', muted=muted):
+            self._guard.call(self._control.SetMute, int(muted), AUDIO_CONTROLLER_EVENT_GUID)
+        self._cache_muted(muted)
+
+    def _cache_muted(self, muted: bool):
+        # The device took the write, its OnNotify may come later
+        callback = self._volume_callback
+        if callback is not None:
+            callback.muted = muted
+
+    def _set_volume(self, level: float):
+        self._guard.call(self._control.SetMasterVolumeLevelScalar, level, RAMP_EVENT_GUID)
+
+    def _ramp_to(self, muted: bool):
+        # Fades the master volume instead of switching; mid-ramp the device reports the state it is heading to
+        duration = RAMP_CONFIG.duration
+        while True:
+            with self._ramp_lock:
+                ramp = self._ramp
+                if ramp is None:
+                    self._start_ramp(muted, duration)
+                    break
+                if self._ramp_muted == muted:
+                    return
+                # Turned around from the current level, at the same speed
+                target = 0.0 if muted else self._ramp_volume
+                distance = abs(target - ramp.level) / self._ramp_volume if self._ramp_volume else 0.0
+                if RAMPS.retarget(ramp, target, duration * distance):
+                    self._ramp_muted = muted
+                    break
+            # It ended just now, start over once it has settled
+            ramp.finished.wait()
+        self._notify_volume_callback()
+
+    def _start_ramp(self, muted: bool, duration: float):
+        if bool(self._guard.call(self._control.GetMute)) == muted:
+            return
+        volume = self._guard.call(self._control.GetMasterVolumeLevelScalar)
+        self._ramp_muted = muted
+        self._ramp_volume = volume
+        # On disk before the volume moves, the next load puts it back if we die mid-ramp
+        RAMP_VOLUMES.begin(self._id, volume)
+        if muted:
+            with tracing.span('device.ramp', muted=True):
+                self._ramp = RAMPS.start(self._set_volume, volume, 0.0, duration, self._ramp_done)
         else:
+            with tracing.span('device.ramp', muted=False):
+                self._set_volume(0.0)
+                self._guard.call(self._control.SetMute, 0, AUDIO_CONTROLLER_EVENT_GUID)
+                self._ramp = RAMPS.start(self._set_volume, 0.0, volume, duration, self._ramp_done)
+
+    def _ramp_done(self, ramp: Ramp):
+        with self._ramp_lock:
+            if self._ramp is not ramp:
+                return
+            self._ramp = None
+            try:
+                if self._ramp_muted:
+                    self._write_mute(True)
+                else:
+                    self._cache_muted(False)
+                self._set_volume(self._ramp_volume)
+                RAMP_VOLUMES.end(self._id)
+            except Exception as e:
+                self.logger.error('%s could not finish the mute ramp', self, exc_info=e)
+
+    def restore_volume(self, volume: float):
+        # Left behind by a ramp that never finished
+        self.logger.warning('%s restoring the volume of an unfinished mute ramp to %.2f', self, volume)
+        self._set_volume(volume)
+
+    def _notify_volume_callback(self):
+        # Ramp turns change the reported state without a SetMute
+        callback = None if self._volume_callback is None else self._volume_callback.callback
+        if callback is not None:
+            callback()
+    
+    def set_mute(self, muted: bool):
+        if muted:
             self.mute()
+        else:
+            self.unmute()
+
+    def toggle(self):
+        self.logger.debug('%s toggle()', self)
+        self.set_mute(not self.is_muted())
     
     def is_muted(self) -> bool:
-        return self._control.GetMute()
+        # Kept current by OnNotify and our own writes; the device is asked until the first notification,
+        # and while it is degraded so that it keeps showing as such
+        if self._ramp is not None:
+            return self._ramp_muted
+        callback = self._volume_callback
+        if callback is None or callback.muted is None or self._guard.breaker.state != CLOSED:
+            return self.read_muted()
+        return callback.muted
+
+    def read_muted(self) -> bool:
+        # Asks the device itself, to verify a write; the answer is kept for is_muted()
+        if self._ramp is not None:
+            return self._ramp_muted
+        callback = self._volume_callback
+        if callback is None:
+            with tracing.span('device.GetMute'):
+                return bool(self._guard.call(self._control.GetMute))
+        notified = callback.muted
+        with tracing.span('device.GetMute'):
+            muted = bool(self._guard.call(self._control.GetMute))
+        # A notification that arrived meanwhile is newer
+        if callback.muted is notified:
+            callback.muted = muted
+        return muted
     
     def set_volume_callback(self, callback: Callable[[bool], None]):
-        self.logger.debug('Register volume callback')
+        self.logger.debug('%s register volume callback', self)
         if self._volume_callback is not None:
             self._volume_callback.update(callback)
-            self.logger.info('Updated volume callback')
+            self.logger.info('%s updated volume callback', self)
         else:
-            self._volume_callback = _VolumeCallback(callback, self._id)
-            self._control.RegisterControlChangeNotify(self._volume_callback)
-            self.logger.info('Registered volume callback')
+            volume_callback = _VolumeCallback(callback, self._id)
+            # Only kept once registered, until then is_muted() asks the device and the next reload retries
+            self._guard.call(self._control.RegisterControlChangeNotify, volume_callback)
+            self._volume_callback = volume_callback
+            self.logger.info('%s registered volume callback', self)
     
     def has_volume_callback(self):
         return False if self._volume_callback is None else True
 
     def get_level(self) -> float:
-        return 0.0 if self.is_muted() else self._meter.GetPeakValue()
+        return 0.0 if self.is_muted() else self._guard.call(self._meter.GetPeakValue)
+
+    def health(self) -> dict:
+        return {'state': 'closed', 'failures': 0} if self._guard is None else self._guard.health()
 
     def destroy(self):
-        self.logger.debug('Destroying device')
+        self.logger.debug('Destroying %s', self)
+        ramp = self._ramp
+        if ramp is not None:
+            # Ends in the state it was heading to, with the volume put back
+            RAMPS.cancel(ramp)
+            self._ramp_done(ramp)
         if self._volume_callback is not None:
             try:
-                self._control.UnregisterControlChangeNotify(self._volume_callback)
+                self._guard.call(self._control.UnregisterControlChangeNotify, self._volume_callback)
             except Exception as e:
-                self.logger.error('Error unregistering callback', exc_info=e)
+                self.logger.error('%s error unregistering callback', self, exc_info=e)
             
             self._volume_callback = None
         
+        if self._guard is not None:
+            self._guard.close()
         self._control = None
         self._dev = None
         self._meter = None
         self._destroyed = True
-        self.logger.info('Destroyed device')
+        self.logger.info('Destroyed %s', self)
 
     def destroyed(self):
         return self._destroyed
@@ -201,22 +371,113 @@ class _AudioController:
     def __init__(self):
         self.logger = logging.getLogger('AudioController')
         self._started = False
-        self.devs: Dict[ERole, Device]  = {
+        # Readers work on an immutable snapshot, reloads swap in a new one under _devs_lock
+        self._devs: SnapshotTable[ERole, Device] = SnapshotTable({
             ERole.eCommunications: EMPTY_DEVICE,
             ERole.eMultimedia    : EMPTY_DEVICE,
             ERole.eConsole       : EMPTY_DEVICE
-        }
+        }, on_retire=self._retire_device, setup=lambda: CoInitializeEx(COINIT_MULTITHREADED), teardown=CoUninitialize)
         self._devs_lock = threading.Lock()
         # self._threads = []
-        self._level_listeners = set()
-        self._status_listeners = set()
-
+        self._level_last_log = 0
+        self._level_worker = PeriodicWorker('LevelNotifier', self.level_notifier, LEVEL_POLLING_INTERVAL,
+                                            setup=_init_worker, teardown=CoUninitialize)
+        # One sampler serves both the main level and the per-device levels
+        self._update_sampler = StateSync(self._sync_sampler)
+        self._level_listeners = ListenerSet('AudioController', on_first=self._update_sampler, on_last=self._update_sampler)
+        self._device_level_listeners = ListenerSet('AudioController', on_first=self._update_sampler, on_last=self._update_sampler)
+        self._level_intervals = IntervalRequests(LEVEL_POLLING_INTERVAL, self._set_sampler_interval)
+        self._status_listeners = ListenerSet('AudioController')
+        self._reconciler = MuteReconciler()
+        self._loaded = threading.Event()
+        # Device change notifications are coalesced per role and handled by one reload thread at a time
+        self._pending_reloads = set()
+        self._reload_lock = threading.Lock()
+        self._reload_thread: threading.Thread | None = None
+        self._reloads_idle = threading.Event()
+        self._reloads_idle.set()
+        # Endpoint lookups and activation, so a hanging driver cannot keep a reload in _devs_lock forever
+        self._endpoints = DeviceGuard('endpoints', setup=lambda: CoInitializeEx(COINIT_MULTITHREADED), teardown=CoUninitialize)
+        self._state_cache: StateCache | None = None
+        # Last run's statuses per role (None for the main one), until load() has seen the devices
+        self._provisional: Dict[ERole | None, MicStatus] | None = None
+
+    def warm_start(self, cache: StateCache | None=None) -> MicStatus | None:
+        # Status queries answer from the cache until load() is done, listeners get the real status as devices load
+        self._state_cache = StateCache() if cache is None else cache
+        provisional = {}
+        for name, entry in self._state_cache.load().items():
+            try:
+                provisional[ERole[name]] = MicStatus[entry['status']]
+            except KeyError:
+                continue
+        if not provisional:
+            return None
+        provisional[None] = next((provisional[role] for role in [ERole.eCommunications, ERole.eMultimedia, ERole.eConsole]
+                                  if provisional.get(role, MicStatus.DISABLED) != MicStatus.DISABLED), MicStatus.DISABLED)
+        self._provisional = provisional
+        self.logger.info('Warm start, provisional status %s', provisional[None])
+        return provisional[None]
+
+    def load(self):
         self.reload(ERole.eCommunications)
         self.reload(ERole.eMultimedia)
         self.reload(ERole.eConsole)
+        self._restore_ramp_volumes()
+        provisional, self._provisional = self._provisional, None
+        if self._state_cache is not None:
+            for role, dev in self.devs.items():
+                status = self._status(dev)
+                if provisional is not None and provisional.get(role) != status:
+                    self.logger.info('%s is %s, the cache had %s', role, status, provisional.get(role))
+                self._record_state(role, dev, status)
+        self._loaded.set()
+
+    def _restore_ramp_volumes(self):
+        volumes = RAMP_VOLUMES.load()
+        if not volumes:
+            return
+        for dev in {dev.id: dev for dev in self.devs.values() if not dev.destroyed()}.values():
+            if dev.id not in volumes:
+                continue
+            try:
+                dev.restore_volume(volumes[dev.id])
+                RAMP_VOLUMES.end(dev.id)
+            except Exception as e:
+                self.logger.warning('Could not restore the volume of %s', dev, exc_info=e)
+
+    def _record_state(self, role: ERole, dev: Device, status: MicStatus):
+        if self._state_cache is not None and self._provisional is None:
+            self._state_cache.record(role.name, None if dev.destroyed() else dev.id, status.name)
+
+    def save_state(self):
+        if self._state_cache is not None:
+            self._state_cache.save()
+
+    def load_async(self, start: bool=False, on_loaded: Callable[[], None] | None=None) -> threading.Thread:
+        # Device discovery on a worker, so the UI can come up in the meantime
+        def run():
+            CoInitializeEx(COINIT_MULTITHREADED)
+            try:
+                self.load()
+                if start:
+                    self.start()
+                if on_loaded is not None:
+                    on_loaded()
+            except Exception as e:
+                self.logger.error('Failed to load devices', exc_info=e)
+            CoUninitialize()
+
+        thread = threading.Thread(target=run, name='AudioLoader', daemon=True)
+        thread.start()
+        return thread
+
+    def wait_loaded(self, timeout: float | None=None) -> bool:
+        return self._loaded.wait(timeout)
 
-        self._level_start = False
-        self._level_notifier_thread = threading.Thread(target=self.level_notifier, daemon=True)
+    @property
+    def devs(self) -> Mapping[ERole, Device]:
+        return self._devs.current.devs
     
     def start(self):
         if self._started:
@@ -229,21 +490,55 @@ class _AudioController:
         AudioUtilities.GetDeviceEnumerator().RegisterEndpointNotificationCallback(DEVICE_CALLBACK)
 
         self.logger.debug('Registering volume change listeners')
-        for role, dev in self.devs.items():
+        with self._devs_lock:
+            devs = self.devs
+        for role, dev in devs.items():
             callback = self._update_status(role)
             if not dev.destroyed():
-                dev.set_volume_callback(callback)
+                self._register_callback(dev, callback)
             callback()
 
+    def stop(self):
+        # Undoes start() and releases every device, leaving no thread of this controller behind
+        if self._started:
+            self._started = False
+            self.logger.debug('Unregistering device change listener')
+            try:
+                AudioUtilities.GetDeviceEnumerator().UnregisterEndpointNotificationCallback(DEVICE_CALLBACK)
+            except Exception as e:
+                self.logger.warning('Could not unregister the device change listener', exc_info=e)
+            if DEVICE_CALLBACK.callback == self._update_device:
+                DEVICE_CALLBACK.destroy()
+        self._level_worker.stop()
+        self.wait_reloads()
+        with self._devs_lock:
+            devs = {id(dev): dev for dev in self.devs.values() if not dev.destroyed()}
+            self._devs.publish(dict.fromkeys(self.devs, EMPTY_DEVICE))
+            self._devs.retire(devs.values())
+        self._endpoints.close()
+
+    def _register_callback(self, dev: Device, callback: Callable[[], None]):
+        # One device that does not answer must not keep the others from being followed
+        try:
+            dev.set_volume_callback(callback)
+        except Exception as e:
+            self.logger.warning('Could not register the volume callback of %s, retried on the next reload', dev, exc_info=e)
+
     
     def _update_status(self, role: ERole) -> Callable[[bool], None]:
         def update(*_: bool):
+            if not self._status_listeners and not timeline.recording() and self._state_cache is None:
+                return
             status = self.status(role=role)
-            for listener in self._status_listeners:
-                try:
-                    listener(status)
-                except Exception as e:
-                    self.logger.error('Error calling status listener for %s update', role, exc_info=e)
+            if timeline.recording() or self._state_cache is not None:
+                # A device shared by several roles only calls back the role registered last
+                devs = self.devs
+                for other, dev in devs.items():
+                    if dev is devs[role]:
+                        timeline.record_status(other.value, status.value)
+                        self._record_state(other, dev, status)
+            if self._status_listeners:
+                self._status_listeners.notify(status)
         
         return update
     
@@ -255,94 +550,119 @@ class _AudioController:
         
         self.logger.info('Updating active %s microphone -> (%s)', role, id)
 
-        reload_thread = threading.Thread(target=self.reload_runner, args=(role,), daemon=True)
-        reload_thread.start()
+        with self._reload_lock:
+            # A role already waiting is reloaded once, from whatever is the default by then
+            self._pending_reloads.add(role)
+            if self._reload_thread is None:
+                self._reloads_idle.clear()
+                self._reload_thread = threading.Thread(target=self.reload_runner, name='AudioReloader', daemon=True)
+                self._reload_thread.start()
 
     def reload(self, role: ERole):
-        old_status = self.status(role=role)
-        if self.devs.get(role) is not None:
-            old_dev = self.devs.get(role)
-            if not old_dev.destroyed():
+        with self._devs_lock:
+            current = self.devs
+            old_dev = current.get(role)
+            old_status = self._status(old_dev)
+
+            try:
+                # Get new default id before creating device
+                new_dev_id = self._endpoints.call(Device.get_default_id, role)
+                for d in current.values():
+                    if not d.destroyed() and d.id == new_dev_id:
+                        self.logger.info('Reusing device (%s) as %s', new_dev_id, role)
+                        dev = d
+                        break
+                else:
+                    dev = self._endpoints.call(Device.from_default, role)
+                    self.logger.info('Initialized %s device (mic found: %s)', role, dev.id if bool(dev) else False)
+
+                if not dev.destroyed():
+                    # The new device follows the role's desired state, or the old device's if none was set yet
+                    if self._reconciler.apply([dev], role) is None:
+                        match old_status:
+                            case MicStatus.MUTED:
+                                dev.mute()
+                            case MicStatus.UNMUTED:
+                                dev.unmute()
+                            case _:
+                                pass
+
+                devs = dict(current)
+                devs[role] = dev
+                self._devs.publish(devs)
+                if dev is not old_dev:
+                    timeline.record_device(role.value, None if dev.destroyed() else dev.id)
+            except Exception as e:
+                self.logger.error('Failed to initialize %s device', role, exc_info=e)
+                return
+
+            # A device no other role uses is released in the background once in-flight readers are done with it
+            if old_dev is not dev and not old_dev.destroyed() and all(d is not old_dev for d in devs.values()):
                 try:
                     old_dev.unmute()
                 except Exception as e:
                     self.logger.warning('Error unmuting old %s device (%s)', role, old_dev.id, exc_info=e)
+                self._devs.retire([old_dev])
 
-                try:
-                    old_dev.destroy()
-                except Exception as e:
-                    self.logger.error('Error releasing old %s device (%s)', role, old_dev.id, exc_info=e)
-
-                self.logger.info('Released old %s device', role)
-
-        try:
-            # Get new default id before creating device
-            new_dev_id = Device.get_default_id(role=role)
-            for d in self.devs.values():
-                if d.id == new_dev_id:
-                    self.logger.info('Reusing device (%s) as %s', new_dev_id, role)
-                    dev = d
-                    break
-            else:
-                dev = Device.from_default(role=role)
-                self.logger.info('Initialized %s device (mic found: %s)', role, dev.id if bool(dev) else False)
-
-            self.devs[role] = dev
-
-            if not dev.destroyed():
-                match old_status:
-                    case MicStatus.MUTED:
-                        dev.mute()
-                    case MicStatus.UNMUTED:
-                        dev.unmute()
-                    case _:
-                        pass
-            
             callback = self._update_status(role)
             if self._started and not dev.destroyed():
                 self.logger.debug('Registering volume change listener')
-                dev.set_volume_callback(callback)
-            callback()
+                self._register_callback(dev, callback)
+        callback()
 
+    def _retire_device(self, dev: Device):
+        try:
+            dev.destroy()
         except Exception as e:
-            self.logger.error('Failed to initialize %s device', role, exc_info=e)
+            self.logger.error('Error releasing old device (%s)', dev.id, exc_info=e)
+        self.logger.info('Released old device (%s)', dev.id)
     
-    def reload_runner(self, role: ERole):
-        self._devs_lock.acquire()
-        CoInitializeEx(COINIT_MULTITHREADED)
+    def reload_runner(self):
+        _init_worker()
         
         self.logger.debug('reload_runner received notification, proceeding to reload.')
-        try:
-            self.reload(role)
-        except Exception as e:
-            self.logger.error('Exception during self.reload() in reload_runner for %s', role, exc_info=e)
+        while True:
+            with self._reload_lock:
+                if not self._pending_reloads:
+                    # Exit while holding the lock, the next notification starts a new runner
+                    self._reload_thread = None
+                    self._reloads_idle.set()
+                    break
+                role = self._pending_reloads.pop()
+            try:
+                self.reload(role)
+            except Exception as e:
+                self.logger.error('Exception during self.reload() in reload_runner for %s', role, exc_info=e)
 
         self.logger.info("reload_runner thread exiting, uninitializing COM.")
         CoUninitialize()
-        self._devs_lock.release()
+
+    def wait_reloads(self, timeout: float | None=None) -> bool:
+        return self._reloads_idle.wait(timeout)
+
+    def _sync_sampler(self):
+        if self._level_listeners or self._device_level_listeners:
+            self._level_worker.start()
+        else:
+            self._level_worker.stop()
 
     def level_notifier(self):
-        CoInitializeEx(COINIT_MULTITHREADED)
-        last_log = 0
-        while self._level_start:
-            try:
-                if time() - last_log > 5:
-                    # log once in 5secs
-                    self.logger.debug('level_notifier getting new level value (this is logged once every 5s instead of every time)')
-                    last_log = time()
-
-                level = self.level()
-                for listener in self._level_listeners:
-                    try:
-                        listener(level)
-                        pass
-                    except Exception as e:
-                        self.logger.error('Error calling level listener', exc_info=e)
-            except Exception as e:
-                self.logger.error('Error getting level', exc_info=e)
-            threading.Event().wait(0.1)  # Poll every 100ms
-        self.logger.debug('level_notifier is stopped')
-        CoUninitialize()
+        if time() - self._level_last_log > 5:
+            # log once in 5secs
+            self.logger.debug('level_notifier getting new level value (this is logged once every 5s instead of every time)')
+            self._level_last_log = time()
+
+        if not self._device_level_listeners:
+            self._level_listeners.notify(self.level())
+            return
+
+        # Every device is read once per tick, the main level is taken from the same reads
+        with self._devs.read() as snapshot:
+            levels = self._sample_levels(snapshot)
+            main_dev = self.find_main_dev(snapshot)
+        self._device_level_listeners.notify(levels)
+        if self._level_listeners:
+            self._level_listeners.notify(levels.get(main_dev.id, 0.0))
 
     def add_status_listener(self, listener: Callable[[MicStatus], None]):
         try:
@@ -353,83 +673,106 @@ class _AudioController:
             self.logger.warning('Failed to register status change callback', exc_info=e)
 
     def remove_status_listener(self, listener: Callable[[MicStatus], None]):
-        self._status_listeners.remove(listener)
-        self.logger.info('Unregistered status change callback')
+        if self._status_listeners.remove(listener):
+            self.logger.info('Unregistered status change callback')
 
-    def add_level_listener(self, listener: Callable[[float], None]):
+    def add_level_listener(self, listener: Callable[[float], None], interval: float | None=None):
         try:
+            # The first listener starts the sampler, which runs as fast as any listener asks
+            self._level_intervals.request(listener, interval)
             self._level_listeners.add(listener)
-            if not self._level_start:
-                self._level_start = True
-                self._level_notifier_thread.start()
-
             listener(self.level())
             self.logger.info('Registered level change callback')
         except Exception as e:
             self.logger.warning('Failed to register level change callback', exc_info=e)
 
     def remove_level_listener(self, listener: Callable[[float], None]):
-        self._level_listeners.remove(listener)
-        if not len(self._level_listeners):
-            self._level_stop = True
-            self._level_notifier_thread.join()
+        # The last listener stops the sampler, leaving no thread behind
+        if self._level_listeners.remove(listener):
+            self.logger.info('Unregistered level change callback')
+        if listener not in self._device_level_listeners.snapshot():
+            self._level_intervals.drop(listener)
+
+    def add_device_level_listener(self, listener: Callable[[Dict[str, float]], None], interval: float | None=None):
+        try:
+            self._level_intervals.request(listener, interval)
+            self._device_level_listeners.add(listener)
+            listener(self.device_levels())
+            self.logger.info('Registered device level callback')
+        except Exception as e:
+            self.logger.warning('Failed to register device level callback', exc_info=e)
 
-        self.logger.info('Unregistered level change callback')
+    def remove_device_level_listener(self, listener: Callable[[Dict[str, float]], None]):
+        if self._device_level_listeners.remove(listener):
+            self.logger.info('Unregistered device level callback')
+        if listener not in self._level_listeners.snapshot():
+            self._level_intervals.drop(listener)
 
-    def mute(self, role: ERole | None=None):
+    def _set_sampler_interval(self, interval: float):
+        # Takes effect from the next sample
+        self._level_worker.interval = interval
+
+    def mute(self, role: ERole | None=None) -> ReconcileResult:
         self.logger.info('mute() called')
-        muted_devs = set()
-        for role, dev in self.get_devs(role):
-            if dev.destroyed():
-                self.logger.warning('No %s device to mute', role)
-            elif dev.id in muted_devs:
-                pass
-            else:
-                dev.mute()
-                muted_devs.add(dev.id)
-                self.logger.debug('%s microphone muted', role)
-
-    def unmute(self, role: ERole | None=None):
+        return self.set_muted(True, role)
+
+    def unmute(self, role: ERole | None=None) -> ReconcileResult:
         self.logger.info('unmute() called')
-        unmuted_devs = set()
-
-        for role, dev in self.get_devs(role):
-            if dev.destroyed():
-                self.logger.warning('No %s device to unmute', role)
-            elif dev.id in unmuted_devs:
-                pass
-            else:
-                dev.unmute()
-                unmuted_devs.add(dev.id)
-                self.logger.debug('%s microphone unmuted', role)
-
-    def toggle(self, role: ERole | None=None):
+        return self.set_muted(False, role)
+
+    def toggle(self, role: ERole | None=None) -> ReconcileResult | None:
         self.logger.info('toggle() called')
 
-        main_dev = self.find_main_dev()
-        if main_dev.destroyed():
-            self.logger.debug('No main device found, skipping toggle')
-            return
+        with tracing.span('controller.toggle'), self._devs.read() as snapshot:
+            main_dev = self.get_dev(role, snapshot)
+            if main_dev.destroyed():
+                self.logger.debug('No main device found, skipping toggle')
+                return None
+            muted = self._muted_now(role, snapshot)
+
+        if muted is None:
+            self.logger.warning('No microphone answers, toggling to muted')
+            muted = False
+        return self.set_muted(not muted, role)
+
+    def _muted_now(self, role: ERole | None, devs: Mapping[ERole, Device]) -> bool | None:
+        # The role's device; if it does not answer, what was last asked for or else the next device that answers
+        main_dev = self.get_dev(role, devs)
+        try:
+            return main_dev.is_muted()
+        except (DeviceTimeout, DeviceUnavailable) as e:
+            self.logger.warning('%s is not responding: %s', main_dev, e)
+        desired = self._reconciler.desired(role)
+        if desired is not None:
+            return desired
+        for dev in devs.values():
+            if dev is main_dev or dev.destroyed():
+                continue
+            try:
+                return dev.is_muted()
+            except (DeviceTimeout, DeviceUnavailable):
+                continue
+        return None
 
-        muted = main_dev.is_muted()
-        toggled_devs = set()
-        for role, dev in self.devs.items():
-            if dev.destroyed():
-                self.logger.warning('No %s device to toggle', role)
-            elif dev.id in toggled_devs:
-                pass
-            else:
-                if muted:
-                    dev.unmute()
+    def set_muted(self, muted: bool, role: ERole | None=None) -> ReconcileResult:
+        with tracing.span('controller.set_muted', muted=muted), self._devs.read() as snapshot:
+            devs = []
+            for r, dev in self.get_devs(role, snapshot):
+                if dev.destroyed():
+                    self.logger.warning('No %s device to %s', r, 'mute' if muted else 'unmute')
                 else:
-                    dev.mute()
-                toggled_devs.add(dev.id)
-                self.logger.debug('%s microphone %s', role, 'unmuted' if muted else 'muted')
+                    devs.append(dev)
+
+            result = self._reconciler.reconcile(devs, muted, role)
+        if not result.converged:
+            self.logger.warning('Devices did not converge to muted=%s: %s', muted, result.unconverged)
+        return result
 
     def is_muted(self, role: ERole | None=None):
-        dev = self.get_dev(role=role)
-        if not dev.destroyed():
-            return dev.is_muted()
+        with self._devs.read() as snapshot:
+            dev = self.get_dev(role, snapshot)
+            if not dev.destroyed():
+                return bool(self._muted_now(role, snapshot))
         self.logger.warning('is_muted(%s) -> No microphone', 'main' if role is None else role)
         return False
 
@@ -439,36 +782,94 @@ class _AudioController:
         return False
 
     def status(self, role: ERole | None=None) -> MicStatus:
-        dev = self.get_dev(role=role)
+        with self._devs.read() as snapshot:
+            dev = self.get_dev(role, snapshot)
+            provisional = self._provisional
+            if provisional is not None and dev.destroyed():
+                return provisional.get(role, MicStatus.DISABLED)
+            return self._status(dev)
+
+    def _status(self, dev: Device) -> MicStatus:
         if dev.destroyed():
             return MicStatus.DISABLED
-        if dev.is_muted():
+        try:
+            muted = dev.is_muted()
+        except (DeviceTimeout, DeviceUnavailable) as e:
+            self.logger.debug('%s is not responding: %s', dev, e)
+            return MicStatus.DISABLED
+        if muted:
             return MicStatus.MUTED
         # if self.is_in_use():
         #     return MicStatus.INUSE
         return MicStatus.UNMUTED
     
     def level(self, role: ERole | None=None) -> float:
-        dev = self.get_dev(role=role)
-        if not dev.destroyed():
-            return dev.get_level()
+        with self._devs.read() as snapshot:
+            dev = self.get_dev(role, snapshot)
+            if not dev.destroyed():
+                try:
+                    return dev.get_level()
+                except (DeviceTimeout, DeviceUnavailable):
+                    return 0.0
         self.logger.warning('get_level(%s) -> No microphone', 'main' if role is None else role)
         return 0.0
     
-    def find_main_dev(self) -> Type[Device]:
+    def device_levels(self) -> Dict[str, float]:
+        # Peak level per distinct endpoint id, muted endpoints read as 0 without a call
+        with self._devs.read() as snapshot:
+            return self._sample_levels(snapshot)
+
+    def _sample_levels(self, devs: Mapping[ERole, Device]) -> Dict[str, float]:
+        levels = {}
+        for dev in devs.values():
+            if dev.destroyed() or dev.id in levels:
+                continue
+            try:
+                levels[dev.id] = dev.get_level()
+            except (DeviceTimeout, DeviceUnavailable):
+                levels[dev.id] = 0.0
+        return levels
+
+    def find_main_dev(self, devs: Mapping[ERole, Device] | None=None) -> Type[Device]:
+        devs = self.devs if devs is None else devs
         # The list is ordered based on priority, first one that exists is the "main" device
         for role in [ERole.eCommunications, ERole.eMultimedia, ERole.eConsole]:
-            dev = self.devs.get(role)
+            dev = devs.get(role)
             if not dev.destroyed():
                 return dev
         
         return EMPTY_DEVICE
     
-    def get_dev(self, role: ERole | None=None) -> Type[Device]:
-        return self.find_main_dev() if role is None else self.devs.get(role)
+    def get_dev(self, role: ERole | None=None, devs: Mapping[ERole, Device] | None=None) -> Type[Device]:
+        devs = self.devs if devs is None else devs
+        return self.find_main_dev(devs) if role is None else devs.get(role)
 
-    def get_devs(self, role: ERole | None=None) -> List[Tuple[ERole, Device]]:
-        return self.devs.items() if role is None else [(role, self.devs.get(role))]
+    def get_devs(self, role: ERole | None=None, devs: Mapping[ERole, Device] | None=None) -> List[Tuple[ERole, Device]]:
+        devs = self.devs if devs is None else devs
+        return devs.items() if role is None else [(role, devs.get(role))]
 
-    
-AudioController = _AudioController()
\ No newline at end of file
+    def health(self) -> dict:
+        # Circuit breaker state per device plus the deadline counters shared by all devices
+        devices = {dev.id: dev.health() for dev in self.devs.values() if not dev.destroyed()}
+        return {'devices': devices, 'metrics': dict(GUARD_METRICS), 'ramps': RAMPS.stats()}
+
+    def write_stats(self) -> Tuple[int, int]:
+        # (SetMute calls issued, SetMute calls skipped because the device was already in the desired state)
+        return self._reconciler.writes, self._reconciler.saved
+
+
+def update_guard_settings(settings):
+    GUARD_CONFIG.update(timeout_ms=settings.get('device_timeout_ms'))
+
+def update_ramp_settings(settings):
+    RAMP_CONFIG.update(ramp_ms=settings.get('mute_ramp_ms'))
+
+Settings.add_listener(update_guard_settings)
+Settings.add_listener(update_ramp_settings)
+
+if os.environ.get('BETTER_MUTE_ENGINE') == 'process':
+    # COM work runs in a supervised child process, see audio_engine
+    from audio_engine import EngineSupervisor
+    AudioController = EngineSupervisor()
+else:
+    AudioController = _AudioController()
\ No newline at end of file
@@ -0,0 +1,659 @@
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection, wait
+from typing import Callable, Dict, List, Tuple
+
+import timeline
+from commons import MicStatus
+from device_guard import use_deadline
+from listeners import IntervalRequests, ListenerSet, PeriodicWorker
+from state_cache import StateCache
+
+# Set to 'process' to run the audio controller in a supervised child process
+ENGINE_ENV = 'BETTER_MUTE_ENGINE'
+
+LEVEL_POLLING_INTERVAL = 0.1
+HEARTBEAT_INTERVAL = 0.1
+# Longer than the worst case of a command against devices that time out one after another
+HANG_TIMEOUT = 5.0
+START_TIMEOUT = 10.0
+COMMAND_TIMEOUT = 2.0
+# Seqlock attempts before a read settles for the last consistent state
+READ_RETRIES = 1000
+RESTART_DELAY = 0.1
+MAX_RESTART_DELAY = 2.0
+
+# Shared state: generation u32, engine pid u32, heartbeat u64 (monotonic ns),
+# status per ERole value plus the main device (u8 x 4), main device level f32
+SEQ = struct.Struct('<I')
+STATE = struct.Struct('<IIQ4Bf')
+BLOCK_SIZE = SEQ.size + STATE.size
+GENERATION, PID, HEARTBEAT, STATUS, LEVEL = 0, 1, 2, 3, 7
+MAIN = 3
+# ERole names by value, as the state cache stores them
+ROLE_NAMES = ('eConsole', 'eMultimedia', 'eCommunications')
+
+# Engine -> supervisor messages
+READY  = 'ready'
+REPLY  = 'reply'
+STATUS_CHANGED = 'status'
+
+COMMANDS = ('ping', 'mute', 'unmute', 'toggle', 'status', 'is_muted', 'level', 'health', 'levels', 'device_levels', 'wait_reloads')
+
+
+class EngineError(Exception):
+    pass
+
+
+class EngineUnavailable(EngineError):
+    pass
+
+
+# Seqlocked engine state in shared memory, one process writes and any reads without a lock
+class StateBlock:
+    def __init__(self, name: str | None=None):
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=BLOCK_SIZE if self._owner else 0)
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+        self._lock = threading.Lock()
+        self._state: List = list(STATE.unpack_from(self._buf, SEQ.size))
+        self._last: Tuple = tuple(self._state)
+        if self._owner:
+            self.reset(0, 0)
+
+    def read(self) -> Tuple:
+        buf = self._buf
+        for _ in range(READ_RETRIES):
+            seq, = SEQ.unpack_from(buf)
+            if seq & 1:
+                continue
+            state = STATE.unpack_from(buf, SEQ.size)
+            if SEQ.unpack_from(buf)[0] == seq:
+                self._last = state
+                return state
+        return self._last
+
+    def status(self, index: int=MAIN) -> MicStatus:
+        return MicStatus(self.read()[STATUS + index])
+
+    def level(self) -> float:
+        return self.read()[LEVEL]
+
+    def generation(self) -> int:
+        return self.read()[GENERATION]
+
+    def heartbeat(self) -> int:
+        return self.read()[HEARTBEAT]
+
+    def _write(self):
+        seq, = SEQ.unpack_from(self._buf)
+        # Rounded up to even, a write cut short by a killed engine left it odd
+        seq += seq & 1
+        SEQ.pack_into(self._buf, 0, (seq + 1) & 0xFFFFFFFF)
+        STATE.pack_into(self._buf, SEQ.size, *self._state)
+        SEQ.pack_into(self._buf, 0, (seq + 2) & 0xFFFFFFFF)
+
+    def reset(self, generation: int, pid: int):
+        with self._lock:
+            self._state = [generation, pid, time.monotonic_ns()] + [MicStatus.DISABLED.value] * 4 + [0.0]
+            self._write()
+
+    def set_statuses(self, statuses: List[MicStatus]):
+        with self._lock:
+            self._state[STATUS:STATUS + 4] = [s.value for s in statuses]
+            self._write()
+
+    def set_level(self, level: float):
+        with self._lock:
+            self._state[LEVEL] = level
+            self._write()
+
+    def beat(self):
+        with self._lock:
+            self._state[HEARTBEAT] = time.monotonic_ns()
+            self._write()
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class _Engine:
+    def __init__(self, commands: Connection, events: Connection, block: StateBlock):
+        from audio_control import ERole, _AudioController
+
+        self.logger = logging.getLogger('AudioEngine')
+        self.ERole = ERole
+        self.controller = _AudioController()
+        self.commands = commands
+        self.events = events
+        self.block = block
+        self._send_lock = threading.Lock()
+
+    def send(self, *message):
+        with self._send_lock:
+            self.events.send(message)
+
+    def publish_status(self, *_):
+        controller = self.controller
+        # Indexed by ERole value, the main device last
+        statuses = [controller.status(self.ERole(i)) for i in range(3)] + [controller.status()]
+        self.block.set_statuses(statuses)
+        try:
+            self.send(STATUS_CHANGED)
+        except OSError:
+            pass
+
+    def set_levels(self, interval: float):
+        # Sampled every `interval` seconds into the state block, 0 stops sampling
+        if interval:
+            self.controller.add_level_listener(self.block.set_level, interval)
+        else:
+            self.controller.remove_level_listener(self.block.set_level)
+            self.block.set_level(0.0)
+
+    def handle(self, command: str, args: tuple):
+        if command not in COMMANDS:
+            raise ValueError('Unknown command "%s"' % command)
+        if command == 'ping':
+            return None
+        if command == 'levels':
+            return self.set_levels(*args)
+        if command == 'health':
+            return self.controller.health()
+        if command == 'device_levels':
+            return self.controller.device_levels()
+        if command == 'wait_reloads':
+            return self.controller.wait_reloads(*args)
+        role = args[0] if args else None
+        return getattr(self.controller, command)(None if role is None else self.ERole(role))
+
+    def run(self, generation: int, desired: Dict[int | None, bool], levels: float):
+        controller = self.controller
+        self.block.reset(generation, os.getpid())
+        controller.load()
+        # Whatever the user last asked for survives the restart, the whole group first
+        for role, muted in desired.items():
+            controller.set_muted(muted, None if role is None else self.ERole(role))
+        controller.start()
+        controller.add_status_listener(self.publish_status)
+        if levels:
+            self.set_levels(levels)
+        self.send(READY, os.getpid())
+        self.logger.info('Audio engine %d ready (pid %d)', generation, os.getpid())
+        # A hung device fails its command, the loop keeps beating and serving the other devices
+        use_deadline()
+
+        while True:
+            self.block.beat()
+            try:
+                if not self.commands.poll(HEARTBEAT_INTERVAL):
+                    continue
+                message = self.commands.recv()
+            except (EOFError, OSError):
+                self.logger.warning('Supervisor went away, stopping')
+                break
+            if message is None:
+                break
+
+            id, command, args = message
+            try:
+                result, ok = self.handle(command, args), True
+            except Exception as e:
+                self.logger.error('Command %s failed', command, exc_info=e)
+                result, ok = repr(e), False
+            self.send(REPLY, id, ok, result)
+
+        controller.remove_level_listener(self.block.set_level)
+        controller.remove_status_listener(self.publish_status)
+
+
+def engine_main(commands: Connection, events: Connection, block_name: str, generation: int,
+                desired: Dict[int | None, bool], levels: float, log_disable: int):
+    # The child must build a real controller, not another supervisor
+    os.environ.pop(ENGINE_ENV, None)
+    logging.disable(log_disable)
+
+    from audio_control import CoInitializeEx, CoUninitialize, COINIT_MULTITHREADED, RAMPS
+
+    CoInitializeEx(COINIT_MULTITHREADED)
+    block = StateBlock(block_name)
+    if os.environ.get(timeline.ENV):
+        timeline.start()
+    try:
+        _Engine(commands, events, block).run(generation, desired, levels)
+    finally:
+        # A child process skips atexit, a half done ramp would leave the volume down
+        RAMPS.finish_all()
+        timeline.stop()
+        block.close()
+        CoUninitialize()
+
+
+class _Pending:
+    __slots__ = ('done', 'ok', 'result')
+
+    def __init__(self):
+        self.done = threading.Lock()
+        self.done.acquire()
+        self.ok = False
+        self.result = None
+
+
+# Drop-in for AudioController that keeps the COM work in a child process and restarts it when it dies or hangs
+class EngineSupervisor:
+    def __init__(self):
+        self.logger = logging.getLogger('EngineSupervisor')
+        self._ctx = multiprocessing.get_context('spawn')
+        self._block = StateBlock()
+        self._status_listeners = ListenerSet('EngineSupervisor')
+        self._level_worker = PeriodicWorker('EngineLevels', self._notify_level, LEVEL_POLLING_INTERVAL)
+        self._level_listeners = ListenerSet('EngineSupervisor', on_first=self._start_levels, on_last=self._stop_levels)
+        self._level_intervals = IntervalRequests(LEVEL_POLLING_INTERVAL, self._set_level_interval)
+        # How often the engine samples the level into the state block, 0 while nobody wants it
+        self._levels = 0.0
+        # Levels per device are not in the state block, they are asked for on every tick
+        self._device_level_worker = PeriodicWorker('EngineDeviceLevels', self._notify_device_levels, LEVEL_POLLING_INTERVAL)
+        self._device_level_listeners = ListenerSet('EngineSupervisor', on_first=self._device_level_worker.start,
+                                                   on_last=self._device_level_worker.stop)
+        self._device_level_intervals = IntervalRequests(LEVEL_POLLING_INTERVAL, self._set_device_level_interval)
+        # Last mute state asked for, by ERole value and None for all roles; replaced, never changed in place
+        self._desired: Dict[int | None, bool] = {}
+        self._on_loaded: Callable[[], None] | None = None
+        self._loaded = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._process = None
+        self._commands: Connection | None = None
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, _Pending] = {}
+        self._ids = itertools.count()
+        self._generation = 0
+        self._state_cache: StateCache | None = None
+        self._provisional: Dict[int, MicStatus] | None = None
+        self._cached_ids: Dict[str, str | None] = {}
+        self.restarts = 0
+        self.round_trips = 0
+        self.round_trip_ns = 0
+
+    def load(self):
+        self.start()
+        if not self.wait_loaded(START_TIMEOUT):
+            self.logger.warning('Audio engine did not start within %.0fs', START_TIMEOUT)
+
+    def load_async(self, start: bool=False, on_loaded: Callable[[], None] | None=None) -> threading.Thread:
+        self._on_loaded = on_loaded
+        self.start()
+        return self._thread
+
+    def wait_loaded(self, timeout: float | None=None) -> bool:
+        return self._loaded.wait(timeout)
+
+    def warm_start(self, cache: StateCache | None=None) -> MicStatus | None:
+        # Status queries answer from the cache until the first engine is ready
+        self._state_cache = StateCache() if cache is None else cache
+        roles = self._state_cache.load()
+        # The engine does not report device ids, the ones last seen in-process are kept
+        self._cached_ids = {name: entry['id'] for name, entry in roles.items()}
+        provisional = {}
+        for index, name in enumerate(ROLE_NAMES):
+            try:
+                provisional[index] = MicStatus[roles[name]['status']]
+            except KeyError:
+                continue
+        if not provisional:
+            return None
+        provisional[MAIN] = next((provisional[index] for index in (2, 1, 0)
+                                  if provisional.get(index, MicStatus.DISABLED) != MicStatus.DISABLED), MicStatus.DISABLED)
+        self._provisional = provisional
+        self.logger.info('Warm start, provisional status %s', provisional[MAIN])
+        return provisional[MAIN]
+
+    def save_state(self):
+        if self._state_cache is not None:
+            self._state_cache.save()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._supervise, name='EngineSupervisor', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._post(None)
+        if self._thread is not None:
+            self._thread.join(START_TIMEOUT)
+        self._level_worker.stop()
+        self._device_level_worker.stop()
+        self._block.close()
+
+    @property
+    def pid(self) -> int | None:
+        process = self._process
+        return None if process is None else process.pid
+
+    def _supervise(self):
+        delay = 0.0
+        while not self._stopped.is_set():
+            if self._spawn():
+                delay = 0.0
+                self._serve()
+            self._shutdown_engine()
+            if self._stopped.is_set():
+                break
+
+            self.restarts += 1
+            self.logger.warning('Audio engine is gone, restarting in %.1fs', delay)
+            self._stopped.wait(delay)
+            # Restart right away once, then back off up to a bounded delay
+            delay = min(max(delay * 2, RESTART_DELAY), MAX_RESTART_DELAY)
+
+    def _spawn(self) -> bool:
+        ctx = self._ctx
+        self._generation += 1
+        commands_out, commands_in = ctx.Pipe(duplex=False)
+        events_out, events_in = ctx.Pipe(duplex=False)
+        desired = self._desired
+        self._process = ctx.Process(target=engine_main, name='AudioEngine', daemon=True,
+                                    args=(commands_out, events_in, self._block.name, self._generation,
+                                          desired, self._levels, logging.root.manager.disable))
+        self._process.start()
+        commands_out.close()
+        events_in.close()
+        self._events = events_out
+
+        deadline = time.monotonic() + START_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.error('Audio engine did not report ready within %.0fs', START_TIMEOUT)
+                return False
+            ready = wait([events_out, self._process.sentinel], remaining)
+            if events_out in ready:
+                try:
+                    message = events_out.recv()
+                except (EOFError, OSError):
+                    return False
+                if message[0] == READY:
+                    break
+                self._dispatch(message)
+            elif ready:
+                return False
+
+        with self._send_lock:
+            self._commands = commands_in
+        self.logger.info('Audio engine %d started (pid %d)', self._generation, self._process.pid)
+        if self._desired is not desired:
+            # Changed while the engine was coming up
+            for role, muted in self._desired.items():
+                if desired.get(role) != muted:
+                    self._post('mute' if muted else 'unmute', role)
+        self._provisional = None
+        self._notify_status()
+
+        if not self._loaded.is_set():
+            self._loaded.set()
+            if self._on_loaded is not None:
+                self._on_loaded()
+        return True
+
+    def _serve(self):
+        process, events = self._process, self._events
+        while not self._stopped.is_set():
+            ready = wait([events, process.sentinel], HEARTBEAT_INTERVAL)
+            if events in ready:
+                try:
+                    self._dispatch(events.recv())
+                except (EOFError, OSError):
+                    return
+                continue
+            if ready:
+                return
+            if time.monotonic_ns() - self._block.heartbeat() > HANG_TIMEOUT * 1e9:
+                self.logger.error('Audio engine stopped responding for %.0fs, killing it', HANG_TIMEOUT)
+                return
+
+    def _shutdown_engine(self):
+        with self._send_lock:
+            commands, self._commands = self._commands, None
+            pending, self._pending = self._pending, {}
+        for job in pending.values():
+            job.result = 'Audio engine exited'
+            job.done.release()
+
+        process = self._process
+        if process is not None:
+            if commands is not None and self._stopped.is_set():
+                try:
+                    commands.send(None)
+                except OSError:
+                    pass
+            process.join(1.0 if self._stopped.is_set() else 0)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            if process.exitcode:
+                self.logger.warning('Audio engine exited with code %s', process.exitcode)
+        if commands is not None:
+            commands.close()
+        self._events.close()
+
+        if not self._stopped.is_set():
+            self._block.reset(self._generation, 0)
+            self._notify_status()
+
+    def _dispatch(self, message: tuple):
+        if message[0] == REPLY:
+            _, id, ok, result = message
+            job = self._pending.pop(id, None)
+            if job is not None:
+                job.ok = ok
+                job.result = result
+                job.done.release()
+        elif message[0] == STATUS_CHANGED:
+            self._notify_status()
+
+    def _post(self, command: str | None, *args) -> int | None:
+        with self._send_lock:
+            if self._commands is None:
+                return None
+            id = next(self._ids)
+            try:
+                self._commands.send(None if command is None else (id, command, args))
+            except OSError:
+                return None
+            return id
+
+    def call(self, command: str, *args, timeout: float=COMMAND_TIMEOUT):
+        job = _Pending()
+        start = time.perf_counter_ns()
+        with self._send_lock:
+            if self._commands is None:
+                raise EngineUnavailable('Audio engine is not running')
+            id = next(self._ids)
+            self._pending[id] = job
+            try:
+                self._commands.send((id, command, args))
+            except OSError as e:
+                del self._pending[id]
+                raise EngineUnavailable('Audio engine is not running') from e
+
+        if not job.done.acquire(timeout=timeout):
+            self._pending.pop(id, None)
+            raise EngineUnavailable('Audio engine did not answer %s within %.1fs' % (command, timeout))
+        if not job.ok:
+            raise EngineError(job.result)
+
+        self.round_trips += 1
+        self.round_trip_ns += time.perf_counter_ns() - start
+        return job.result
+
+    def ping(self):
+        self.call('ping')
+
+    def _notify_status(self):
+        if self._state_cache is not None and self._provisional is None:
+            for index, name in enumerate(ROLE_NAMES):
+                self._state_cache.record(name, self._cached_ids.get(name), self._block.status(index).name)
+        if self._status_listeners:
+            self._status_listeners.notify(self.status())
+
+    def _notify_level(self):
+        self._level_listeners.notify(self._block.level())
+
+    def _notify_device_levels(self):
+        try:
+            levels = self.call('device_levels')
+        except EngineError:
+            # Skipped while the engine restarts
+            return
+        self._device_level_listeners.notify(levels)
+
+    def _set_levels(self, interval: float):
+        if self._levels != interval:
+            self._levels = interval
+            self._post('levels', interval)
+
+    def _start_levels(self):
+        self._set_levels(self._level_intervals.interval())
+        self._level_worker.start()
+
+    def _stop_levels(self):
+        self._level_worker.stop()
+        self._set_levels(0.0)
+
+    def _set_level_interval(self, interval: float):
+        self._level_worker.interval = interval
+        if self._levels:
+            self._set_levels(interval)
+
+    def _set_device_level_interval(self, interval: float):
+        self._device_level_worker.interval = interval
+
+    def add_status_listener(self, listener: Callable[[MicStatus], None]):
+        self._status_listeners.add(listener)
+        listener(self.status())
+
+    def remove_status_listener(self, listener: Callable[[MicStatus], None]):
+        self._status_listeners.remove(listener)
+
+    def add_level_listener(self, listener: Callable[[float], None], interval: float | None=None):
+        # The engine samples as fast as the fastest listener asks
+        self._level_intervals.request(listener, interval)
+        self._level_listeners.add(listener)
+        listener(self._block.level())
+
+    def remove_level_listener(self, listener: Callable[[float], None]):
+        self._level_listeners.remove(listener)
+        self._level_intervals.drop(listener)
+
+    def add_device_level_listener(self, listener: Callable[[Dict[str, float]], None], interval: float | None=None):
+        self._device_level_intervals.request(listener, interval)
+        self._device_level_listeners.add(listener)
+
+    def remove_device_level_listener(self, listener: Callable[[Dict[str, float]], None]):
+        self._device_level_listeners.remove(listener)
+        self._device_level_intervals.drop(listener)
+
+    def _desire(self, muted: bool, role):
+        if role is None:
+            self._desired = {None: muted}
+        else:
+            self._desired = {**self._desired, role.value: muted}
+
+    def _set_muted(self, command: str, role):
+        self._desire(command == 'mute', role)
+        try:
+            return self.call(command, None if role is None else role.value)
+        except EngineError as e:
+            self.logger.warning('%s not applied now (%s), the engine gets it when it restarts', command, e)
+            return None
+
+    def set_muted(self, muted: bool, role=None):
+        return self._set_muted('mute' if muted else 'unmute', role)
+
+    def mute(self, role=None):
+        return self._set_muted('mute', role)
+
+    def unmute(self, role=None):
+        return self._set_muted('unmute', role)
+
+    def toggle(self, role=None):
+        try:
+            result = self.call('toggle', None if role is None else role.value)
+        except EngineError as e:
+            # Flip what the engine will get on restart
+            desired = self._desired
+            muted = desired.get(None if role is None else role.value, desired.get(None))
+            if muted is None:
+                muted = self.status(role) == MicStatus.MUTED
+            self._desire(not muted, role)
+            self.logger.warning('toggle not applied now (%s), the engine gets it when it restarts', e)
+            return None
+        if result is not None:
+            self._desire(result.desired, role)
+        return result
+
+    def wait_reloads(self, timeout: float | None=None) -> bool:
+        # Waited for in slices, the engine does not beat while it waits
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = COMMAND_TIMEOUT if deadline is None else min(max(deadline - time.monotonic(), 0.0), COMMAND_TIMEOUT)
+            try:
+                if self.call('wait_reloads', remaining, timeout=remaining + COMMAND_TIMEOUT):
+                    return True
+            except EngineError:
+                # Not running, a restarted engine loads its devices from scratch
+                if self._stopped.wait(RESTART_DELAY):
+                    return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def status(self, role=None) -> MicStatus:
+        index = MAIN if role is None else role.value
+        provisional = self._provisional
+        if provisional is not None:
+            return provisional.get(index, MicStatus.DISABLED)
+        return self._block.status(index)
+
+    def is_muted(self, role=None) -> bool:
+        return self.status(role) == MicStatus.MUTED
+
+    def level(self, role=None) -> float:
+        if role is None:
+            # Polled by the status icon, the engine keeps sampling once asked
+            if not self._levels:
+                self._set_levels(self._level_intervals.interval())
+            return self._block.level()
+        try:
+            return self.call('level', role.value)
+        except EngineError:
+            return 0.0
+
+    def health(self) -> dict:
+        try:
+            health = self.call('health')
+        except EngineError:
+            health = {'devices': {}, 'metrics': {}}
+        health['engine'] = {
+            'pid': self.pid,
+            'generation': self._block.generation(),
+            'restarts': self.restarts,
+            'round_trips': self.round_trips,
+            'round_trip_us': self.round_trip_ns / self.round_trips / 1000 if self.round_trips else 0.0,
+        }
+        return health
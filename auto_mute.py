@@ -0,0 +1,87 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from audio_control import AudioController
+from device_guard import deadline
+from foreground import ForegroundWatcher
+from hotkeys import ACTIONS, ROLES
+from process_rules import (ProcessEvent, ProcessSource, RuleEngine, SnapshotProcessSource, TRIGGERS, process_created,
+                           process_name)
+from settings import Settings
+
+
+# Applies the auto_mute rules, following processes and focus only while some rule needs them
+class AutoMuteManager:
+    def __init__(self, source: ProcessSource | None=None, foreground=None):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.engine = RuleEngine()
+        self.source = source if source is not None else SnapshotProcessSource()
+        self.foreground = ForegroundWatcher if foreground is None else foreground
+        self._watching_processes = False
+        self._watching_foreground = False
+        # One thread keeps focus changes in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AutoMute')
+        Settings.add_listener(self.update_settings)
+
+    def update_settings(self, settings):
+        rules = []
+        for rule in settings.get('auto_mute', []):
+            try:
+                process, trigger, action = rule['process'], rule['on'], rule['action']
+            except (KeyError, TypeError):
+                self.logger.warning('Ignoring auto_mute rule %r, it needs "process", "on" and "action"', rule)
+                continue
+            name, _, role = action.partition(':')
+            if name not in ACTIONS or (role and role not in ROLES) or trigger not in TRIGGERS:
+                self.logger.warning('Ignoring auto_mute rule %r', rule)
+                continue
+            rules.append((process, trigger, self._action(rule, name, role)))
+
+        self.engine.compile(rules)
+        if self._watching_processes:
+            self.source.rewatch()
+        self._watch(bool(rules), any(trigger in ('focus', 'blur') for _, trigger, _ in rules))
+
+    def _watch(self, processes: bool, foreground: bool):
+        if processes != self._watching_processes:
+            self._watching_processes = processes
+            if processes:
+                self.source.start(self.engine.feed, self.engine.watches)
+            else:
+                self.source.stop()
+        if foreground != self._watching_foreground:
+            self._watching_foreground = foreground
+            if foreground:
+                self.foreground.add_window_listener(self._on_foreground)
+            else:
+                self.foreground.remove_window_listener(self._on_foreground)
+
+    def _on_foreground(self, pid: int):
+        self._executor.submit(self._feed_focus, pid)
+
+    def _feed_focus(self, pid: int):
+        try:
+            created = process_created(pid)
+            # A process that started since the last poll is not known by name yet
+            name = self.engine.name_of(pid, created)
+            self.engine.feed(ProcessEvent('focus', pid, process_name(pid) if name is None else name, created))
+        except Exception as e:
+            self.logger.error('Error handling the focus change to process %d', pid, exc_info=e)
+
+    def _action(self, rule: dict, name: str, role: str):
+        cb = getattr(AudioController, name)
+        description = '%s %s -> %s' % (rule['process'], rule['on'], rule['action'])
+
+        def wrapper():
+            self.logger.info('Auto-mute rule "%s" triggered', description)
+            # Like a hotkey, a rule must never wait on a hung driver
+            with tracing.action('auto_mute', action=name), deadline():
+                if role:
+                    cb(role=ROLES[role])
+                else:
+                    cb()
+        return wrapper
+
+    def stop(self):
+        self._watch(False, False)
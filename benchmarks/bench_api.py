@@ -0,0 +1,144 @@
+import json
+import selectors
+import socket
+import time
+
+import api_token
+from benchmarks.bench_controller import make_controller
+from benchmarks.harness import benchmark, percentile, report_only, time_per_call
+from control_server import ControlServer
+
+# Socket delivery to client threads
+report_only('api.broadcast')
+
+
+def auth_line() -> bytes:
+    return json.dumps({'cmd': 'auth', 'token': api_token.load()}).encode() + b'\n'
+
+
+# Many API clients read by one selector, tracking the last status each has seen
+class Clients:
+    def __init__(self, port: int, n: int):
+        self.selector = selectors.DefaultSelector()
+        self.status = {}
+        self.levels = {}
+        self.buffers = {}
+        self.answered = {}
+        self.requests = 0
+        for _ in range(n):
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.sendall(auth_line())
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ)
+            self.buffers[sock] = b''
+            self.levels[sock] = 0
+
+    def send(self, line: str):
+        for sock in self.buffers:
+            sock.sendall(line.encode() + b'\n')
+
+    def poll(self, timeout: float=0.0):
+        for key, _ in self.selector.select(timeout):
+            sock = key.fileobj
+            *lines, self.buffers[sock] = (self.buffers[sock] + sock.recv(65536)).split(b'\n')
+            for line in lines:
+                message = json.loads(line)
+                if message.get('status'):
+                    self.status[sock] = message['status']
+                if message['event'] == 'level':
+                    self.levels[sock] += 1
+                if message['event'] == 'result':
+                    self.answered[sock] = message.get('id')
+
+    def wait(self, done, timeout: float=30.0):
+        deadline = time.monotonic() + timeout
+        while not done():
+            if time.monotonic() > deadline:
+                raise AssertionError('API clients did not receive the update in time')
+            self.poll(0.01)
+
+    def sync(self):
+        # Answers are sent after every status update queued before them
+        self.requests += 1
+        self.send(json.dumps({'cmd': 'status', 'id': self.requests}))
+        self.wait(lambda: len(self.answered) == len(self.buffers) and all(i == self.requests for i in self.answered.values()))
+
+    def all_have(self, status: str) -> bool:
+        return len(self.status) == len(self.buffers) and all(s == status for s in self.status.values())
+
+    def close(self):
+        for sock in self.buffers:
+            sock.close()
+        self.selector.close()
+
+
+def stalled_clients(port: int, n: int):
+    socks = []
+    for _ in range(n):
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+        sock.connect(('127.0.0.1', port))
+        sock.sendall(auth_line() + b'{"cmd":"levels","on":true}\n')
+        socks.append(sock)
+    return socks
+
+
+@benchmark
+def bench_api_load():
+    controller = make_controller(1)
+    server = ControlServer(controller)
+    port = server.start(0)
+    results = {}
+    try:
+        # A web page posting to the port is cut off at its request line, before anything runs
+        status = controller.status()
+        sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+        sock.sendall(b'POST / HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n\r\ntoggle\n' % port)
+        received = b''
+        while chunk := sock.recv(4096):
+            received += chunk
+        sock.close()
+        if b'result' in received or controller.status() != status:
+            raise AssertionError('an unauthenticated client got a command through')
+
+        for n in (1, 300):
+            clients = Clients(port, n)
+            clients.wait(lambda: len(clients.status) == n)
+
+            # Toggle until every client has seen the new status
+            samples = []
+            for _ in range(30):
+                start = time.perf_counter_ns()
+                expected = 'MUTED' if controller.toggle().desired else 'UNMUTED'
+                clients.wait(lambda: clients.all_have(expected))
+                samples.append((time.perf_counter_ns() - start) / 1000)
+            results['api.broadcast[clients=%d]' % n] = percentile(samples, 0.5)
+            clients.close()
+
+        # Clients that subscribe to levels and never read must not slow the controller down
+        clients = Clients(port, 300)
+        clients.send('{"cmd":"levels","on":true}')
+        stalled = stalled_clients(port, 50)
+        clients.wait(lambda: len(clients.status) == 300 and all(clients.levels.values()))
+        # Rounds shorter than the backlog, with the reading clients caught up in between
+        results['api.toggle[clients=300,stalled=50]'] = time_per_call(controller.toggle, number=40, setup=clients.sync)
+
+        # Flood status changes until the stalled clients fall behind and are cut off
+        deadline = time.monotonic() + 10
+        while server.clients() > 300:
+            if time.monotonic() > deadline:
+                raise AssertionError('stalled API clients were not disconnected')
+            # Paced so that the server gets to run, the clients who do read never fall behind
+            for _ in range(10):
+                controller.toggle()
+            clients.poll()
+            time.sleep(0.001)
+        expected = controller.status().name
+        clients.wait(lambda: clients.all_have(expected))
+        clients.close()
+        for sock in stalled:
+            sock.close()
+    finally:
+        server.stop()
+        controller.stop()
+    return results
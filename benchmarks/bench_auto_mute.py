@@ -0,0 +1,116 @@
+import itertools
+
+from benchmarks.harness import benchmark, time_per_call
+from process_rules import ProcessEvent, RuleEngine, SnapshotProcessSource, SyntheticProcessSource
+
+PROCESSES = 5000
+RULES = 1000
+
+
+# Process ids, names and creation times for SnapshotProcessSource, counting name lookups
+class SimProcessTable:
+    def __init__(self, processes: int):
+        # Ten instances of each of processes / 10 names, ids spaced like Windows' multiples of 4
+        self.names = {4 * (i + 1): 'proc%d.exe' % (i % (processes // 10)) for i in range(processes)}
+        self.times = dict.fromkeys(self.names, 0.0)
+        self._next = max(self.names) + 4
+        self.lookups = 0
+
+    def pids(self):
+        return list(self.names)
+
+    def name(self, pid: int) -> str | None:
+        self.lookups += 1
+        return self.names.get(pid)
+
+    def created(self, pid: int) -> float | None:
+        return self.times.get(pid)
+
+    def reuse(self, pid: int, name: str):
+        # The process exits and its id goes to a new one before the next poll
+        self.names[pid] = name
+        self.times[pid] += 1.0
+
+    def churn(self, n: int):
+        # n processes exit and n new ones start
+        for pid in list(self.names)[:n]:
+            del self.names[pid]
+            del self.times[pid]
+        for _ in range(n):
+            self.names[self._next] = 'new%d.exe' % self._next
+            self.times[self._next] = 0.0
+            self._next += 4
+
+
+@benchmark
+def bench_auto_mute_rules():
+    results = {}
+    fired = []
+    engine = RuleEngine()
+    rules = [('app%d.exe' % i, trigger, lambda: None) for i in range(RULES) for trigger in ('start', 'exit')]
+    rules += [('Zoom.exe', 'start', lambda: fired.append('unmute')), ('zoom.exe', 'exit', lambda: fired.append('mute')),
+              ('game.exe', 'focus', lambda: fired.append('mute')), ('game.exe', 'blur', lambda: fired.append('unmute'))]
+    engine.compile(rules)
+
+    # Every poll of a quiet system costs a pid listing and a set difference, no name lookups
+    table = SimProcessTable(PROCESSES)
+    source = SnapshotProcessSource(list_pids=table.pids, get_name=table.name, get_created=table.created)
+    source._callback = engine.feed
+    source._watches = engine.watches
+    source.poll()
+    if engine.running('proc1.exe') != 10:
+        raise AssertionError('the first poll should record every running process')
+    table.lookups = 0
+    results['auto_mute.poll[processes=%d,quiet]' % PROCESSES] = time_per_call(source.poll, number=50)
+    if table.lookups:
+        raise AssertionError('a quiet poll looked up %d names' % table.lookups)
+    results['auto_mute.poll[processes=%d,churn=10]' % PROCESSES] = time_per_call(source.poll, number=1, repeat=20, setup=lambda: table.churn(10))
+    if table.lookups != 10 * 20:
+        raise AssertionError('names should only be looked up for new processes, got %d' % table.lookups)
+
+    pids = itertools.count(1_000_000, 4)
+
+    def start_exit():
+        pid = next(pids)
+        engine.feed(ProcessEvent('start', pid, 'app500.exe'))
+        engine.feed(ProcessEvent('exit', pid))
+
+    results['auto_mute.start_exit[rules=%d]' % len(rules)] = time_per_call(start_exit, number=1000) / 2
+
+    # Second instances and unrelated processes do not fire, only the first start and last exit do
+    synthetic = SyntheticProcessSource()
+    synthetic.start(engine.feed)
+    synthetic.started(1, 'zoom.exe')
+    synthetic.started(2, 'ZOOM.EXE')
+    synthetic.exited(1)
+    synthetic.exited(2)
+    synthetic.focused(3, 'game.exe')
+    synthetic.focused(3, 'game.exe')
+    synthetic.focused(5, 'explorer.exe')
+    if fired != ['unmute', 'mute', 'mute', 'unmute']:
+        raise AssertionError('rules fired %s' % fired)
+
+    # An id reused between two polls is an exit and a start
+    fired.clear()
+    table = SimProcessTable(10)
+    table.reuse(4, 'zoom.exe')
+    source = SnapshotProcessSource(list_pids=table.pids, get_name=table.name, get_created=table.created)
+    source._callback = engine.feed
+    source._watches = engine.watches
+    source.poll()
+    table.reuse(4, 'zoom.exe')
+    source.poll()
+    if fired != ['mute', 'unmute'] or engine.running('zoom.exe') != 1:
+        raise AssertionError('reusing the id of zoom.exe fired %s' % fired)
+
+    # A rule added while its process runs gets the same check
+    fired.clear()
+    table.names[44], table.times[44] = 'teams.exe', 0.0
+    source.poll()
+    engine.compile(rules + [('teams.exe', 'exit', lambda: fired.append('teams exit'))])
+    source.rewatch()
+    table.reuse(44, 'teams.exe')
+    source.poll()
+    if fired != ['teams exit']:
+        raise AssertionError('reusing the id of teams.exe after its rule was added fired %s' % fired)
+    return results
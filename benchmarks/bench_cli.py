@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.harness import benchmark
+
+MAIN = Path(__file__).resolve().parents[1] / 'main.py'
+
+
+def startup_time(*args: str, repeat: int=5) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        subprocess.run([sys.executable, str(MAIN), *args], env=os.environ, check=True, capture_output=True)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    return min(samples)
+
+
+@benchmark
+def bench_cli_startup():
+    return {
+        'cli.startup[--logs]': startup_time('--logs'),
+        'cli.startup[--toggle]': startup_time('--toggle'),
+    }
@@ -0,0 +1,125 @@
+import time
+
+from audio_control import Device, _AudioController
+from benchmarks.harness import benchmark, time_per_call
+from reconcile import MuteReconciler
+from sim_backend import SYSTEM, ERole
+
+
+def make_controller(devices: int) -> _AudioController:
+    SYSTEM.reset(devices)
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    return controller
+
+
+@benchmark
+def bench_toggle():
+    results = {}
+    # Three roles give one to three distinct devices behind the controller
+    for n in (1, 2, 3):
+        controller = make_controller(n)
+        results['controller.toggle[devices=%d]' % n] = time_per_call(controller.toggle, number=200)
+        controller.mute()
+        results['controller.mute_idempotent[devices=%d]' % n] = time_per_call(controller.mute, number=200)
+        controller.stop()
+    return results
+
+
+@benchmark
+def bench_reconcile():
+    results = {}
+    for n in (1, 8, 32):
+        SYSTEM.reset(0)
+        devs = [Device(SYSTEM.add_device()) for _ in range(n)]
+        reconciler = MuteReconciler()
+        state = [False]
+
+        def flip():
+            state[0] = not state[0]
+            reconciler.reconcile(devs, state[0])
+
+        results['reconcile.flip[devices=%d]' % n] = time_per_call(flip, number=100)
+        for dev in devs:
+            dev.destroy()
+    return results
+
+
+@benchmark
+def bench_reload_storm():
+    results = {}
+    controller = make_controller(2)
+    a, b = list(SYSTEM.endpoints)
+    ids = [a, b]
+    i = [0]
+
+    def switch():
+        i[0] += 1
+        SYSTEM.set_default(ERole.eCommunications, ids[i[0] % 2], notify=False)
+        controller.reload(ERole.eCommunications)
+
+    results['controller.reload'] = time_per_call(switch, number=50)
+    controller.stop()
+
+    # The same switches delivered as device change notifications, timed until the controller settles
+    controller = make_controller(2)
+    ids = list(SYSTEM.endpoints)
+    start = time.perf_counter_ns()
+    for n in range(50):
+        SYSTEM.set_default(ERole.eCommunications, ids[n % 2])
+    controller.wait_reloads()
+    results['controller.reload_storm[events=50]'] = (time.perf_counter_ns() - start) / 1000
+    controller.stop()
+    return results
+
+
+@benchmark
+def bench_status_fanout():
+    results = {}
+    for n in (1, 10, 100):
+        controller = make_controller(1)
+        for _ in range(n):
+            controller.add_status_listener(lambda status: None)
+        update = controller._update_status(ERole.eCommunications)
+        results['controller.status_fanout[listeners=%d]' % n] = time_per_call(update, number=200)
+        controller.stop()
+    return results
+
+
+@benchmark
+def bench_device_levels():
+    results = {}
+    for n in (1, 2, 3):
+        controller = make_controller(n)
+        listener = lambda levels: None
+        controller.add_device_level_listener(listener, 3600)
+        controller.add_level_listener(listener, 3600)
+        results['controller.level_tick[devices=%d]' % n] = time_per_call(controller.level_notifier, number=200)
+
+        # One meter read per distinct device per tick, mute state comes from the callbacks
+        SYSTEM.calls.clear()
+        controller.level_notifier()
+        if SYSTEM.calls['GetPeakValue'] != n or SYSTEM.calls['GetMute']:
+            raise AssertionError('tick with %d devices made %s' % (n, dict(SYSTEM.calls)))
+        controller.mute()
+        SYSTEM.calls.clear()
+        if set(controller.device_levels().values()) != {0.0} or SYSTEM.calls['GetPeakValue']:
+            raise AssertionError('muted devices should read as 0 without a meter call')
+        controller.remove_device_level_listener(listener)
+        controller.remove_level_listener(listener)
+        if n < 3:
+            controller.stop()
+
+    # The sampler runs as fast as its fastest listener and slows down again once that one leaves
+    fast, slow = lambda level: None, lambda level: None
+    controller.add_level_listener(slow, 0.5)
+    controller.add_level_listener(fast, 1 / 60)
+    if controller._level_worker.interval != 1 / 60:
+        raise AssertionError('sampling every %s s with a 60Hz listener' % controller._level_worker.interval)
+    controller.remove_level_listener(fast)
+    if controller._level_worker.interval != 0.5:
+        raise AssertionError('sampling every %s s after the 60Hz listener left' % controller._level_worker.interval)
+    controller.remove_level_listener(slow)
+    controller.stop()
+    return results
@@ -0,0 +1,37 @@
+import time
+
+import psutil
+
+from audio_engine import EngineSupervisor
+from benchmarks.harness import benchmark, report_only, time_per_call
+from commons import MicStatus
+
+# Process spawn and heartbeat timing
+report_only('engine.restart')
+
+
+@benchmark
+def bench_engine():
+    # The child process gets the simulated backend through the environment
+    supervisor = EngineSupervisor()
+    supervisor.load()
+    try:
+        results = {
+            'engine.round_trip[ping]': time_per_call(supervisor.ping, number=200),
+            'engine.toggle[devices=1]': time_per_call(supervisor.toggle, number=200),
+            'engine.status_read': time_per_call(supervisor.status, number=2000),
+        }
+
+        # Kill the engine and time until a new one serves the desired state again
+        supervisor.mute()
+        generation = supervisor.health()['engine']['generation']
+        start = time.perf_counter()
+        psutil.Process(supervisor.pid).kill()
+        while supervisor.health()['engine']['generation'] == generation or supervisor.status() != MicStatus.MUTED:
+            if time.perf_counter() - start > 15:
+                raise AssertionError('engine was not restarted with the muted state')
+            time.sleep(0.001)
+        results['engine.restart'] = (time.perf_counter() - start) * 1e6
+    finally:
+        supervisor.stop()
+    return results
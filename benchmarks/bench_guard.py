@@ -0,0 +1,122 @@
+import time
+
+from audio_control import Device, _AudioController
+from benchmarks.harness import benchmark, report_only, time_per_call
+from device_guard import CLOSED, CONFIG, METRICS, OPEN, DeviceGuard, GuardConfig, deadline
+from sim_backend import SYSTEM
+
+# A count of deadlines, each one a sleep
+report_only('guard.time_to_trip')
+
+
+@benchmark
+def bench_guard_overhead():
+    SYSTEM.reset(1)
+    dev = Device(next(iter(SYSTEM.endpoints.values())))
+    # Only threads that must stay responsive hand calls over to the device's worker
+    with deadline():
+        results = {'guard.get_mute[deadline]': time_per_call(dev.read_muted, number=500)}
+    results['guard.get_mute[direct]'] = time_per_call(dev.read_muted, number=500)
+    dev.destroy()
+
+    # A probe that raises on a background thread opens the circuit again, one that returns closes it
+    config = GuardConfig()
+    config.backoff = 0.0
+    guard = DeviceGuard('probe', config=config)
+    for _ in range(config.failure_threshold):
+        guard.breaker.failure()
+
+    def fail():
+        raise OSError('device gone')
+
+    try:
+        guard.call(fail)
+    except OSError:
+        pass
+    if guard.breaker.state != OPEN:
+        raise AssertionError('a failed probe left the circuit %s' % guard.breaker.state)
+    guard.call(lambda: None)
+    if guard.breaker.state != CLOSED:
+        raise AssertionError('a good probe left the circuit %s' % guard.breaker.state)
+    return results
+
+
+@benchmark
+def bench_guard_hung_device():
+    # The communications mic is healthy, the other roles share one that hangs on every call
+    SYSTEM.reset(2)
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    healthy, hung = SYSTEM.endpoints.values()
+
+    timeout, CONFIG.timeout = CONFIG.timeout, 0.05
+    trips = METRICS['trips']
+    # Toggled from a hotkey, which must not wait for the hung device
+    with deadline():
+        try:
+            for name in ('GetMute', 'SetMute', 'GetPeakValue'):
+                hung.delays[name] = 1.0
+
+            # Until the breaker opens every toggle waits for the deadline
+            start = time.perf_counter()
+            while METRICS['trips'] == trips:
+                controller.toggle()
+                if time.perf_counter() - start > 5:
+                    raise AssertionError('circuit breaker did not trip on a hung device')
+            time_to_trip = time.perf_counter() - start
+
+            states = [h['state'] for h in controller.health()['devices'].values()]
+            if states.count(OPEN) != 1:
+                raise AssertionError('expected exactly one degraded device, got %s' % states)
+
+            def toggle():
+                result = controller.toggle()
+                if result.unconverged != [hung.id]:
+                    raise AssertionError('healthy device did not converge: %s' % result)
+
+            degraded = time_per_call(toggle, number=50)
+        finally:
+            CONFIG.timeout = timeout
+            hung.delays.clear()
+            controller.stop()
+
+    return {
+        'guard.time_to_trip[deadline=50ms]': time_to_trip * 1e6,
+        'guard.toggle_with_degraded_device': degraded,
+    }
+
+
+@benchmark
+def bench_guard_hung_background():
+    # The level sampler and the reload thread give up on a hung device instead of hanging with it
+    dev, = SYSTEM.reset(1)
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    samples = []
+    listener = samples.append
+    controller.add_level_listener(listener, 0.01)
+
+    timeout, CONFIG.timeout = CONFIG.timeout, 0.05
+    try:
+        dev.delays['GetPeakValue'] = 1.0
+        samples.clear()
+        time.sleep(0.5)
+        if len(samples) < 5:
+            raise AssertionError('a hung meter held the level sampler to %d samples in 0.5s' % len(samples))
+
+        # The new default hangs while it is activated, its reload gives up and the old device stays
+        hung = SYSTEM.add_device()
+        hung.delays['Activate'] = 1.0
+        SYSTEM.set_default_all(hung.id)
+        if not controller.wait_reloads(0.5):
+            raise AssertionError('a hung activation held up the device reload')
+        if controller.get_dev().id != dev.id:
+            raise AssertionError('a device that never activated replaced %s' % dev.id)
+    finally:
+        CONFIG.timeout = timeout
+        dev.delays.clear()
+        controller.remove_level_listener(listener)
+        controller.stop()
+    return {}
@@ -0,0 +1,102 @@
+import random
+import time
+
+from benchmarks.harness import benchmark
+from hotkey_engine import MODIFIERS, HotkeyEngine, KeyEvent, parse_binding
+
+MODS = ['ctrl', 'alt', 'shift', 'windows']
+KEYS = [chr(c) for c in range(ord('a'), ord('z') + 1)] + [str(d) for d in range(10)] + ['f%d' % n for n in range(1, 13)]
+
+
+def make_bindings(n: int, rng: random.Random):
+    bindings = set()
+    while len(bindings) < n:
+        mods = rng.sample(MODS, rng.randint(1, 3))
+        step = '+'.join(mods + [rng.choice(KEYS)])
+        # Every fifth binding is a two step sequence
+        if len(bindings) % 5 == 4:
+            step += ', ' + rng.choice(KEYS)
+        bindings.add(step)
+    return sorted(bindings)
+
+
+def make_stream(n: int, rng: random.Random):
+    # Mostly plain typing with the odd modifier chord
+    events = []
+    t = 0.0
+    while len(events) < n:
+        t += 0.05
+        mods = rng.sample(MODS, rng.randint(1, 2)) if rng.random() < 0.1 else []
+        key = rng.choice(KEYS)
+        events += [KeyEvent(m, True, t) for m in mods] + [KeyEvent(key, True, t), KeyEvent(key, False, t)]
+        events += [KeyEvent(m, False, t) for m in reversed(mods)]
+    return events
+
+
+class LinearMatcher:
+    # One check per binding per event, the cost model of one hook per hotkey; first steps only
+    def __init__(self, bindings):
+        self.bindings = [parse_binding(b)[0] for b in bindings]
+        self.mods = 0
+
+    def feed(self, event: KeyEvent):
+        mod = MODIFIERS.get(event.name)
+        if mod is not None:
+            if event.down:
+                self.mods |= mod
+            else:
+                self.mods &= ~mod
+            return False
+        for mods, key in self.bindings:
+            if event.down and key == event.name and mods == self.mods:
+                return True
+        return False
+
+
+def count_matches(feed, events) -> int:
+    return sum(1 for event in events if feed(event))
+
+
+def ns_per_event(feed, events) -> float:
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        for event in events:
+            feed(event)
+        best = min(best, (time.perf_counter_ns() - start) / len(events))
+    return best
+
+
+@benchmark
+def bench_hotkey_matching():
+    rng = random.Random(42)
+    events = make_stream(20000, rng)
+    results = {}
+    for n in (3, 30, 300):
+        bindings = make_bindings(n, rng)
+        engine = HotkeyEngine()
+        engine.compile({b: (lambda: None) for b in bindings})
+        # Reported in microseconds like every other metric, 0.5 us = 500 ns per key event
+        results['hotkeys.per_event[bindings=%d]' % n] = ns_per_event(engine.feed, events) / 1000
+        results['hotkeys.per_event_linear[bindings=%d]' % n] = ns_per_event(LinearMatcher(bindings).feed, events) / 1000
+
+        # Both match the same chords, or the comparison is meaningless
+        chords = [b for b in bindings if ',' not in b]
+        engine.compile({b: (lambda: None) for b in chords})
+        expected, linear = count_matches(engine.feed, events), count_matches(LinearMatcher(chords).feed, events)
+        if expected != linear:
+            raise AssertionError('linear matcher found %d hotkeys, the trie %d' % (linear, expected))
+
+    # With shift held the hook names the shifted character, the scan code stays that of the digit
+    scan_codes = {'1': (2,), '/': (53,), 'ctrl': (29,), 'shift': (42,)}
+    fired = []
+    engine = HotkeyEngine()
+    engine.compile({'ctrl+shift+1': lambda: fired.append('1'), 'ctrl+shift+/': lambda: fired.append('/')},
+                   lambda key: scan_codes[key])
+    for name, code in (('!', 2), ('?', 53)):
+        for event in (KeyEvent('ctrl', True, 0.0, 29), KeyEvent('shift', True, 0.0, 42), KeyEvent(name, True, 0.0, code),
+                      KeyEvent(name, False, 0.0, code), KeyEvent('shift', False, 0.0, 42), KeyEvent('ctrl', False, 0.0, 29)):
+            engine.feed(event)
+    if fired != ['1', '/']:
+        raise AssertionError('shifted chords fired %s' % fired)
+    return results
@@ -0,0 +1,67 @@
+import itertools
+from pathlib import Path
+
+from benchmarks.harness import benchmark, time_per_call
+from commons import MicStatus
+from level_feed import LevelFeed
+from level_reader import LevelReader
+
+SAMPLES = 1000
+
+
+# Samples are published by hand here, the sampler itself is covered by bench_controller
+class _IdleController:
+    def add_status_listener(self, listener):
+        pass
+
+    def remove_status_listener(self, listener):
+        pass
+
+    def add_level_listener(self, listener, interval=None):
+        pass
+
+    def remove_level_listener(self, listener):
+        pass
+
+
+@benchmark
+def bench_level_feed():
+    results = {}
+    # The runner works in a temporary directory
+    feed = LevelFeed(_IdleController(), path=Path('bench.levels'))
+    feed.start(60)
+    reader = LevelReader(feed.path)
+    capacity = feed.capacity
+
+    def fill_ring():
+        for i in range(capacity):
+            feed.publish_level(i / capacity)
+
+    try:
+        results['level_feed.publish'] = time_per_call(lambda: feed.publish_level(0.5), number=SAMPLES)
+        statuses = itertools.cycle([MicStatus.MUTED, MicStatus.UNMUTED])
+        results['level_feed.publish_status'] = time_per_call(lambda: feed.publish_status(next(statuses)), number=SAMPLES)
+
+        results['level_reader.status'] = time_per_call(reader.status, number=SAMPLES)
+        results['level_reader.latest'] = time_per_call(reader.latest, number=SAMPLES)
+        # A reader catching up on a full ring, per record
+        results['level_reader.read_new[per record]'] = time_per_call(reader.read_new, number=1, setup=fill_ring) / capacity
+
+        fill_ring()
+        if [level for _, level in reader.read_new()] != [i / capacity for i in range(capacity)]:
+            raise AssertionError('reader did not get the ring back in order')
+        for _ in range(capacity + 10):
+            feed.publish_level(0.25)
+        if len(reader.read_new()) != capacity:
+            raise AssertionError('a reader that fell behind should get the last full ring')
+        feed.publish_status(MicStatus.INUSE)
+        if reader.status()[0] != 'INUSE':
+            raise AssertionError('status word does not match the last published status')
+    finally:
+        reader.close()
+        feed.stop()
+
+    with LevelReader(feed.path) as reader:
+        if reader.writer_pid() or reader.status()[0] != 'DISABLED':
+            raise AssertionError('a stopped feed should read as disabled with no writer')
+    return results
@@ -0,0 +1,95 @@
+import time
+from pathlib import Path
+
+from audio_control import _AudioController, RAMP_CONFIG, RAMP_VOLUMES, RAMPS
+from benchmarks.harness import benchmark, percentile, report_only
+from sim_backend import SYSTEM
+
+RAMPS_PER_DURATION = 10
+VOLUME = 0.8
+
+# Timer wake-ups on the ramp thread, not work
+report_only('ramp.overrun', 'ramp.step_lateness')
+
+
+def settle(controller: _AudioController):
+    ramp = controller.get_dev()._ramp
+    if ramp is not None and not ramp.finished.wait(1):
+        raise AssertionError('ramp never finished')
+
+
+def timed_ramps(controller: _AudioController, dev, ramp_ms: int) -> dict:
+    # mute() call time, and how long after the ramp's planned end the final SetMute landed, in microseconds
+    RAMP_CONFIG.update(ramp_ms=ramp_ms)
+    finished = []
+    set_mute = dev.SetMute
+
+    def recording_set_mute(muted, ctx=None):
+        finished.append(time.perf_counter())
+        return set_mute(muted, ctx)
+
+    dev.SetMute = recording_set_mute
+    calls, overruns = [], []
+    try:
+        for _ in range(RAMPS_PER_DURATION):
+            controller.unmute()
+            settle(controller)
+            finished.clear()
+            start = time.perf_counter()
+            controller.mute()
+            calls.append((time.perf_counter() - start) * 1e6)
+            ramp = controller.get_dev()._ramp
+            if not ramp.finished.wait(1) or not finished:
+                raise AssertionError('mute ramp never finished')
+            overruns.append((finished[0] - ramp.end) * 1e6)
+            if not dev.muted or dev.volume != VOLUME:
+                raise AssertionError('ramp ended with muted=%s volume=%s' % (dev.muted, dev.volume))
+    finally:
+        dev.SetMute = set_mute
+    return {
+        'ramp.mute_call[%dms]' % ramp_ms: percentile(calls, 0.5),
+        'ramp.overrun.p50[%dms]' % ramp_ms: max(percentile(overruns, 0.5), 0.0),
+    }
+
+
+@benchmark
+def bench_ramp():
+    results = {}
+    dev, = SYSTEM.reset(1)
+    dev.volume = VOLUME
+    # The runner works in a temporary directory
+    RAMP_VOLUMES.path = Path('ramps.json')
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    try:
+        results.update(timed_ramps(controller, dev, 10))
+        results.update(timed_ramps(controller, dev, 50))
+        # The p99 mostly measures GIL hand-offs with other threads, the median is the timer itself
+        results['ramp.step_lateness.p50'] = RAMPS.stats()['step_lateness']['p50_us']
+
+        # Turned around half way, the fade goes back up from where it was and the volume is kept
+        controller.unmute()
+        time.sleep(0.025)
+        controller.mute()
+        controller.unmute()
+        settle(controller)
+        if dev.muted or dev.volume != VOLUME:
+            raise AssertionError('reversed ramp ended with muted=%s volume=%s' % (dev.muted, dev.volume))
+        if RAMP_VOLUMES.load():
+            raise AssertionError('finished ramps left their volume on disk')
+
+        # Killed mid-fade: the next load puts the volume back
+        RAMP_VOLUMES.begin(controller.get_dev().id, VOLUME)
+        dev.volume = 0.1
+        restarted = _AudioController()
+        restarted.load()
+        restarted.stop()
+        if dev.volume != VOLUME or RAMP_VOLUMES.load():
+            raise AssertionError('volume after a crashed ramp is %s' % dev.volume)
+    finally:
+        RAMP_CONFIG.update(ramp_ms=0)
+        controller.stop()
+        RAMPS.stop()
+        RAMP_VOLUMES.close()
+    return results
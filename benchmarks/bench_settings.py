@@ -0,0 +1,30 @@
+from time import perf_counter_ns
+
+from benchmarks.harness import benchmark, percentile, report_only
+from settings import Settings
+
+# Bound by the settings file write, and by where the set puts this listener among the others
+report_only('settings.update_to_applied')
+
+
+@benchmark
+def bench_settings_update():
+    applied = [0]
+
+    def listener(settings):
+        applied[0] = perf_counter_ns()
+
+    Settings.add_listener(listener)
+    try:
+        samples = []
+        for i in range(200):
+            start = perf_counter_ns()
+            Settings.update({'show_level': bool(i % 2)})
+            samples.append((applied[0] - start) / 1000)
+    finally:
+        Settings.remove_listener(listener)
+
+    return {
+        'settings.update_to_applied.p50': percentile(samples, 0.5),
+        'settings.update_to_applied.p95': percentile(samples, 0.95),
+    }
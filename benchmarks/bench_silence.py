@@ -0,0 +1,114 @@
+import random
+import time
+
+from audio_control import _AudioController
+from benchmarks.harness import benchmark, time_per_call
+from commons import MicStatus
+from silence import SilenceDetector, SilenceMuter
+from sim_backend import SYSTEM
+
+HZ = 10
+TIMEOUT = 30.0
+
+
+def trace(rng: random.Random, seconds: float, db: float, spread: float=3.0):
+    # Peak levels of room noise around `db`
+    return [10 ** (rng.gauss(db, spread) / 20) for _ in range(int(seconds * HZ))]
+
+
+def speech(rng: random.Random, seconds: float, pause: float=2.0):
+    # Talking at about -20dB with a quiet pause every few seconds, ending on a word
+    levels = []
+    while len(levels) < seconds * HZ:
+        levels += trace(rng, pause, -55) + trace(rng, 4, -20, 6)
+    return levels[-int(seconds * HZ):]
+
+
+def first_fire(detector: SilenceDetector, levels, start: float) -> float | None:
+    # Seconds from `start` until the detector fires, None if it does not
+    for i, level in enumerate(levels):
+        now = start + i / HZ
+        if detector.feed(level, now):
+            return now - start
+    return None
+
+
+@benchmark
+def bench_silence_detector():
+    rng = random.Random(1)
+    results = {}
+    detector = SilenceDetector(TIMEOUT)
+    detector.arm(0.0)
+    samples = trace(rng, 100, -55)
+    i = [0]
+
+    def feed():
+        i[0] += 1
+        detector.feed(samples[i[0] % len(samples)], i[0] / HZ)
+
+    results['silence.feed'] = time_per_call(feed, number=5000)
+
+    # A quiet room: talking with pauses never fires, the timeout after the last word does
+    detector = SilenceDetector(TIMEOUT)
+    detector.arm(0.0)
+    first_fire(detector, trace(rng, 60, -55), 0.0)
+    detector.arm(60.0)
+    if first_fire(detector, speech(rng, 300), 60.0) is not None:
+        raise AssertionError('fired during speech, threshold %.1f dB' % detector.threshold())
+    fired = first_fire(detector, trace(rng, 60, -55), 360.0)
+    if fired is None or abs(fired - TIMEOUT) > 2 / HZ:
+        raise AssertionError('quiet room fired after %s s' % fired)
+
+    # A fan comes on above the floor: learnt within a few minutes, speech still counts as voice
+    detector.arm(0.0)
+    fired = first_fire(detector, trace(rng, 900, -38), 0.0)
+    if fired is None or fired > 600:
+        raise AssertionError('noisy room fired after %s s' % fired)
+    detector.arm(0.0)
+    if first_fire(detector, speech(rng, 300), 0.0) is not None:
+        raise AssertionError('speech in the noisy room was taken for silence, threshold %.1f dB' % detector.threshold())
+    return results
+
+
+@benchmark
+def bench_silence_muter():
+    # End to end on the simulated backend: an open microphone reading silence is muted after the timeout
+    SYSTEM.reset(1)
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    # Another subscriber at 50Hz speeds up the samples the muter gets
+    fast = lambda level: None
+    controller.add_level_listener(fast, 0.02)
+    muter = SilenceMuter(controller)
+    muter.stop()
+    muter.start(0.2)
+    start = time.perf_counter()
+    try:
+        while controller.status() != MicStatus.MUTED:
+            if time.perf_counter() - start > 5:
+                raise AssertionError('silence did not mute the microphone')
+            time.sleep(0.01)
+    finally:
+        muter.stop()
+        controller.remove_level_listener(fast)
+    if muter.mutes != 1:
+        raise AssertionError('muted %d times' % muter.mutes)
+
+    # Another role reporting muted while the main microphone stays open does not restart the timer
+    controller.unmute()
+    muter.start(0.2)
+    controller.add_level_listener(fast, 0.02)
+    start = time.perf_counter()
+    try:
+        while controller.status() != MicStatus.MUTED:
+            if time.perf_counter() - start > 5:
+                raise AssertionError('reports from other roles kept the silence timer from firing')
+            muter.on_status(MicStatus.MUTED)
+            muter.on_status(MicStatus.UNMUTED)
+            time.sleep(0.01)
+    finally:
+        muter.stop()
+        controller.remove_level_listener(fast)
+        controller.stop()
+    return {}
@@ -0,0 +1,15 @@
+import time
+
+from benchmarks.harness import benchmark
+from benchmarks.soak import check, soak
+
+
+@benchmark
+def bench_soak():
+    # A short soak, long runs go through `python -m benchmarks.soak`
+    iterations = 4000
+    start = time.perf_counter_ns()
+    samples = soak(iterations, sample_every=200)
+    elapsed = time.perf_counter_ns() - start
+    check(samples)
+    return {'soak.iteration[switch,toggle,save,hotplug]': elapsed / iterations / 1000}
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from audio_control import _AudioController
+from benchmarks.harness import benchmark
+from sim_backend import SYSTEM, ERole
+
+DURATION = 1.0
+
+
+@benchmark
+def bench_stress_toggle_during_reloads():
+    # Toggles and status reads from several threads while every role keeps switching devices
+    SYSTEM.reset(3)
+    for dev in SYSTEM.endpoints.values():
+        # Give COM calls some width so readers and reloads really overlap
+        dev.delays['*'] = 0.00002
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+
+    ids = list(SYSTEM.endpoints)
+    stop = threading.Event()
+    errors = []
+    toggles = [0]
+    reloads = [0]
+
+    def reloader():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            for i, role in enumerate(ERole):
+                SYSTEM.set_default(role, ids[(n + i) % len(ids)], notify=False)
+                controller.reload(role)
+                reloads[0] += 1
+
+    def toggler():
+        while not stop.is_set():
+            try:
+                result = controller.toggle()
+                if result is not None and not result.converged:
+                    errors.append('toggle did not converge: %s' % result.unconverged)
+                controller.status()
+                controller.level()
+            except Exception as e:
+                errors.append(repr(e))
+            toggles[0] += 1
+
+    threads = [threading.Thread(target=reloader)] + [threading.Thread(target=toggler) for _ in range(3)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        raise AssertionError('%d errors during toggle/reload stress, first: %s' % (len(errors), errors[0]))
+    if any(dev.destroyed() for dev in controller.devs.values()):
+        raise AssertionError('controller left with destroyed devices: %s' % dict(controller.devs))
+    controller.stop()
+
+    return {
+        'stress.toggle_during_reloads': elapsed * 1e6 / toggles[0],
+        'stress.reload_during_toggles': elapsed * 1e6 / reloads[0],
+    }
@@ -0,0 +1,61 @@
+import itertools
+import shutil
+import time
+from pathlib import Path
+
+import timeline
+from benchmarks.harness import benchmark, time_per_call
+from timeline import (DEVICE, HEADER, MAGIC, MARK, NS_PER_DAY, RECORD, START, STATUS, STOP, VERSION,
+                      TimelineWriter, day_name)
+
+DAYS = 90
+# Mute changes per working day, an 8h session each day
+CHANGES = 200
+MINUTE = 60 * 10**9
+MUTED, UNMUTED = 3, 1
+ROLE = timeline.COMMUNICATIONS
+
+
+def write_history(directory: Path, first_day: int) -> int:
+    # Returns the expected muted time: every change holds for a minute, starting muted
+    directory.mkdir(parents=True, exist_ok=True)
+    muted = 0
+    for day in range(first_day, first_day + DAYS):
+        t = day * NS_PER_DAY + 9 * 60 * MINUTE
+        records = [(t, START, 0, 0, 0), (t, DEVICE, ROLE, 0, 1)]
+        for i in range(CHANGES):
+            status = MUTED if i % 2 == 0 else UNMUTED
+            records.append((t + i * MINUTE, STATUS, ROLE, status, 0))
+            if status == MUTED:
+                muted += MINUTE
+            if i % 50 == 49:
+                records.append((t + i * MINUTE + 1, MARK, 0, 0, 0))
+        records.append((t + CHANGES * MINUTE, STOP, 0, 0, 0))
+        with open(directory / day_name(day), 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION) + b''.join(RECORD.pack(*r) for r in records))
+    return muted
+
+
+@benchmark
+def bench_timeline():
+    results = {}
+    directory = Path('timeline')
+    first_day = time.time_ns() // NS_PER_DAY - DAYS
+    expected_muted = write_history(directory, first_day)
+
+    result = timeline.report(directory)
+    if result.durations[MUTED] != expected_muted or result.changes != DAYS * (CHANGES - 1):
+        raise AssertionError('report does not add up: %s' % result)
+    results['timeline.report[%d days]' % DAYS] = time_per_call(lambda: timeline.report(directory), number=1, repeat=3)
+    since = (first_day + DAYS - 7) * NS_PER_DAY
+    results['timeline.report[last 7 days]'] = time_per_call(lambda: timeline.report(directory, since=since), number=5)
+
+    # The status path only queues a tuple; a fresh directory on every run of the suite
+    shutil.rmtree('live', ignore_errors=True)
+    writer = TimelineWriter(Path('live'), flush_interval=0.05)
+    statuses = itertools.cycle([MUTED, UNMUTED])
+    results['timeline.record_status'] = time_per_call(lambda: writer.status(ROLE, next(statuses)), number=2000)
+    writer.close()
+    if timeline.report(Path('live')).changes != writer.written - 3:
+        raise AssertionError('live timeline lost records')
+    return results
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import event_trace
+from audio_control import _AudioController
+from benchmarks.harness import benchmark
+from sim_backend import SYSTEM, ERole
+
+ROLES = [ERole.eCommunications, ERole.eMultimedia, ERole.eConsole]
+
+
+def write_storm(path: str, switches: int=200) -> int:
+    # A dock/undock storm: every role flips between two mics, with foreign mute changes and hotkeys in between
+    ids = ['{0.0.1.00000000}.{dock-%d}' % i for i in range(2)]
+    recorder = event_trace.TraceRecorder(path)
+    for n in range(switches):
+        dev_id = ids[n % 2]
+        for role in ROLES:
+            recorder.device_changed(role.value, dev_id)
+        recorder.volume_notify(dev_id, n % 3 == 0, False)
+        if n % 10 == 0:
+            recorder.hotkey('toggle')
+    recorder.close()
+    return recorder.count
+
+
+@benchmark
+def bench_trace_replay():
+    path = os.path.join(tempfile.mkdtemp(prefix='better-mute-trace-'), 'storm.bmt')
+    write_storm(path)
+
+    SYSTEM.reset()
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    stats = event_trace.replay(path, controller)
+    controller.stop()
+
+    # Cut off in the middle of a device id, as a crash while recording leaves it
+    with open(path, 'rb') as f:
+        data = f.read()
+    truncated = path + '.truncated'
+    with open(truncated, 'wb') as f:
+        f.write(data[:event_trace.HEADER.size + event_trace.RECORD.size + event_trace.LENGTH.size + 5])
+    if list(event_trace.read_trace(truncated)):
+        raise AssertionError('a trace cut off in its first string should read as empty')
+    return {
+        'trace.replay_per_event[storm]': stats.elapsed * 1e6 / stats.events,
+        'trace.replay_settled[storm]': stats.settled * 1e6,
+    }
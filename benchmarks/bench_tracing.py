@@ -0,0 +1,73 @@
+import time
+
+from PySide6.QtWidgets import QApplication
+
+import tracing
+from benchmarks.harness import benchmark, percentile, time_per_call
+from hotkey_engine import SyntheticSource
+
+# Every stage of a hotkey toggle that should share one correlation id
+STAGES = ('keyboard.hook', 'hotkey.match', 'hotkey', 'controller.toggle', 'device.SetMute', 'device.OnNotify',
+          'listeners.notify', 'status_icon.update_status', 'status_icon.paint')
+
+
+@benchmark
+def bench_tracing_overhead():
+    def disabled():
+        with tracing.span('bench'):
+            pass
+
+    results = {'tracing.span[disabled]': time_per_call(disabled, number=5000)}
+    tracing.enable()
+    try:
+        results['tracing.span[enabled]'] = time_per_call(disabled, number=5000)
+    finally:
+        tracing.disable()
+    return results
+
+
+@benchmark
+def bench_tracing_hotkey_to_paint():
+    app = QApplication.instance() or QApplication([])
+
+    from audio_control import AudioController
+    from hotkeys import HotkeyManager
+    from status_icon import StatusIcon
+
+    AudioController.load()
+    AudioController.start()
+    icon = StatusIcon()
+    source = SyntheticSource()
+    hotkeys = HotkeyManager(source)
+    app.processEvents()
+
+    def press():
+        source.press('ctrl+alt+m', time.time())
+        # Deliver the queued status signal, then the repaint it schedules
+        app.processEvents()
+        app.processEvents()
+
+    results = {'hotkey.toggle_to_paint[tracing=off]': time_per_call(press, number=50)}
+
+    tracing.enable()
+    try:
+        results['hotkey.toggle_to_paint[tracing=on]'] = time_per_call(press, number=50)
+
+        latencies = []
+        for _ in range(20):
+            press()
+            spans = tracing.events(tracing.slowest_action('hotkey'))
+            names = {span[0] for span in spans}
+            missing = [stage for stage in STAGES if stage not in names]
+            if missing:
+                raise AssertionError('hotkey trace is missing %s' % missing)
+            latencies.append((max(s[1] + s[2] for s in spans) - min(s[1] for s in spans)) / 1000)
+            tracing.enable()
+        results['tracing.keypress_to_paint'] = percentile(latencies, 0.5)
+    finally:
+        tracing.disable()
+        hotkeys.unregister_hotkeys()
+        icon.hide()
+        app.processEvents()
+        AudioController.stop()
+    return results
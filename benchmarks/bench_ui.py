@@ -0,0 +1,90 @@
+from PySide6.QtWidgets import QApplication
+
+from benchmarks.harness import benchmark, time_per_call
+from commons import MicStatus
+
+
+@benchmark
+def bench_status_icon_paint():
+    app = QApplication.instance() or QApplication([])
+
+    from status_icon import StatusIcon
+    icon = StatusIcon()
+    # Let the offscreen platform expose the window, hidden widgets skip painting
+    app.processEvents()
+    results = {}
+
+    icon.update_status(MicStatus.MUTED)
+    results['status_icon.paint[muted]'] = time_per_call(icon.repaint, number=200)
+
+    levels = [0.0, 0.2, 0.5, 0.1]
+    i = [0]
+
+    def frame():
+        i[0] += 1
+        icon.update_level(levels[i[0] % len(levels)])
+        icon.repaint()
+
+    icon.update_status(MicStatus.UNMUTED)
+    results['status_icon.paint[level]'] = time_per_call(frame, number=200)
+
+    icon.level_timer.stop()
+    icon.hide()
+    app.processEvents()
+    return results
+
+
+@benchmark
+def bench_status_icon_screens():
+    app = QApplication.instance() or QApplication([])
+    if len(app.screens()) < 3:
+        raise AssertionError('expected the three offscreen screens from benchmarks/screens.json')
+
+    from status_icon import StatusIcon
+    icon = StatusIcon()
+    icon.update_status(MicStatus.UNMUTED)
+    icon.level_timer.stop()
+    results = {}
+    # Every sample changes the dot's width, the worst case for metering
+    levels = [0.15, 0.35, 0.6, 0.25]
+    # Sub-pixel changes, the common case
+    quiet = [0.101, 0.102, 0.103, 0.104]
+    i = [0]
+
+    def metering(samples):
+        def frame():
+            i[0] += 1
+            icon.update_level(samples[i[0] % len(samples)])
+            app.processEvents()
+        return frame
+
+    for mode, screens in (('primary', 1), ('all', 3)):
+        icon.update_settings({'status_corner': 'top-right', 'status_screens': mode, 'show_level': False})
+        app.processEvents()
+        if len(icon.dots) != screens:
+            raise AssertionError('%s mode shows %d indicators' % (mode, len(icon.dots)))
+        places = sum(dot.places for dot in icon.dots.values())
+        results['status_icon.level_frame[screens=%d]' % screens] = time_per_call(metering(levels), number=200)
+        results['status_icon.level_quiet[screens=%d]' % screens] = time_per_call(metering(quiet), number=200)
+        if sum(dot.places for dot in icon.dots.values()) != places:
+            raise AssertionError('level metering re-read the screen geometry')
+
+    for screen, dot in icon.dots.items():
+        if not screen.geometry().contains(dot.geometry()):
+            raise AssertionError('indicator for %s is placed at %s' % (screen.name(), dot.geometry()))
+
+    # Following the focus moves the one indicator, its native window stays
+    icon.update_settings({'status_corner': 'top-right', 'status_screens': 'focused', 'show_level': False})
+    app.processEvents()
+    dot, = icon.dots.values()
+    window = dot.winId()
+    for screen in app.screens():
+        icon.on_foreground(screen.name())
+        app.processEvents()
+        if list(icon.dots.items()) != [(screen, dot)] or dot.winId() != window:
+            raise AssertionError('focusing %s replaced the indicator' % screen.name())
+        if not screen.geometry().contains(dot.geometry()):
+            raise AssertionError('indicator moved to %s is placed at %s' % (screen.name(), dot.geometry()))
+    icon.hide()
+    app.processEvents()
+    return results
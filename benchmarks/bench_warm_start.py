@@ -0,0 +1,64 @@
+import threading
+import time
+from pathlib import Path
+
+from audio_control import _AudioController
+from benchmarks.harness import benchmark, report_only
+from commons import MicStatus
+from sim_backend import SYSTEM
+from state_cache import StateCache
+
+# A slow driver: every endpoint activation takes this long
+ACTIVATE_DELAY = 0.02
+REPEAT = 3
+
+# Dominated by the simulated activation delay and the loader thread
+report_only('startup.first_correct_status')
+
+
+def first_correct_status(cache: StateCache | None) -> float:
+    # From controller creation to a listener seeing the device's real status, in microseconds
+    for dev in SYSTEM.reset(3):
+        dev.muted = True
+        dev.delays['Activate'] = ACTIVATE_DELAY
+    correct = threading.Event()
+    seen = []
+
+    def listener(status: MicStatus):
+        seen.append(status)
+        if status == MicStatus.MUTED:
+            correct.set()
+
+    start = time.perf_counter_ns()
+    controller = _AudioController()
+    if cache is not None:
+        controller.warm_start(cache)
+    controller.add_status_listener(listener)
+    loader = controller.load_async(start=True)
+    if not correct.wait(5):
+        raise AssertionError('listener never saw the real status')
+    elapsed = (time.perf_counter_ns() - start) / 1000
+    loader.join(5)
+    if seen[-1] != MicStatus.MUTED:
+        raise AssertionError('status ended as %s after loading' % seen[-1])
+    controller.stop()
+    return elapsed
+
+
+@benchmark
+def bench_warm_start():
+    results = {}
+    results['startup.first_correct_status[cold]'] = min(first_correct_status(None) for _ in range(REPEAT))
+
+    cache = StateCache(Path('state.json'))
+    for role in ('eCommunications', 'eMultimedia', 'eConsole'):
+        cache.record(role, None, MicStatus.MUTED.name)
+    cache.save()
+    results['startup.first_correct_status[warm]'] = min(first_correct_status(cache) for _ in range(REPEAT))
+
+    # A stale cache shows the wrong status only until the devices are loaded
+    for role in ('eCommunications', 'eMultimedia', 'eConsole'):
+        cache.record(role, None, MicStatus.UNMUTED.name)
+    cache.save()
+    results['startup.first_correct_status[stale cache]'] = min(first_correct_status(cache) for _ in range(REPEAT))
+    return results
@@ -0,0 +1,54 @@
+import io
+import threading
+import time
+
+from benchmarks.harness import benchmark, time_per_call
+from watch import NdjsonWriter
+
+
+# A consumer that stops reading, every write blocks until released
+class StalledStream(io.RawIOBase):
+    def __init__(self):
+        self.release = threading.Event()
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.release.wait()
+        self.data += data
+        return len(data)
+
+
+@benchmark
+def bench_watch_writer():
+    results = {}
+    sink = io.BytesIO()
+    writer = NdjsonWriter(sink)
+    writer.start()
+    results['watch.emit[level]'] = time_per_call(lambda: writer.emit('level', level=0.25), number=2000)
+    writer.stop()
+    if writer.writes * 100 > writer.written:
+        raise AssertionError('%d writes for %d lines, output is not batched' % (writer.writes, writer.written))
+
+    # Listeners must not notice a consumer that stopped reading
+    stream = StalledStream()
+    writer = NdjsonWriter(stream)
+    writer.start()
+    time.sleep(0.1)
+    results['watch.emit[level,stalled consumer]'] = time_per_call(lambda: writer.emit('level', level=0.25), number=2000)
+    writer.emit('status', status='MUTED')
+    if not writer.dropped or writer.pending > writer.max_pending:
+        raise AssertionError('stalled consumer did not drop levels')
+
+    # Status changes alone stay bounded too, the latest one is kept
+    for i in range(writer.max_pending * 2):
+        writer.emit('status', status='UNMUTED' if i % 2 else 'MUTED')
+    if writer.pending > writer.max_pending:
+        raise AssertionError('%d lines pending for a stalled consumer' % writer.pending)
+    stream.release.set()
+    writer.stop()
+    if not stream.data.endswith(b'"status":"UNMUTED"}\n'):
+        raise AssertionError('the latest status change was dropped')
+    return results
@@ -0,0 +1,93 @@
+import json
+import statistics
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Set
+
+# Every benchmark returns {metric name: microseconds}, lower is better
+BENCHMARKS: List[Callable[[], Dict[str, float]]] = []
+# Pure Python reference workload, used to scale a baseline taken on another machine
+CALIBRATION = '_calibration'
+# Metric name prefixes that are reported and stored but never fail the run
+REPORT_ONLY: Set[str] = set()
+
+
+def benchmark(fn: Callable[[], Dict[str, float]]):
+    BENCHMARKS.append(fn)
+    return fn
+
+
+def report_only(*prefixes: str):
+    # For metrics bounded by sleeps, timers, sockets or thread and process hand-offs rather than by our code
+    REPORT_ONLY.update(prefixes)
+
+
+def gated(name: str) -> bool:
+    return name != CALIBRATION and not name.startswith(tuple(REPORT_ONLY))
+
+
+def median_results(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    # Per metric median over several runs of the suite
+    names = {name for run in runs for name in run}
+    return {name: statistics.median(run[name] for run in runs if name in run) for name in names}
+
+
+def time_per_call(fn: Callable[[], object], number: int=100, repeat: int=5, setup: Callable[[], object] | None=None) -> float:
+    # Best of `repeat` rounds of the mean time of one call, in microseconds
+    fn()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter_ns()
+        for _ in range(number):
+            fn()
+        samples.append((perf_counter_ns() - start) / number / 1000)
+    return min(samples)
+
+
+def calibrate() -> float:
+    def workload():
+        table = {}
+        for i in range(1000):
+            table[i % 97] = table.get(i % 97, 0) + i
+        return sorted(table.values())
+
+    return time_per_call(workload, number=50, repeat=15)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def load_baseline(path: Path) -> Dict[str, float]:
+    if not path.exists():
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('results', {})
+
+
+def save_results(path: Path, results: Dict[str, float]):
+    with open(path, 'w') as f:
+        json.dump({'unit': 'us', 'results': dict(sorted(results.items()))}, f, indent=4)
+        f.write('\n')
+
+
+def machine_scale(results: Dict[str, float], baseline: Dict[str, float]) -> float:
+    if results.get(CALIBRATION) and baseline.get(CALIBRATION):
+        return results[CALIBRATION] / baseline[CALIBRATION]
+    return 1.0
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float, min_delta: float) -> List[str]:
+    scale = machine_scale(results, baseline)
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None or not gated(name):
+            continue
+        base *= scale
+        if value > base * (1 + tolerance) and value - base > min_delta:
+            regressions.append(name)
+    return regressions
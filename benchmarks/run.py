@@ -0,0 +1,114 @@
+import argparse
+import importlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / 'baseline.json'
+
+# Must be set before anything imports audio_control or creates a QApplication
+os.environ.setdefault('BETTER_MUTE_BACKEND', 'sim')
+# Three screens with mixed DPI for the status icon
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen:configfile=%s' % (BENCH_DIR / 'screens.json'))
+# The offscreen platform warns about every window resize
+os.environ.setdefault('QT_LOGGING_RULES', 'default.warning=false')
+sys.path.insert(0, str(ROOT))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Better Mute benchmarks')
+    parser.add_argument('-k', '--filter', default='', help='Only run benchmarks whose function name contains this')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help='Baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Add metrics the baseline does not have yet instead of comparing')
+    parser.add_argument('--rebaseline', action='store_true', help='Overwrite the baseline with this run (commit it on its own)')
+    parser.add_argument('--runs', type=int, default=3, help='Run the suite this many times and compare the medians')
+    parser.add_argument('--output', type=Path, help='Also write results of this run to a file')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed slowdown relative to baseline (0.5 = 50%%)')
+    parser.add_argument('--min-delta', type=float, default=1.0, help='Ignore regressions smaller than this many microseconds')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show application logs')
+    return parser.parse_args()
+
+
+def leaked_threads(before, timeout: float=2.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        leaked = [thread for thread in threading.enumerate() if thread not in before and thread.is_alive()]
+        if not leaked or time.monotonic() > deadline:
+            return leaked
+        time.sleep(0.01)
+
+
+def main() -> int:
+    args = parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    # Settings are read from and written to the working directory
+    os.chdir(tempfile.mkdtemp(prefix='better-mute-bench-'))
+
+    from benchmarks.harness import BENCHMARKS, CALIBRATION, calibrate, compare, gated, load_baseline, machine_scale, median_results, save_results
+    for path in sorted(BENCH_DIR.glob('bench_*.py')):
+        importlib.import_module('benchmarks.%s' % path.stem)
+
+    runs = []
+    for run in range(args.runs):
+        results = {CALIBRATION: calibrate()}
+        for bench in BENCHMARKS:
+            if args.filter not in bench.__name__:
+                continue
+            print('running %s.%s (%d/%d)' % (bench.__module__, bench.__name__, run + 1, args.runs), flush=True)
+            threads = set(threading.enumerate())
+            results.update(bench())
+            # Whatever a benchmark starts it stops, or it would slow down the ones after it
+            leaked = leaked_threads(threads)
+            if leaked:
+                raise AssertionError('%s left threads running: %s' % (bench.__name__, sorted(t.name for t in leaked)))
+        # Calibrate at both ends, the run may have been slowed down part way
+        results[CALIBRATION] = min(results[CALIBRATION], calibrate())
+        runs.append(results)
+    results = median_results(runs)
+
+    baseline = load_baseline(args.baseline)
+    scale = machine_scale(results, baseline)
+    print('machine speed factor relative to baseline: %.2f (above 1 is slower)' % scale)
+    width = max((len(name) for name in results), default=0)
+    for name, value in sorted(results.items()):
+        base = baseline.get(name)
+        base = base * scale if base and name != CALIBRATION else base
+        change = '' if not base else '%+7.1f%%' % ((value / base - 1) * 100)
+        print('%-*s %12.3f us %s%s' % (width, name, value, change, '' if gated(name) or name == CALIBRATION else ' (not gated)'))
+
+    if args.output:
+        save_results(args.output, results)
+
+    if args.rebaseline and not args.filter:
+        save_results(args.baseline, results)
+        print('baseline written to %s' % args.baseline)
+        return 0
+    if args.save_baseline or args.rebaseline:
+        # Metrics are stored at the baseline machine's speed, so the existing calibration stays valid.
+        # Only new metrics are added unless asked to overwrite, a feature change must not move the numbers it is checked against
+        added = {name: value / scale for name, value in results.items()
+                 if name != CALIBRATION and (args.rebaseline or name not in baseline)}
+        baseline.update(added)
+        if CALIBRATION not in baseline:
+            baseline[CALIBRATION] = results[CALIBRATION]
+        save_results(args.baseline, baseline)
+        print('%d metrics written to %s' % (len(added), args.baseline))
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    for name in regressions:
+        print('REGRESSION %s: %.2f us (baseline %.2f us scaled to %.2f us)' % (name, results[name], baseline[name], baseline[name] * scale))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Soak the real controller with device churn, toggles and settings saves.
+
+    python -m benchmarks.soak --iterations 50000
+
+Every `--sample-every` iterations the controller is let to settle and the
+thread count, RSS, logger registry size and live Device objects are
+recorded. After the warm-up no count may end up above its early range, and
+RSS may grow by at most `--rss-slack` MB.
+"""
+import argparse
+import gc
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+
+os.environ.setdefault('BETTER_MUTE_BACKEND', 'sim')
+sys.path.insert(0, str(ROOT))
+
+# Endpoints present at once, hot-plugging replaces the oldest with one that has a new id
+MAX_ENDPOINTS = 4
+
+
+@dataclass
+class Sample:
+    iteration: int
+    threads: int
+    rss: int
+    loggers: int
+    devices: int
+
+
+class SoakFailure(AssertionError):
+    pass
+
+
+def take_sample(iteration: int) -> Sample:
+    import psutil
+    from audio_control import Device
+
+    gc.collect()
+    return Sample(
+        iteration=iteration,
+        threads=threading.active_count(),
+        rss=psutil.Process().memory_info().rss,
+        loggers=len(logging.Logger.manager.loggerDict),
+        devices=sum(1 for o in gc.get_objects() if isinstance(o, Device)),
+    )
+
+
+def soak(iterations: int, sample_every: int=500, seed: int=1) -> List[Sample]:
+    from audio_control import _AudioController
+    from settings import Settings
+    from sim_backend import SYSTEM, ERole
+
+    rng = random.Random(seed)
+    roles = list(ERole)
+    SYSTEM.reset(2)
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    listener = lambda status: None
+    controller.add_status_listener(listener)
+
+    samples = []
+    for i in range(iterations):
+        op = rng.random()
+        if op < 0.5:
+            SYSTEM.set_default(rng.choice(roles), rng.choice(list(SYSTEM.endpoints)))
+        elif op < 0.8:
+            controller.toggle()
+        elif op < 0.85:
+            Settings.update({'device_timeout_ms': rng.choice((400, 500))})
+        else:
+            # Docking: a device with a new id appears, the oldest one goes away
+            SYSTEM.add_device()
+            if len(SYSTEM.endpoints) > MAX_ENDPOINTS:
+                SYSTEM.remove_device(next(iter(SYSTEM.endpoints)))
+            for role in roles:
+                if SYSTEM.defaults[role] is None:
+                    SYSTEM.set_default(role, rng.choice(list(SYSTEM.endpoints)))
+
+        if i % sample_every == 0 or i == iterations - 1:
+            if not controller.wait_reloads(10):
+                raise SoakFailure('device reloads did not settle at iteration %d' % i)
+            samples.append(take_sample(i))
+
+    controller.remove_status_listener(listener)
+    controller.stop()
+    return samples
+
+
+def check(samples: List[Sample], rss_slack: int=16 << 20, warmup: float=0.2):
+    # A leak keeps growing: everything late in the run is above anything seen early on
+    steady = samples[max(1, int(len(samples) * warmup)):]
+    if len(steady) < 4:
+        raise SoakFailure('not enough samples, run more iterations')
+    quarter = max(1, len(steady) // 4)
+    early, late = steady[:quarter], steady[-quarter:]
+
+    problems = []
+    for field in ('threads', 'loggers', 'devices'):
+        before = max(getattr(s, field) for s in early)
+        after = min(getattr(s, field) for s in late)
+        if after > before:
+            problems.append('%s grew from at most %d to at least %d' % (field, before, after))
+    growth = min(s.rss for s in late) - min(s.rss for s in early)
+    if growth > rss_slack:
+        problems.append('RSS grew by %.1f MB' % (growth / (1 << 20)))
+    if problems:
+        raise SoakFailure('; '.join(problems))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Better Mute soak test')
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--sample-every', type=int, default=500)
+    parser.add_argument('--rss-slack', type=float, default=16, help='Allowed RSS growth after warm-up, in MB')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    # Settings are saved to the working directory
+    os.chdir(tempfile.mkdtemp(prefix='better-mute-soak-'))
+
+    start = time.perf_counter()
+    samples = soak(args.iterations, args.sample_every, args.seed)
+    print('%d iterations in %.1fs' % (args.iterations, time.perf_counter() - start))
+    print('%10s %8s %10s %8s %8s' % ('iteration', 'threads', 'rss MB', 'loggers', 'devices'))
+    for s in samples:
+        print('%10d %8d %10.1f %8d %8d' % (s.iteration, s.threads, s.rss / (1 << 20), s.loggers, s.devices))
+    try:
+        check(samples, int(args.rss_slack * (1 << 20)))
+    except SoakFailure as e:
+        print('FAIL: %s' % e)
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
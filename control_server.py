@@ -0,0 +1,366 @@
+import hmac
+import json
+import logging
+import selectors
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import api_token
+from audio_control import AudioController
+from commons import MicStatus
+from device_guard import use_deadline
+from hotkeys import ACTIONS, ROLES
+from settings import Settings
+
+HOST = '127.0.0.1'
+PROTOCOL_VERSION = 2
+# Status frames a client may fall behind by before it is disconnected
+MAX_BACKLOG = 64
+# Unsent bytes held for a client, beyond that it is behind
+MAX_OUTBOX = 16 * 1024
+# Kernel buffering per client, autotuning would otherwise hide a stalled reader behind megabytes
+SEND_BUFFER = 32 * 1024
+MAX_LINE = 4096
+# Requests a client may have waiting for the command thread, beyond that they are answered busy
+MAX_QUEUED = 16
+COMMANDS = ACTIONS + ('status', 'levels')
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+class _Client:
+    __slots__ = ('sock', 'name', 'inbox', 'outbox', 'replies', 'cursor', 'levels', 'level_seq', 'writing', 'authed', 'queued')
+
+    def __init__(self, sock: socket.socket, name: str, cursor: int):
+        self.sock = sock
+        self.name = name
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+        self.replies = deque()
+        self.cursor = cursor
+        self.levels = False
+        self.level_seq = 0
+        self.writing = False
+        self.authed = False
+        self.queued = 0
+
+
+# One selector thread for every client, a client that stops reading is dropped instead of waited on
+class ControlServer:
+    def __init__(self, controller=None):
+        self.logger = logging.getLogger('ControlServer')
+        self.controller = AudioController if controller is None else controller
+        self.port: int | None = None
+        self._configured_port = 0
+        self._lock = threading.Lock()
+        self._clients: Dict[socket.socket, _Client] = {}
+        self._frames = deque(maxlen=MAX_BACKLOG)
+        self._seq = 0
+        self._status: MicStatus | None = None
+        self._level_frame = b''
+        self._level_seq = 0
+        self._level_clients = 0
+        self._token = ''
+        self._sock: socket.socket | None = None
+        self._selector: selectors.BaseSelector | None = None
+        self._wake_r = self._wake_w = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self.dropped_levels = 0
+        self.dropped_clients = 0
+        Settings.add_listener(self.update_settings)
+
+    def update_settings(self, settings):
+        port = settings.get('api_port', 0)
+        if port == self._configured_port:
+            return
+        self._configured_port = port
+        self.stop()
+        if port:
+            try:
+                self.start(port)
+            except OSError as e:
+                self.logger.error('Could not listen on %s:%s', HOST, port, exc_info=e)
+
+    def start(self, port: int=0) -> int:
+        if self._running:
+            return self.port
+
+        self._token = api_token.load(create=True)
+        self._sock = socket.create_server((HOST, port))
+        self._sock.setblocking(False)
+        self.port = self._sock.getsockname()[1]
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._sock, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        # Commands touch devices and may wait for a deadline, never on the I/O thread
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='ControlServer', initializer=use_deadline)
+
+        self._running = True
+        self.controller.add_status_listener(self._on_status)
+        self._thread = threading.Thread(target=self._run, name='ControlServer', daemon=True)
+        self._thread.start()
+        self.logger.info('Listening on %s:%d', HOST, self.port)
+        return self.port
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self.controller.remove_status_listener(self._on_status)
+        self._wake()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        if self._level_clients:
+            self._level_clients = 0
+            self.controller.remove_level_listener(self._on_level)
+
+        for client in list(self._clients.values()):
+            self._close(client)
+        self._selector.close()
+        self._sock.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        self._thread = None
+        self.logger.info('Stopped listening on %s:%d', HOST, self.port)
+        self.port = None
+
+    def clients(self) -> int:
+        return len(self._clients)
+
+    # Called on controller threads, constant time regardless of the number of clients
+
+    def _on_status(self, status: MicStatus):
+        with self._lock:
+            # Every role reports the change, clients only need it once
+            if status == self._status:
+                return
+            self._status = status
+            self._seq += 1
+            self._frames.append(encode({'event': 'status', 'status': status.name}))
+        self._wake()
+
+    def _on_level(self, level: float):
+        with self._lock:
+            self._level_frame = encode({'event': 'level', 'level': round(level, 4)})
+            self._level_seq += 1
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            # Full means a wake-up is already pending
+            pass
+
+    # I/O thread
+
+    def _run(self):
+        while self._running:
+            for key, _ in self._selector.select():
+                if key.fileobj is self._sock:
+                    self._accept()
+                elif key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._read(key.data)
+            self._flush()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self._sock.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+            with self._lock:
+                client = _Client(sock, '%s:%d' % address, self._seq)
+                self._clients[sock] = client
+            client.outbox += encode({'event': 'hello', 'version': PROTOCOL_VERSION, 'auth': 'token'})
+            self._selector.register(sock, selectors.EVENT_READ, client)
+            self.logger.debug('Client %s connected', client.name)
+
+    def _read(self, client: _Client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close(client)
+            return
+
+        client.inbox += data
+        *lines, rest = client.inbox.split(b'\n')
+        if len(rest) > MAX_LINE:
+            self.logger.warning('Client %s sent an overlong line, disconnecting', client.name)
+            self._close(client)
+            return
+        client.inbox = bytearray(rest)
+        for line in lines:
+            if line.strip() and not self._request(client, bytes(line)):
+                self.logger.warning('Client %s sent an invalid request, disconnecting', client.name)
+                self._close(client)
+                return
+
+    def _request(self, client: _Client, line: bytes) -> bool:
+        # Checked here rather than on the command thread, a client that is not ours never queues anything
+        try:
+            text = line.decode('utf-8').strip()
+            request = json.loads(text) if text.startswith('{') else {'cmd': text}
+        except ValueError:
+            return False
+        if not isinstance(request, dict):
+            return False
+        command = request.get('cmd')
+
+        if not client.authed:
+            token = request.get('token')
+            if command != 'auth' or not isinstance(token, str) or not hmac.compare_digest(token, self._token):
+                return False
+            with self._lock:
+                client.authed = True
+                client.cursor = self._seq
+                status = self._status
+            reply = {'event': 'result', 'ok': True}
+            if 'id' in request:
+                reply['id'] = request['id']
+            client.outbox += encode(reply)
+            if status is not None:
+                client.outbox += encode({'event': 'status', 'status': status.name})
+            return True
+
+        if command not in COMMANDS:
+            return False
+        with self._lock:
+            busy = client.queued >= MAX_QUEUED
+            if not busy:
+                client.queued += 1
+        if busy:
+            self._reply(client, request, {'event': 'result', 'ok': False, 'error': 'busy'})
+        else:
+            self._executor.submit(self._execute, client, request)
+        return True
+
+    def _reply(self, client: _Client, request: dict, reply: dict):
+        if 'id' in request:
+            reply['id'] = request['id']
+        client.replies.append(encode(reply))
+
+    def _flush(self):
+        with self._lock:
+            seq, frames = self._seq, list(self._frames)
+            level_seq, level_frame = self._level_seq, self._level_frame
+
+        for client in list(self._clients.values()):
+            # Nothing but the hello before the token
+            behind = seq - client.cursor if client.authed else 0
+            if behind > len(frames):
+                self.logger.warning('Client %s fell %d status updates behind, disconnecting', client.name, behind)
+                self.dropped_clients += 1
+                self._close(client)
+                continue
+            if behind and len(client.outbox) < MAX_OUTBOX:
+                client.outbox += b''.join(frames[len(frames) - behind:])
+                client.cursor = seq
+            while client.replies:
+                client.outbox += client.replies.popleft()
+            if client.levels and client.level_seq != level_seq:
+                # Only a client that has taken everything so far gets the latest sample
+                if client.outbox:
+                    self.dropped_levels += 1
+                else:
+                    client.outbox += level_frame
+                    client.level_seq = level_seq
+
+            if client.outbox:
+                try:
+                    sent = client.sock.send(client.outbox)
+                    del client.outbox[:sent]
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self._close(client)
+                    continue
+            if client.writing != bool(client.outbox):
+                client.writing = bool(client.outbox)
+                self._selector.modify(client.sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if client.writing else 0), client)
+
+    def _close(self, client: _Client):
+        with self._lock:
+            if self._clients.pop(client.sock, None) is None:
+                return
+            levels, client.levels = client.levels, False
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        if levels and self._running:
+            self._executor.submit(self._subscribe_levels, -1)
+        self.logger.debug('Client %s disconnected', client.name)
+
+    # Command thread
+
+    def _subscribe_levels(self, delta: int):
+        before = self._level_clients
+        self._level_clients += delta
+        if not before and self._level_clients:
+            self.controller.add_level_listener(self._on_level)
+        elif before and not self._level_clients:
+            self.controller.remove_level_listener(self._on_level)
+
+    def _execute(self, client: _Client, request: dict):
+        with self._lock:
+            client.queued -= 1
+        try:
+            reply = self._handle(client, request)
+        except Exception as e:
+            reply = {'ok': False, 'error': str(e)}
+        reply['event'] = 'result'
+        self._reply(client, request, reply)
+        self._wake()
+
+    def _handle(self, client: _Client, request: dict) -> dict:
+        command = request.get('cmd')
+        role = request.get('role')
+        if role is not None and role not in ROLES:
+            raise ValueError('Unknown role "%s"' % role)
+        role = None if role is None else ROLES[role]
+
+        if command in ACTIONS:
+            result = getattr(self.controller, command)(role=role)
+            reply = {'ok': True}
+            if result is not None:
+                reply['converged'] = result.converged
+        elif command == 'status':
+            reply = {'ok': True}
+        elif command == 'levels':
+            on = bool(request.get('on', True))
+            with self._lock:
+                changed = on != client.levels and client.sock in self._clients
+                if changed:
+                    client.levels = on
+            if changed:
+                self._subscribe_levels(1 if on else -1)
+            reply = {'ok': True, 'levels': on}
+        else:
+            raise ValueError('Unknown command "%s"' % command)
+
+        reply['status'] = self.controller.status(role=role).name
+        return reply
@@ -0,0 +1,216 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+import tracing
+
+CLOSED    = 'closed'
+OPEN      = 'open'
+HALF_OPEN = 'half-open'
+
+# deadline_calls, timeouts, rejected, trips, recoveries
+METRICS: Counter = Counter()
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _metrics_lock:
+        METRICS[name] += 1
+
+
+class _Local(threading.local):
+    # Set on threads that must stay responsive, see use_deadline()
+    deadline = False
+
+
+_local = _Local()
+
+
+def use_deadline(on: bool=True):
+    # Device calls made on the calling thread from now on go to the device's worker under the deadline
+    _local.deadline = on
+
+
+@contextmanager
+def deadline():
+    previous = _local.deadline
+    _local.deadline = True
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+class DeviceTimeout(Exception):
+    pass
+
+
+class DeviceUnavailable(Exception):
+    pass
+
+
+class GuardConfig:
+    def __init__(self):
+        # 0 disables deadlines, calls then run directly on the caller's thread
+        self.timeout = 0.5
+        self.failure_threshold = 3
+        self.backoff = 1.0
+        self.max_backoff = 30.0
+
+    def update(self, timeout_ms: float | None=None, failure_threshold: int | None=None):
+        if timeout_ms is not None:
+            self.timeout = max(timeout_ms, 0) / 1000
+        if failure_threshold is not None:
+            self.failure_threshold = max(failure_threshold, 1)
+
+
+CONFIG = GuardConfig()
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, config: GuardConfig=CONFIG):
+        self.logger = logging.getLogger('CircuitBreaker')
+        self.name = name
+        self.config = config
+        self.state = CLOSED
+        self.failures = 0
+        self._backoff = config.backoff
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            if self.state == OPEN and time.monotonic() >= self._retry_at:
+                # Let a single probe through
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                self.logger.info('%s recovered, closing circuit', self.name)
+                _count('recoveries')
+            self.state = CLOSED
+            self.failures = 0
+            self._backoff = self.config.backoff
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.config.failure_threshold:
+                self.state = OPEN
+                self._retry_at = time.monotonic() + self._backoff
+                self.logger.warning('%s failed %d times, degraded for %.1fs', self.name, self.failures, self._backoff)
+                self._backoff = min(self._backoff * 2, self.config.max_backoff)
+                _count('trips')
+
+
+class _Call:
+    __slots__ = ('fn', 'args', 'cid', 'done', 'result', 'error', 'cancelled')
+
+    def __init__(self, fn: Callable, args: tuple):
+        self.fn = fn
+        self.args = args
+        self.cid = tracing.current()
+        # Held until the worker finishes, a bare lock is the cheapest one-shot signal
+        self.done = threading.Lock()
+        self.done.acquire()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+
+# One device's calls, handed to its worker under the deadline on threads marked by use_deadline()
+class DeviceGuard:
+    def __init__(self, name: str, setup: Callable[[], None] | None=None, teardown: Callable[[], None] | None=None,
+                 config: GuardConfig=CONFIG):
+        self.name = name
+        self.config = config
+        self.breaker = CircuitBreaker(name, config)
+        self._setup = setup
+        self._teardown = teardown
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable, *args):
+        breaker = self.breaker
+        if breaker.state != CLOSED and not breaker.allow():
+            _count('rejected')
+            raise DeviceUnavailable('%s is degraded' % self.name)
+
+        timeout = self.config.timeout
+        # Callbacks fired from inside a device call re-enter on the worker itself
+        if not timeout or not _local.deadline or threading.current_thread() is self._thread:
+            try:
+                result = fn(*args)
+            except Exception:
+                # A probe that fails opens the circuit again instead of leaving it half open
+                breaker.failure()
+                raise
+            # Nothing to reset while the breaker is closed and clean
+            if breaker.failures or breaker.state != CLOSED:
+                breaker.success()
+            return result
+
+        _count('deadline_calls')
+        job = _Call(fn, args)
+        self._ensure_worker()
+        self._queue.put(job)
+        if not job.done.acquire(timeout=timeout):
+            job.cancelled = True
+            _count('timeouts')
+            self.breaker.failure()
+            raise DeviceTimeout('%s did not answer within %.0f ms' % (self.name, timeout * 1000))
+
+        if job.error is not None:
+            self.breaker.failure()
+            raise job.error
+        self.breaker.success()
+        return job.result
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='DeviceGuard %s' % self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        if self._setup is not None:
+            self._setup()
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                if job.cancelled:
+                    continue
+                try:
+                    with tracing.adopt(job.cid):
+                        job.result = job.fn(*job.args)
+                except Exception as e:
+                    job.error = e
+                job.done.release()
+        finally:
+            if self._teardown is not None:
+                self._teardown()
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread = None
+
+    def health(self) -> Dict[str, object]:
+        return {'state': self.breaker.state, 'failures': self.breaker.failures}
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Generic, Iterable, List, Mapping, Tuple, TypeVar
+
+from listeners import PeriodicWorker
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+# Values waiting longer than this for readers are logged
+GRACE_TIMEOUT = 1.0
+REAP_INTERVAL = 0.001
+SLOW_REAP_INTERVAL = 0.1
+
+
+class Snapshot(Generic[K, V]):
+    __slots__ = ('devs', 'version', '_readers')
+
+    def __init__(self, devs: Dict[K, V], version: int):
+        self.devs: Mapping[K, V] = MappingProxyType(devs)
+        self.version = version
+        # list.append/pop are atomic, the length is the number of readers in flight
+        self._readers: List[None] = []
+
+    def readers(self) -> int:
+        return len(self._readers)
+
+
+class _Read:
+    __slots__ = ('_table', '_snapshot')
+
+    def __init__(self, table: 'SnapshotTable'):
+        self._table = table
+
+    def __enter__(self) -> Mapping:
+        self._snapshot = self._table.acquire()
+        return self._snapshot.devs
+
+    def __exit__(self, *_):
+        self._table.release(self._snapshot)
+
+
+# Lock-free reads of an atomically swapped dict, dropped values are retired once no reader can see them
+class SnapshotTable(Generic[K, V]):
+    def __init__(self, devs: Dict[K, V], on_retire: Callable[[V], None], grace_timeout: float=GRACE_TIMEOUT,
+                 setup: Callable[[], None] | None=None, teardown: Callable[[], None] | None=None):
+        self.logger = logging.getLogger('SnapshotTable')
+        self.grace_timeout = grace_timeout
+        self._on_retire = on_retire
+        self._current: Snapshot[K, V] = Snapshot(dict(devs), 0)
+        self._write_lock = threading.Lock()
+        self._superseded: List[Snapshot[K, V]] = []
+        # (value, snapshots that may still hold it, when it was retired)
+        self._pending: List[Tuple[V, List[Snapshot[K, V]], float]] = []
+        self._reaper = PeriodicWorker('SnapshotReaper', self._reap, REAP_INTERVAL, setup=setup, teardown=teardown)
+        self._reaper_lock = threading.Lock()
+        self._warned = False
+
+    @property
+    def current(self) -> Snapshot[K, V]:
+        return self._current
+
+    def acquire(self) -> Snapshot[K, V]:
+        while True:
+            snapshot = self._current
+            snapshot._readers.append(None)
+            if snapshot is self._current:
+                return snapshot
+            # A writer swapped in between, it may not have seen us
+            snapshot._readers.pop()
+
+    def release(self, snapshot: Snapshot[K, V]):
+        snapshot._readers.pop()
+
+    def read(self) -> _Read:
+        return _Read(self)
+
+    def publish(self, devs: Dict[K, V]) -> Snapshot[K, V]:
+        # Returns the snapshot that was replaced
+        with self._write_lock:
+            old = self._current
+            self._current = Snapshot(dict(devs), old.version + 1)
+            self._superseded = [s for s in self._superseded if s.readers()]
+            self._superseded.append(old)
+            return old
+
+    def retire(self, values: Iterable[V]):
+        with self._write_lock:
+            # A superseded snapshot never gains readers, only the ones in flight now can see these values
+            self._superseded = [s for s in self._superseded if s.readers()]
+            blockers = list(self._superseded)
+            now = time.monotonic()
+            self._pending += [(value, blockers, now) for value in values]
+        with self._reaper_lock:
+            self._reaper.start()
+
+    def collect(self) -> int:
+        # Retires every queued value no reader can see any more, without waiting; returns how many are left
+        with self._write_lock:
+            current = self._current.devs.values()
+            ready, waiting = [], []
+            for value, blockers, since in self._pending:
+                # Published again since, it is not retired after all
+                if any(value is d for d in current):
+                    continue
+                blockers = [s for s in blockers if s.readers()]
+                if blockers:
+                    waiting.append((value, blockers, since))
+                else:
+                    ready.append(value)
+            self._pending = waiting
+
+        for value in ready:
+            try:
+                self._on_retire(value)
+            except Exception as e:
+                self.logger.error('Error retiring %s', value, exc_info=e)
+        return len(waiting)
+
+    def _reap(self):
+        if self.collect():
+            oldest = min(since for _, _, since in self._pending) if self._pending else time.monotonic()
+            if time.monotonic() - oldest > self.grace_timeout and not self._warned:
+                # A reader stuck in a hung call, no need to look every millisecond
+                self._warned = True
+                self._reaper.interval = SLOW_REAP_INTERVAL
+                self.logger.warning('Readers have held %d retired values for over %.1fs', len(self._pending), self.grace_timeout)
+            return
+        self._warned = False
+        self._reaper.interval = REAP_INTERVAL
+        with self._reaper_lock:
+            # Stopped only while nothing is queued, a retire() after this starts it again
+            if not self._pending:
+                self._reaper.stop()
+
+    def pending(self) -> int:
+        return len(self._pending)
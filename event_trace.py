@@ -0,0 +1,240 @@
+"""Record and replay of device, volume and hotkey events.
+
+Trace layout (little endian):
+    header: b'BMTR', version u8, 3 pad bytes, wall clock start u64 (ns)
+    record: t u64 (ns since start), kind u8, arg u8, ref u16
+
+Device ids are interned: the first time an id is seen a STRING record with
+`ref` = new index is written, followed by u16 length and the utf-8 id.
+Every other record is a fixed 12 bytes.
+"""
+import argparse
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List
+
+MAGIC = b'BMTR'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xQ')
+RECORD = struct.Struct('<QBBH')
+LENGTH = struct.Struct('<H')
+
+STRING          = 0
+DEVICE_CHANGED  = 1  # arg = ERole value, ref = device id ('' when no device)
+VOLUME_NOTIFY   = 2  # arg = bMuted | ours << 1, ref = device id
+HOTKEY          = 3  # ref = action name
+
+KIND_NAMES = {DEVICE_CHANGED: 'device', VOLUME_NOTIFY: 'volume', HOTKEY: 'hotkey'}
+
+
+@dataclass
+class TraceEvent:
+    t: int
+    kind: int
+    arg: int
+    value: str
+
+    @property
+    def muted(self) -> bool:
+        return bool(self.arg & 1)
+
+    @property
+    def ours(self) -> bool:
+        return bool(self.arg & 2)
+
+
+class TraceRecorder:
+    def __init__(self, path: str):
+        self.logger = logging.getLogger('TraceRecorder')
+        self.path = path
+        self._file = open(path, 'wb', buffering=64 * 1024)
+        self._lock = threading.Lock()
+        self._strings: Dict[str, int] = {}
+        self._start = time.perf_counter_ns()
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time_ns()))
+        self.count = 0
+
+    def _ref(self, value: str) -> int:
+        ref = self._strings.get(value)
+        if ref is None:
+            ref = len(self._strings)
+            self._strings[value] = ref
+            data = value.encode('utf-8')
+            self._file.write(RECORD.pack(0, STRING, 0, ref) + LENGTH.pack(len(data)) + data)
+        return ref
+
+    def write(self, kind: int, arg: int, value: str, t: int | None=None):
+        with self._lock:
+            if self._file is None:
+                return
+            # Taken under the lock, records from different threads stay in time order
+            if t is None:
+                t = time.perf_counter_ns() - self._start
+            ref = self._ref(value or '')
+            self._file.write(RECORD.pack(t, kind, arg, ref))
+            self.count += 1
+
+    def device_changed(self, role: int, dev_id: str | None):
+        self.write(DEVICE_CHANGED, role, dev_id or '')
+
+    def volume_notify(self, dev_id: str, muted: bool, ours: bool):
+        self.write(VOLUME_NOTIFY, int(bool(muted)) | int(ours) << 1, dev_id)
+
+    def hotkey(self, action: str):
+        self.write(HOTKEY, 0, action)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self.logger.info('Wrote %d events to %s', self.count, self.path)
+
+
+def read_trace(path: str) -> Iterator[TraceEvent]:
+    with open(path, 'rb') as f:
+        magic, version, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a better-mute trace' % path)
+
+        strings: List[str] = []
+        while True:
+            record = f.read(RECORD.size)
+            if len(record) < RECORD.size:
+                return
+            t, kind, arg, ref = RECORD.unpack(record)
+            if kind == STRING:
+                # A string cut short by a crash while it was written ends the trace
+                data = f.read(LENGTH.size)
+                if len(data) < LENGTH.size:
+                    return
+                length, = LENGTH.unpack(data)
+                data = f.read(length)
+                if len(data) < length:
+                    return
+                strings.append(data.decode('utf-8'))
+                continue
+            yield TraceEvent(t, kind, arg, strings[ref])
+
+
+_recorder: TraceRecorder | None = None
+
+
+def start_recording(path: str) -> TraceRecorder:
+    global _recorder
+    stop_recording()
+    _recorder = TraceRecorder(path)
+    return _recorder
+
+
+def stop_recording():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+
+
+# Hooks called from the COM callbacks and hotkeys, free when nothing is recording
+def record_device_changed(role: int, dev_id: str | None):
+    if _recorder is not None:
+        _recorder.device_changed(role, dev_id)
+
+
+def record_volume_notify(dev_id: str, muted: bool, ours: bool):
+    if _recorder is not None:
+        _recorder.volume_notify(dev_id, muted, ours)
+
+
+def record_hotkey(action: str):
+    if _recorder is not None:
+        _recorder.hotkey(action)
+
+
+@dataclass
+class ReplayStats:
+    events: int
+    skipped: int
+    elapsed: float
+    settled: float
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.settled if self.settled else 0.0
+
+
+def replay(path: str, controller, realtime: bool=False, speed: float=1.0, settle_timeout: float=30.0) -> ReplayStats:
+    # Volume notifications caused by the controller are skipped, the replayed hotkeys and reloads cause them again
+    from sim_backend import SYSTEM, ERole
+
+    events = skipped = 0
+    start = time.perf_counter_ns()
+
+    for event in read_trace(path):
+        if realtime:
+            delay = event.t / speed - (time.perf_counter_ns() - start)
+            if delay > 0:
+                time.sleep(delay / 1e9)
+
+        if event.kind == DEVICE_CHANGED:
+            if event.value and event.value not in SYSTEM.endpoints:
+                SYSTEM.add_device(event.value)
+            SYSTEM.set_default(ERole(event.arg), event.value or None)
+        elif event.kind == VOLUME_NOTIFY and not event.ours:
+            dev = SYSTEM.endpoints.get(event.value) or SYSTEM.add_device(event.value)
+            dev.external_set_mute(event.muted)
+        elif event.kind == VOLUME_NOTIFY:
+            skipped += 1
+            continue
+        elif event.kind == HOTKEY:
+            # "toggle" or "toggle:communications"
+            action, _, role = event.value.partition(':')
+            if role:
+                getattr(controller, action)(role=ERole['e' + role.capitalize()])
+            else:
+                getattr(controller, action)()
+        events += 1
+
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+
+    # Device changes are handled on the reload thread, wait for it to drain
+    controller.wait_reloads(settle_timeout)
+
+    return ReplayStats(events, skipped, elapsed, (time.perf_counter_ns() - start) / 1e9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or replay a better-mute event trace')
+    parser.add_argument('command', choices=['dump', 'replay'])
+    parser.add_argument('trace')
+    parser.add_argument('--realtime', action='store_true', help='Keep the recorded timing instead of replaying as fast as possible')
+    parser.add_argument('--speed', type=float, default=1.0, help='Time scale for --realtime')
+    args = parser.parse_args()
+
+    if args.command == 'dump':
+        for event in read_trace(args.trace):
+            print('%12.3f ms %-6s %s%s' % (event.t / 1e6, KIND_NAMES.get(event.kind), event.value,
+                                          ' muted=%s ours=%s' % (event.muted, event.ours) if event.kind == VOLUME_NOTIFY else
+                                          ' role=%s' % event.arg if event.kind == DEVICE_CHANGED else ''))
+        return
+
+    os.environ['BETTER_MUTE_BACKEND'] = 'sim'
+    logging.basicConfig(level=logging.WARNING)
+    from sim_backend import SYSTEM
+    from audio_control import _AudioController
+
+    SYSTEM.reset()
+    controller = _AudioController()
+    controller.load()
+    controller.start()
+    stats = replay(args.trace, controller, realtime=args.realtime, speed=args.speed)
+    print('replayed %d events (%d own notifications skipped) in %.3fs, settled after %.3fs, %.0f events/s'
+          % (stats.events, stats.skipped, stats.elapsed, stats.settled, stats.events_per_second))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
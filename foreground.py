@@ -0,0 +1,124 @@
+import ctypes
+import logging
+import sys
+import threading
+from ctypes import wintypes
+from typing import Callable
+
+from listeners import ListenerSet
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+# A window dragged to another monitor keeps the focus, its move ends with this
+EVENT_SYSTEM_MOVESIZEEND = 0x000B
+WINEVENT_OUTOFCONTEXT = 0x0000
+MONITOR_DEFAULTTONEAREST = 2
+
+
+class MONITORINFOEXW(ctypes.Structure):
+    _fields_ = [
+        ('cbSize', wintypes.DWORD),
+        ('rcMonitor', wintypes.RECT),
+        ('rcWork', wintypes.RECT),
+        ('dwFlags', wintypes.DWORD),
+        ('szDevice', wintypes.WCHAR * 32),
+    ]
+
+
+def supported() -> bool:
+    return sys.platform == 'win32'
+
+
+if supported():
+    WINEVENTPROC = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                      wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+    user32 = ctypes.windll.user32
+    user32.SetWinEventHook.restype = wintypes.HANDLE
+    user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WINEVENTPROC,
+                                       wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+    user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+    user32.GetForegroundWindow.restype = wintypes.HWND
+    user32.MonitorFromWindow.restype = wintypes.HANDLE
+    user32.MonitorFromWindow.argtypes = [wintypes.HWND, wintypes.DWORD]
+    user32.GetMonitorInfoW.argtypes = [wintypes.HANDLE, ctypes.POINTER(MONITORINFOEXW)]
+    user32.GetWindowThreadProcessId.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.DWORD)]
+
+
+# Foreground monitor and process id from WinEvent hooks, installed on the first listener's thread
+class _ForegroundWatcher:
+    def __init__(self):
+        self.logger = logging.getLogger('ForegroundWatcher')
+        self._hooks_lock = threading.Lock()
+        self._listeners = ListenerSet('ForegroundWatcher', on_first=self._update_hooks, on_last=self._update_hooks)
+        self._window_listeners = ListenerSet('ForegroundWatcher', on_first=self._update_hooks, on_last=self._update_hooks)
+        self._hooks = []
+        self._proc = None
+        self.monitor: str | None = None
+        self.pid: int | None = None
+
+    def add_listener(self, listener: Callable[[str], None]):
+        if self._listeners.add(listener) and self.monitor is not None:
+            listener(self.monitor)
+
+    def remove_listener(self, listener: Callable[[str], None]):
+        self._listeners.remove(listener)
+
+    def add_window_listener(self, listener: Callable[[int], None]):
+        if self._window_listeners.add(listener) and self.pid is not None:
+            listener(self.pid)
+
+    def remove_window_listener(self, listener: Callable[[int], None]):
+        self._window_listeners.remove(listener)
+
+    def _update_hooks(self):
+        with self._hooks_lock:
+            if self._listeners or self._window_listeners:
+                if self._proc is None:
+                    self._install()
+            elif self._proc is not None:
+                self._uninstall()
+
+    def _install(self):
+        if not supported():
+            return
+        # Kept referenced for as long as the hooks exist
+        self._proc = WINEVENTPROC(self._on_event)
+        for event in (EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_MOVESIZEEND):
+            hook = user32.SetWinEventHook(event, event, None, self._proc, 0, 0, WINEVENT_OUTOFCONTEXT)
+            if hook:
+                self._hooks.append(hook)
+            else:
+                self.logger.warning('SetWinEventHook(%#x) failed', event)
+        self._on_event()
+
+    def _uninstall(self):
+        for hook in self._hooks:
+            user32.UnhookWinEvent(hook)
+        self._hooks = []
+        self._proc = None
+        self.monitor = None
+        self.pid = None
+
+    def _on_event(self, *_):
+        # Exceptions cannot propagate out of a ctypes callback
+        try:
+            hwnd = user32.GetForegroundWindow()
+            if not hwnd:
+                return
+            pid = wintypes.DWORD()
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            if pid.value != self.pid:
+                self.pid = pid.value
+                self._window_listeners.notify(self.pid)
+            info = MONITORINFOEXW()
+            info.cbSize = ctypes.sizeof(info)
+            if not user32.GetMonitorInfoW(user32.MonitorFromWindow(hwnd, MONITOR_DEFAULTTONEAREST), ctypes.byref(info)):
+                return
+            if info.szDevice != self.monitor:
+                self.monitor = info.szDevice
+                self.logger.debug('Foreground window is on %s', self.monitor)
+                self._listeners.notify(self.monitor)
+        except Exception as e:
+            self.logger.error('Error following the foreground window', exc_info=e)
+
+
+ForegroundWatcher = _ForegroundWatcher()
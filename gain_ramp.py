@@ -0,0 +1,198 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+# Time between volume steps
+TICK = 0.002
+# The last part of every wait is spun, sleeps alone overshoot by the OS timer resolution
+SPIN = 0.0005
+MIN_MS = 10
+MAX_MS = 100
+MAX_SAMPLES = 4096
+
+
+class RampConfig:
+    def __init__(self):
+        # 0 switches mute instantly
+        self.duration = 0.0
+
+    def update(self, ramp_ms: float | None=None):
+        if ramp_ms is not None:
+            self.duration = 0.0 if ramp_ms <= 0 else min(max(ramp_ms, MIN_MS), MAX_MS) / 1000
+
+
+CONFIG = RampConfig()
+
+
+class Ramp:
+    __slots__ = ('apply', 'done', 'level', 'start_level', 'target', 'start', 'end', 'active', 'finished')
+
+    def __init__(self, apply: Callable[[float], None], level: float, target: float, duration: float,
+                 done: Callable[['Ramp'], None] | None):
+        self.apply = apply
+        self.done = done
+        self.level = level
+        self.active = True
+        self.finished = threading.Event()
+        self.retarget(target, duration)
+
+    def retarget(self, target: float, duration: float):
+        self.start_level = self.level
+        self.target = target
+        self.start = time.perf_counter()
+        self.end = self.start + duration
+
+    def level_at(self, now: float) -> float:
+        if now >= self.end:
+            return self.target
+        return self.start_level + (self.target - self.start_level) * (now - self.start) / (self.end - self.start)
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda p: ordered[min(int(p / 100 * len(ordered)), len(ordered) - 1)] * 1e6
+    return {'p50_us': round(pick(50), 1), 'p99_us': round(pick(99), 1), 'max_us': round(ordered[-1] * 1e6, 1)}
+
+
+# Steps every ramp on one thread, sleeping then spinning so that steps and ends land on time
+class RampScheduler:
+    def __init__(self, setup: Callable[[], None] | None=None, teardown: Callable[[], None] | None=None):
+        self.logger = logging.getLogger('RampScheduler')
+        self._setup = setup
+        self._teardown = teardown
+        self._cond = threading.Condition()
+        self._ramps: List[Ramp] = []
+        self._thread: threading.Thread | None = None
+        self._woken = False
+        self.step_lateness = deque(maxlen=MAX_SAMPLES)
+        self.end_error = deque(maxlen=MAX_SAMPLES)
+        self.ramps = 0
+        # A volume left half way down would outlive the process
+        atexit.register(self.finish_all)
+
+    def start(self, apply: Callable[[float], None], level: float, target: float, duration: float,
+              done: Callable[[Ramp], None] | None=None) -> Ramp:
+        ramp = Ramp(apply, level, target, duration, done)
+        with self._cond:
+            self._ramps.append(ramp)
+            self.ramps += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='RampScheduler', daemon=True)
+                self._thread.start()
+            self._wake()
+        return ramp
+
+    def retarget(self, ramp: Ramp, target: float, duration: float) -> bool:
+        # Turns a running ramp around from its current level; False once it has ended
+        with self._cond:
+            if not ramp.active:
+                return False
+            ramp.retarget(target, duration)
+            self._wake()
+        return True
+
+    def cancel(self, ramp: Ramp):
+        with self._cond:
+            if ramp in self._ramps:
+                self._ramps.remove(ramp)
+            ramp.active = False
+        ramp.finished.set()
+
+    def finish_all(self):
+        # Every ramp jumps to its end, e.g. at exit
+        with self._cond:
+            ramps, self._ramps = self._ramps, []
+            for ramp in ramps:
+                ramp.active = False
+        for ramp in ramps:
+            self._finish(ramp, ramp.target)
+
+    def stop(self):
+        # Finishes every ramp and ends the thread, the next start() brings up a new one
+        self.finish_all()
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._wake()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _wake(self):
+        self._woken = True
+        self._cond.notify()
+
+    def _finish(self, ramp: Ramp, level: float):
+        try:
+            if level != ramp.level:
+                ramp.level = level
+                ramp.apply(level)
+            if ramp.done is not None:
+                ramp.done(ramp)
+        except Exception as e:
+            self.logger.error('Ramp failed to finish', exc_info=e)
+        ramp.finished.set()
+
+    def _run(self):
+        if self._setup is not None:
+            self._setup()
+        try:
+            deadline = None
+            while True:
+                with self._cond:
+                    while self._thread is threading.current_thread() and not self._ramps:
+                        deadline = None
+                        self._cond.wait()
+                    if self._thread is not threading.current_thread():
+                        # Stopped, a later start() has its own thread
+                        return
+                    now = time.perf_counter()
+                    if deadline is not None and not self._woken:
+                        self.step_lateness.append(now - deadline)
+                    self._woken = False
+                    steps = [(ramp, ramp.level_at(now)) for ramp in self._ramps]
+                    ended = [ramp for ramp in self._ramps if now >= ramp.end]
+                    for ramp in ended:
+                        self._ramps.remove(ramp)
+                        ramp.active = False
+                        self.end_error.append(now - ramp.end)
+
+                for ramp, level in steps:
+                    if ramp in ended:
+                        self._finish(ramp, level)
+                    elif level != ramp.level:
+                        ramp.level = level
+                        try:
+                            ramp.apply(level)
+                        except Exception as e:
+                            self.logger.warning('Ramp step failed, finishing it', exc_info=e)
+                            self.cancel(ramp)
+                            self._finish(ramp, ramp.target)
+
+                with self._cond:
+                    deadline = (now if deadline is None else deadline) + TICK
+                    if deadline < now:
+                        # Fell behind, e.g. a slow device call, do not try to catch up
+                        deadline = now + TICK
+                    # Ends are stepped on time, not on the next tick
+                    deadline = min([deadline] + [ramp.end for ramp in self._ramps])
+                    remaining = deadline - time.perf_counter() - SPIN
+                    if remaining > 0:
+                        self._cond.wait(remaining)
+                    if self._woken:
+                        continue
+                while time.perf_counter() < deadline:
+                    pass
+        finally:
+            if self._teardown is not None:
+                self._teardown()
+
+    def stats(self) -> dict:
+        return {
+            'ramps': self.ramps,
+            'step_lateness': _percentiles(list(self.step_lateness)),
+            'end_error': _percentiles(list(self.end_error)),
+        }
@@ -0,0 +1,252 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CTRL    = 1
+ALT     = 2
+SHIFT   = 4
+WINDOWS = 8
+
+MODIFIERS = {
+    'ctrl': CTRL, 'control': CTRL,
+    'alt': ALT, 'alt gr': ALT | CTRL, 'option': ALT,
+    'shift': SHIFT,
+    'windows': WINDOWS, 'win': WINDOWS, 'cmd': WINDOWS, 'command': WINDOWS, 'super': WINDOWS,
+}
+
+ALIASES = {
+    'esc': 'escape', 'return': 'enter', 'del': 'delete', 'ins': 'insert',
+    'pgup': 'page up', 'pgdn': 'page down', 'spacebar': 'space',
+}
+
+SEQUENCE_TIMEOUT = 1.0
+
+Step = Tuple[int, str]
+# What a step matches on: a scan code when the source reports them, else the key name
+Key = int | str
+
+
+def normalize_key(name: str) -> str:
+    name = name.strip().lower()
+    for side in ('left ', 'right '):
+        if name.startswith(side):
+            name = name[len(side):]
+    return ALIASES.get(name, name)
+
+
+def parse_step(step: str) -> Step:
+    mods = 0
+    key = None
+    for part in step.split('+'):
+        part = normalize_key(part)
+        if not part:
+            raise ValueError('Empty key in "%s"' % step)
+        if part in MODIFIERS:
+            mods |= MODIFIERS[part]
+        elif key is None:
+            key = part
+        else:
+            raise ValueError('More than one non-modifier key in "%s"' % step)
+    if key is None:
+        raise ValueError('No key in "%s"' % step)
+    return mods, key
+
+
+def parse_binding(binding: str) -> List[Step]:
+    # "ctrl+alt+m" is one step, "ctrl+k, m" is a sequence of two
+    return [parse_step(step) for step in binding.split(',')]
+
+
+@dataclass
+class KeyEvent:
+    name: str
+    down: bool
+    time: float = 0.0
+    scan_code: int | None = None
+
+
+class _Node:
+    __slots__ = ('children', 'action', 'binding')
+
+    def __init__(self):
+        self.children: Dict[Step, '_Node'] = {}
+        self.action: Callable[[], None] | None = None
+        self.binding: str | None = None
+
+
+# All bindings compiled into one trie of (modifier mask, key) steps, one dict lookup per key press
+class HotkeyEngine:
+    def __init__(self, timeout: float=SEQUENCE_TIMEOUT):
+        self.logger = logging.getLogger('HotkeyEngine')
+        self.timeout = timeout
+        self._root = _Node()
+        self._node = self._root
+        self._last = 0.0
+        self._mods = 0
+        self._pressed = set()
+        self._names: Dict[str, str] = {}
+        self._by_code = False
+        self._lock = threading.Lock()
+        self.events = 0
+        self.matches = 0
+
+    def compile(self, bindings: Dict[str, Callable[[], None]], scan_codes: Callable[[str], Iterable[int]] | None=None):
+        root = _Node()
+        for binding, action in bindings.items():
+            try:
+                steps = parse_binding(binding)
+                if scan_codes is not None:
+                    # A key behind several scan codes, e.g. enter on the numpad, is a step for each
+                    steps = [[(mods, code) for code in scan_codes(key)] for mods, key in steps]
+                else:
+                    steps = [[step] for step in steps]
+            except ValueError as e:
+                self.logger.warning('Ignoring hotkey "%s": %s', binding, e)
+                continue
+
+            nodes = [root]
+            for alternatives in steps:
+                for node in nodes:
+                    if node.action is not None:
+                        self.logger.warning('Hotkey "%s" is shadowed by "%s"', binding, node.binding)
+                nodes = [node.children.setdefault(step, _Node()) for node in nodes for step in alternatives]
+            for node in nodes:
+                if node.action is not None:
+                    self.logger.warning('Hotkey "%s" is bound twice, keeping the last one', binding)
+                if node.children:
+                    self.logger.warning('Hotkey "%s" shadows longer sequences', binding)
+                node.action = action
+                node.binding = binding
+
+        with self._lock:
+            self._root = root
+            self._node = root
+            self._by_code = scan_codes is not None
+        self.logger.info('Compiled %d hotkeys', len(bindings))
+
+    def feed(self, event: KeyEvent) -> bool:
+        # Returns whether the event completed a hotkey
+        with self._lock:
+            self.events += 1
+            name = self._names.get(event.name)
+            if name is None:
+                name = self._names[event.name] = normalize_key(event.name)
+            mod = MODIFIERS.get(name)
+            key = event.scan_code if self._by_code and event.scan_code is not None else name
+
+            if not event.down:
+                self._pressed.discard(key)
+                if mod is not None:
+                    self._mods &= ~mod
+                return False
+
+            if mod is not None:
+                self._mods |= mod
+                return False
+
+            # Ignore auto-repeat of a key that is being held
+            if key in self._pressed:
+                return False
+            self._pressed.add(key)
+
+            now = event.time or time.monotonic()
+            if self._node is not self._root and now - self._last > self.timeout:
+                self._node = self._root
+            self._last = now
+
+            step = (self._mods, key)
+            node = self._node.children.get(step)
+            if node is None and self._node is not self._root:
+                # A broken sequence may still be the start of another one
+                node = self._root.children.get(step)
+            if node is None:
+                self._node = self._root
+                return False
+
+            if node.action is None:
+                self._node = node
+                return False
+
+            self._node = self._root
+            self.matches += 1
+            action = node.action
+
+        action()
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._node = self._root
+            self._mods = 0
+            self._pressed.clear()
+
+
+class KeyEventSource(ABC):
+    # Scan codes of a key name, for sources whose events carry them; None matches on names
+    scan_codes: Callable[[str], Iterable[int]] | None = None
+
+    @abstractmethod
+    def start(self, callback: Callable[[KeyEvent], object]):
+        ...
+
+    @abstractmethod
+    def stop(self):
+        ...
+
+
+# One global `keyboard` hook for all bindings
+class KeyboardHookSource(KeyEventSource):
+    def __init__(self):
+        self._hook = None
+
+    def start(self, callback: Callable[[KeyEvent], object]):
+        import keyboard
+
+        if self._hook is not None:
+            return
+
+        def on_event(event):
+            if event.name is not None:
+                callback(KeyEvent(event.name, event.event_type == keyboard.KEY_DOWN, event.time, event.scan_code))
+
+        self._hook = keyboard.hook(on_event)
+
+    def scan_codes(self, key: str) -> Iterable[int]:
+        import keyboard
+
+        return keyboard.key_to_scan_codes(key)
+
+    def stop(self):
+        import keyboard
+
+        if self._hook is not None:
+            keyboard.unhook(self._hook)
+            self._hook = None
+
+
+# Feeds scripted key events, for tests and benchmarks
+class SyntheticSource(KeyEventSource):
+    def __init__(self):
+        self._callback = None
+
+    def start(self, callback: Callable[[KeyEvent], object]):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def press(self, binding: str, t: float=0.0):
+        # Presses and releases every step of a binding, e.g. "ctrl+k, m"
+        for step in binding.split(','):
+            keys = [key.strip() for key in step.split('+')]
+            for key in keys:
+                self.send(KeyEvent(key, True, t))
+            for key in reversed(keys):
+                self.send(KeyEvent(key, False, t))
+
+    def send(self, event: KeyEvent):
+        if self._callback is not None:
+            self._callback(event)
@@ -1,47 +1,96 @@
-import keyboard
 import logging
 
-from audio_control import AudioController
+import event_trace
+import tracing
+from audio_control import AudioController, ERole
+from device_guard import deadline
+from hotkey_engine import HotkeyEngine, KeyboardHookSource, KeyEvent, KeyEventSource
 from settings import Settings
 
+ROLES = {
+    'communications': ERole.eCommunications,
+    'multimedia': ERole.eMultimedia,
+    'console': ERole.eConsole,
+}
+ACTIONS = ('mute', 'unmute', 'toggle')
+
 class HotkeyManager:
-    def __init__(self):
+    def __init__(self, source: KeyEventSource | None=None):
         self.logger = logging.getLogger(self.__class__.__name__)
+        self.engine = HotkeyEngine()
+        self.source = source if source is not None else KeyboardHookSource()
         self.hotkey_refs = {}
         self.logger.info('Initialized')
         Settings.add_listener(self.update_settings)
 
     def update_settings(self, settings):
-        self.unregister_hotkeys()
-
         mute_key   = settings.get('hotkey_mute', 'ctrl+alt+m').lstrip()
         unmute_key = settings.get('hotkey_unmute', 'ctrl+alt+u').lstrip()
         toggle_key = settings.get('hotkey_toggle', 'ctrl+alt+t').lstrip()
 
         self.logger.info('Registering hotkeys: mute=%s, unmute=%s, toggle=%s', mute_key, unmute_key, toggle_key)
-        
+
+        bindings = {}
         if len(mute_key) > 0:
-            self.hotkey_refs['mute'] = keyboard.add_hotkey(mute_key, self._log_and_call('mute', AudioController.mute))
-        
+            bindings[mute_key] = self._log_and_call('mute', AudioController.mute)
+
         if len(unmute_key) > 0:
-            self.hotkey_refs['unmute'] = keyboard.add_hotkey(unmute_key, self._log_and_call('unmute', AudioController.unmute))
-        
+            bindings[unmute_key] = self._log_and_call('unmute', AudioController.unmute)
+
         if len(toggle_key) > 0:
-            self.hotkey_refs['toggle'] = keyboard.add_hotkey(toggle_key, self._log_and_call('toggle', AudioController.toggle))
+            bindings[toggle_key] = self._log_and_call('toggle', AudioController.toggle)
+
+        # Extra bindings: {"ctrl+alt+1": "toggle:communications", "ctrl+k, m": "mute"}
+        for key, action in settings.get('hotkeys', {}).items():
+            name, _, role = action.partition(':')
+            if name not in ACTIONS or (role and role not in ROLES):
+                self.logger.warning('Unknown hotkey action "%s" for %s', action, key)
+                continue
+            cb = getattr(AudioController, name)
+            if role:
+                cb = self._with_role(cb, ROLES[role])
+            bindings[key.lstrip()] = self._log_and_call(action, cb)
+
+        self.engine.compile(bindings, self.source.scan_codes)
+        self.hotkey_refs = bindings
+        if bindings:
+            self.source.start(self._feed)
+        else:
+            self.unregister_hotkeys()
 
     def unregister_hotkeys(self):
-        for ref in self.hotkey_refs.values():
-            try:
-                keyboard.remove_hotkey(ref)
-            except Exception:
-                pass
+        try:
+            self.source.stop()
+        except Exception:
+            pass
         if self.hotkey_refs:
             self.logger.info('Unregistered all hotkeys')
         self.hotkey_refs = {}
+        self.engine.compile({})
+
+
+    def _feed(self, event: KeyEvent) -> bool:
+        if not tracing.enabled():
+            return self.engine.feed(event)
 
+        received = tracing.now()
+        with tracing.span('hotkey.match', key=event.name):
+            matched = self.engine.feed(event)
+        if matched and event.time:
+            # From the OS hook seeing the key to us getting it
+            tracing.record('keyboard.hook', tracing.from_wall(event.time), received)
+        return matched
+
+    def _with_role(self, cb, role):
+        def wrapper():
+            cb(role=role)
+        return wrapper
 
     def _log_and_call(self, name, cb):
         def wrapper():
             self.logger.info('Hotkey "%s" triggered', name)
-            cb()
-        return wrapper
\ No newline at end of file
+            event_trace.record_hotkey(name)
+            # The hotkey thread must never wait on a hung driver
+            with tracing.action('hotkey', action=name), deadline():
+                cb()
+        return wrapper
@@ -0,0 +1,99 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+from audio_control import AudioController
+from commons import MicStatus
+from level_reader import (HEADER, HEADER_SIZE, INDEX, INDEX_OFFSET, MAGIC, PID, PID_OFFSET, RECORD, SEQ,
+                          STATUS_OFFSET, VERSION, default_path)
+from settings import Settings
+
+# 4s of history at 60Hz
+CAPACITY = 256
+# The status record after its sequence number
+STATUS_FIELDS = struct.Struct('<IQ')
+
+
+# Status and level samples in a memory-mapped file, see level_reader for the layout
+class LevelFeed:
+    def __init__(self, controller=None, path: Path | None=None, capacity: int=CAPACITY):
+        self.logger = logging.getLogger('LevelFeed')
+        self.controller = AudioController if controller is None else controller
+        self.path = default_path() if path is None else path
+        self.capacity = capacity
+        self.hz = 0
+        self._map: mmap.mmap | None = None
+        self._index = 0
+        self._seq = 0
+        self._status: MicStatus | None = None
+        self._status_lock = threading.Lock()
+        Settings.add_listener(self.update_settings)
+
+    def update_settings(self, settings):
+        hz = settings.get('level_feed_hz', 0)
+        if hz == self.hz:
+            return
+        self.stop()
+        if hz:
+            try:
+                self.start(hz)
+            except OSError as e:
+                self.logger.error('Could not publish levels to %s', self.path, exc_info=e)
+
+    def start(self, hz: float):
+        if self._map is not None:
+            return
+        size = HEADER_SIZE + self.capacity * RECORD.size
+        # Not truncated when it exists, readers may still have it mapped
+        with open(self.path, 'r+b' if self.path.exists() else 'w+b') as f:
+            if os.fstat(f.fileno()).st_size != size:
+                f.truncate(size)
+            self._map = mmap.mmap(f.fileno(), size)
+        self._map[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, HEADER_SIZE, self.capacity, RECORD.size)
+        PID.pack_into(self._map, PID_OFFSET, os.getpid())
+        self._index = self._seq = 0
+        self._status = None
+
+        self.hz = hz
+        self.controller.add_status_listener(self.publish_status)
+        self.controller.add_level_listener(self.publish_level, 1 / hz)
+        self.logger.info('Publishing levels at %sHz to %s', hz, self.path)
+
+    def stop(self):
+        if self._map is None:
+            return
+        self.controller.remove_level_listener(self.publish_level)
+        self.controller.remove_status_listener(self.publish_status)
+        self.publish_status(MicStatus.DISABLED)
+        PID.pack_into(self._map, PID_OFFSET, 0)
+        self._map.close()
+        self._map = None
+        self.hz = 0
+        self.logger.info('Stopped publishing levels')
+
+    def publish_status(self, status: MicStatus):
+        with self._status_lock:
+            buf = self._map
+            # Every role reports a change, readers only need it once
+            if buf is None or status == self._status:
+                return
+            self._status = status
+            # Odd while writing, readers retry until they see the same even value twice
+            SEQ.pack_into(buf, STATUS_OFFSET, (self._seq + 1) & 0xFFFFFFFF)
+            STATUS_FIELDS.pack_into(buf, STATUS_OFFSET + SEQ.size, status.value, time.time_ns())
+            self._seq = (self._seq + 2) & 0xFFFFFFFF
+            SEQ.pack_into(buf, STATUS_OFFSET, self._seq)
+
+    def publish_level(self, level: float):
+        # Only ever called on the sampler thread
+        buf = self._map
+        if buf is None:
+            return
+        RECORD.pack_into(buf, HEADER_SIZE + self._index % self.capacity * RECORD.size, time.time_ns(), level)
+        self._index += 1
+        INDEX.pack_into(buf, INDEX_OFFSET, self._index)
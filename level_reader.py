@@ -0,0 +1,114 @@
+"""Reader for the live microphone feed Better Mute publishes when `level_feed_hz` is set.
+
+Standalone on purpose, copy it next to an overlay or busy-light script.
+
+File layout (little endian), `better-mute-<user>.levels` in the temp directory:
+    0   magic b'BMLV', version u16, header size u16, capacity u32, record size u32
+    16  status seq u32, status u32, status changed at u64 (unix ns)
+    32  write index u64 (records written so far)
+    40  writer pid u32
+    64  ring of `capacity` records: timestamp u64 (unix ns), level f32, 4 pad bytes
+
+The status block is sequence locked: the writer makes seq odd while it
+writes, a reader retries until seq is the same even number before and after.
+Record i lives in slot i % capacity; a reader keeps the records that were
+not overwritten while it copied them, by checking the write index again.
+"""
+import mmap
+import os
+import struct
+from getpass import getuser
+from pathlib import Path
+from tempfile import gettempdir
+from typing import List, Tuple
+
+MAGIC = b'BMLV'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+STATUS = struct.Struct('<IIQ')
+SEQ = struct.Struct('<I')
+INDEX = struct.Struct('<Q')
+PID = struct.Struct('<I')
+RECORD = struct.Struct('<Qf4x')
+STATUS_OFFSET = 16
+INDEX_OFFSET = 32
+PID_OFFSET = 40
+HEADER_SIZE = 64
+
+# Values of commons.MicStatus
+STATUS_NAMES = {0: 'DISABLED', 1: 'UNMUTED', 2: 'INUSE', 3: 'MUTED'}
+
+
+def default_path() -> Path:
+    return Path(gettempdir()) / f'better-mute-{getuser()}.levels'
+
+
+class LevelReader:
+    def __init__(self, path: str | os.PathLike | None=None):
+        self.path = Path(path) if path is not None else default_path()
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size, self.capacity, record_size = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or header_size != HEADER_SIZE or record_size != RECORD.size:
+            self._map.close()
+            raise ValueError('%s is not a better-mute level feed' % self.path)
+        self._next = self.write_index()
+
+    def write_index(self) -> int:
+        return INDEX.unpack_from(self._map, INDEX_OFFSET)[0]
+
+    def writer_pid(self) -> int:
+        # 0 once the writer has stopped
+        return PID.unpack_from(self._map, PID_OFFSET)[0]
+
+    def status(self) -> Tuple[str, int]:
+        buf = self._map
+        while True:
+            seq, status, changed = STATUS.unpack_from(buf, STATUS_OFFSET)
+            if not seq & 1 and SEQ.unpack_from(buf, STATUS_OFFSET)[0] == seq:
+                return STATUS_NAMES.get(status, 'DISABLED'), changed
+
+    def latest(self) -> Tuple[int, float] | None:
+        while True:
+            index = self.write_index()
+            if not index:
+                return None
+            record = RECORD.unpack_from(self._map, HEADER_SIZE + (index - 1) % self.capacity * RECORD.size)
+            # Still valid unless the writer went all the way around meanwhile
+            if self.write_index() - index < self.capacity:
+                return record
+
+    def read_new(self) -> List[Tuple[int, float]]:
+        # Records written since the last call, oldest first; ones already overwritten are skipped
+        end = self.write_index()
+        if end < self._next:
+            # The writer restarted
+            self._next = 0
+        start = max(self._next, end - self.capacity)
+        buf, capacity, size = self._map, self.capacity, RECORD.size
+        records = [RECORD.unpack_from(buf, HEADER_SIZE + i % capacity * size) for i in range(start, end)]
+        lost = self.write_index() - capacity - start
+        if lost > 0:
+            records = records[lost:]
+        self._next = end
+        return records
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self) -> 'LevelReader':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+if __name__ == '__main__':
+    import time
+
+    with LevelReader() as reader:
+        while True:
+            status, _ = reader.status()
+            for t, level in reader.read_new():
+                print('%.3f %-8s %s' % (t / 1e9, status, '#' * int(level * 50)))
+            time.sleep(0.05)
@@ -0,0 +1,165 @@
+import logging
+import threading
+from typing import Callable, Dict, FrozenSet
+
+import tracing
+
+
+# Runs `sync` until it has seen the latest state, a call made meanwhile only asks for one more round
+class StateSync:
+    def __init__(self, sync: Callable[[], None]):
+        self._sync = sync
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __call__(self):
+        self._dirty = True
+        while self._dirty and self._lock.acquire(blocking=False):
+            try:
+                self._dirty = False
+                self._sync()
+            finally:
+                self._lock.release()
+
+
+# Copy-on-write registry, on_first/on_last run outside the lock and always for the latest state
+class ListenerSet:
+    def __init__(self, name: str, on_first: Callable[[], None] | None=None, on_last: Callable[[], None] | None=None):
+        self.logger = logging.getLogger(name)
+        self._lock = threading.Lock()
+        self._listeners: FrozenSet[Callable] = frozenset()
+        self._on_first = on_first
+        self._on_last = on_last
+        self._active = False
+        self._sync_hooks = StateSync(self._run_hooks)
+
+    def add(self, listener: Callable) -> bool:
+        with self._lock:
+            if listener in self._listeners:
+                return False
+            self._listeners = self._listeners | {listener}
+            first = len(self._listeners) == 1
+        if first:
+            self._sync_hooks()
+        return True
+
+    def remove(self, listener: Callable) -> bool:
+        with self._lock:
+            if listener not in self._listeners:
+                return False
+            self._listeners = self._listeners - {listener}
+            last = not self._listeners
+        if last:
+            self._sync_hooks()
+        return True
+
+    def _run_hooks(self):
+        active = bool(self._listeners)
+        if active == self._active:
+            return
+        self._active = active
+        hook = self._on_first if active else self._on_last
+        if hook is not None:
+            hook()
+
+    def notify(self, *args):
+        with tracing.span('listeners.notify', listeners=self.logger.name):
+            for listener in self._listeners:
+                try:
+                    listener(*args)
+                except Exception as e:
+                    self.logger.error('Error calling listener %s', listener, exc_info=e)
+
+    def snapshot(self) -> FrozenSet[Callable]:
+        return self._listeners
+
+    def __len__(self) -> int:
+        return len(self._listeners)
+
+    def __bool__(self) -> bool:
+        return bool(self._listeners)
+
+
+# The shortest interval any subscriber asked for, `default` for one that named none
+class IntervalRequests:
+    def __init__(self, default: float, apply: Callable[[float], None]):
+        self.default = default
+        self._apply = apply
+        self._lock = threading.Lock()
+        self._requests: Dict[Callable, float] = {}
+        self._applied = default
+        self._sync = StateSync(self._sync_interval)
+
+    def request(self, subscriber: Callable, interval: float | None=None):
+        with self._lock:
+            self._requests = {**self._requests, subscriber: self.default if interval is None else interval}
+        self._sync()
+
+    def drop(self, subscriber: Callable):
+        with self._lock:
+            if subscriber not in self._requests:
+                return
+            self._requests = {key: value for key, value in self._requests.items() if key != subscriber}
+        self._sync()
+
+    def interval(self) -> float:
+        return min(self._requests.values(), default=self.default)
+
+    def _sync_interval(self):
+        interval = self.interval()
+        if interval != self._applied:
+            self._applied = interval
+            self._apply(interval)
+
+
+# Runs `target` every `interval` seconds, with no thread at all while stopped
+class PeriodicWorker:
+    def __init__(self, name: str, target: Callable[[], None], interval: float,
+                 setup: Callable[[], None] | None=None, teardown: Callable[[], None] | None=None):
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self.interval = interval
+        self._target = target
+        self._setup = setup
+        self._teardown = teardown
+        self._thread: threading.Thread | None = None
+        self._stop: threading.Event | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name=self.name, daemon=True)
+        self._thread.start()
+        self.logger.debug('started')
+
+    def stop(self, timeout: float | None=None):
+        thread, stop = self._thread, self._stop
+        if thread is None:
+            return
+
+        self._thread = None
+        self._stop = None
+        stop.set()
+        # A listener may unsubscribe from inside a tick, the thread exits on its own then
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+        self.logger.debug('stopped')
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def _run(self, stop: threading.Event):
+        if self._setup is not None:
+            self._setup()
+        try:
+            while not stop.is_set():
+                try:
+                    self._target()
+                except Exception as e:
+                    self.logger.error('Error in periodic task', exc_info=e)
+                stop.wait(self.interval)
+        finally:
+            if self._teardown is not None:
+                self._teardown()
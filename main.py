@@ -1,4 +1,5 @@
 import sys
+import atexit
 import logging
 import multiprocessing
 import argparse
@@ -10,6 +11,11 @@ from pathlib import Path
 from getpass import getuser
 from contextlib import contextmanager
 
+STARTED_AT = time.perf_counter()
+
+def log_startup(milestone):
+    logging.info('Startup: %s after %.1f ms', milestone, (time.perf_counter() - STARTED_AT) * 1000)
+
 def is_running_as_exe():
     return getattr(sys, 'frozen', False)
 
@@ -43,6 +49,14 @@ def parse_args():
     parser.add_argument('--mute', action='store_true', help='Mute microphone and exit')
     parser.add_argument('--unmute', action='store_true', help='Unmute microphone and exit')
     parser.add_argument('--stop', action='store_true', help='Stop all running better-mute processes')
+    parser.add_argument('--record-trace', metavar='PATH', help='Record device, volume and hotkey events to a trace file')
+    parser.add_argument('--trace-latency', metavar='PATH', help='Trace hotkey to indicator latency and write Chrome trace JSON on exit')
+    parser.add_argument('--watch', action='store_true', help='Stream status and level changes to stdout as JSON lines until interrupted')
+    parser.add_argument('--level-hz', type=float, default=0.0, help='Level samples per second for --watch (0 for none)')
+    parser.add_argument('--device-levels', action='store_true', help='With --watch, sample every microphone in use instead of only the main one')
+    parser.add_argument('--report', action='store_true', help='Print time spent muted and unmuted and device switches, then exit')
+    parser.add_argument('--since', metavar='WHEN', help='Start of the --report period, e.g. 7d, 12h or 2024-05-01 (default: all history)')
+    parser.add_argument('--engine-process', action='store_true', help='Run audio device control in a separate, supervised process')
     return parser.parse_known_args()
 
 def get_pid_file():
@@ -89,6 +103,15 @@ def find_and_stop_existing():
             raise e
 
 
+def export_latency_trace(path):
+    import tracing
+    count = tracing.export_chrome(path)
+    logging.info('Wrote %d latency spans to %s', count, path)
+    # The slowest hotkey on its own, as one flame timeline
+    slowest = tracing.slowest_action('hotkey')
+    if slowest is not None:
+        tracing.export_chrome(str(Path(path).with_suffix('.slowest.json')), cid=slowest)
+
 @contextmanager
 def pid_file_manager():
     pid_file = get_pid_file()
@@ -140,9 +163,42 @@ def main():
         find_and_stop_existing()
         return
     
-    from audio_control import AudioController # just to initilize
+    if args.report:
+        import timeline
+        try:
+            since = timeline.parse_since(args.since) if args.since else 0
+        except ValueError as e:
+            print(f'--since: {e}', file=sys.stderr)
+            return
+        print(timeline.format_report(timeline.report(since=since)))
+        return
+
+    if args.record_trace:
+        import event_trace
+        event_trace.start_recording(args.record_trace)
+        atexit.register(event_trace.stop_recording)
+
+    if args.trace_latency:
+        import tracing
+        tracing.enable()
+        atexit.register(export_latency_trace, args.trace_latency)
+
+    if args.engine_process:
+        os.environ['BETTER_MUTE_ENGINE'] = 'process'
+
+    if args.watch:
+        # stdout carries the event stream
+        for handler in HANDLERS:
+            if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+        from watch import watch
+        return watch(level_hz=args.level_hz, device_levels=args.device_levels)
+
+    from audio_control import AudioController
 
     # Handle audio control arguments
+    if args.toggle or args.mute or args.unmute:
+        AudioController.load()
     if args.toggle:
         AudioController.toggle()
         return
@@ -155,31 +211,71 @@ def main():
 
     # Handle previous instance and manage PID file
     with pid_file_manager():
+        from settings import Settings
+        if Settings.load_settings().get('timeline', True):
+            # Status changes and device switches for --report, from the first device load on
+            import timeline
+            if args.engine_process:
+                # The engine process owns the devices and records instead
+                os.environ[timeline.ENV] = '1'
+            else:
+                timeline.start()
+                atexit.register(timeline.stop)
+
+        # Last run's status is shown until the devices are enumerated
+        if AudioController.warm_start() is not None:
+            log_startup('provisional status from cache')
+        atexit.register(AudioController.save_state)
+
+        # Discover devices and start listening for device changes while Qt comes up
+        AudioController.load_async(start=True, on_loaded=lambda: log_startup('first correct status'))
+
         from PySide6.QtWidgets import QApplication
+        from PySide6.QtCore import QTimer
         from tray import TrayIcon
         from status_icon import StatusIcon
         from hotkeys import HotkeyManager
-        from startup import StartupManager
+        from auto_mute import AutoMuteManager
+        from control_server import ControlServer
+        from level_feed import LevelFeed
+        from silence import SilenceMuter
+        from device_guard import use_deadline
 
         # Start event loop
         logging.info('Application started')
         app = QApplication(sys.argv)
         app.setQuitOnLastWindowClosed(False)
+        # Device calls from the GUI thread give up instead of freezing the tray
+        use_deadline()
 
-        # Register global hotkeys
-        HotkeyManager()
+        # Kept on the application, they live as long as the event loop
+        # Create tray icon
+        app.tray = TrayIcon()
 
         # Create always-on-top status icon
-        StatusIcon()
+        app.status_icon = StatusIcon()
 
-        # Create tray icon
-        TrayIcon()
+        # Register global hotkeys
+        app.hotkeys = HotkeyManager()
+
+        # Mute and unmute as applications start, exit or change focus, when auto_mute rules are set
+        app.auto_mute = AutoMuteManager()
+
+        # Status and commands for stream decks and busy lights, when api_port is set
+        app.control_server = ControlServer()
+        # Levels in shared memory for overlays, when level_feed_hz is set
+        app.level_feed = LevelFeed()
+        # Mutes a microphone left open without voice, when silence_mute_s is set
+        app.silence_muter = SilenceMuter()
 
-        # Create startup manager
-        StartupManager()
+        def deferred_startup():
+            # The first pass of the event loop has painted the tray icon
+            log_startup('tray icon shown')
+            # Creating the startup shortcut dispatches WScript.Shell, nothing waits for it
+            from startup import StartupManager
+            app.startup_manager = StartupManager()
 
-        # start listening for device changes
-        AudioController.start()
+        QTimer.singleShot(0, deferred_startup)
 
         # TODO: get notification when device(s) change
         # # Listen for device changes
@@ -0,0 +1,252 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from listeners import PeriodicWorker
+
+# start and exit are the first instance of a process starting and the last one exiting
+TRIGGERS = ('start', 'exit', 'focus', 'blur')
+POLL_INTERVAL = 2.0
+
+Rule = Tuple[str, str, Callable[[], None]]
+# A process id with its creation time, ids are reused once a process has exited
+ProcessKey = Tuple[int, float | None]
+
+
+def normalize_name(name: str) -> str:
+    return name.strip().lower()
+
+
+@dataclass
+class ProcessEvent:
+    # 'seen' (already running when the source started), 'start', 'exit' or 'focus'
+    kind: str
+    pid: int
+    name: str | None = None
+    created: float | None = None
+
+
+# Rules indexed by (trigger, process name), start and exit fire once per application
+class RuleEngine:
+    def __init__(self):
+        self.logger = logging.getLogger('RuleEngine')
+        self._index: Dict[Tuple[str, str], List[Callable[[], None]]] = {}
+        # Names with a start or exit rule
+        self._watched: Set[str] = set()
+        self._pids: Dict[ProcessKey, str] = {}
+        self._running: Counter = Counter()
+        self._focused: str | None = None
+        self._lock = threading.Lock()
+        self.events = 0
+        self.fired = 0
+
+    def compile(self, rules: Iterable[Rule]):
+        index = {}
+        for process, trigger, action in rules:
+            if trigger not in TRIGGERS:
+                self.logger.warning('Ignoring rule for "%s": unknown trigger "%s"', process, trigger)
+                continue
+            index.setdefault((trigger, normalize_name(process)), []).append(action)
+        with self._lock:
+            self._index = index
+            self._watched = {name for trigger, name in index if trigger in ('start', 'exit')}
+        self.logger.info('Compiled %d process rules', sum(len(actions) for actions in index.values()))
+
+    def name_of(self, pid: int, created: float | None=None) -> str | None:
+        return self._pids.get((pid, created))
+
+    def watches(self, name: str) -> bool:
+        return normalize_name(name) in self._watched
+
+    def running(self, name: str) -> int:
+        return self._running.get(normalize_name(name), 0)
+
+    def feed(self, event: ProcessEvent) -> int:
+        # Returns how many actions ran
+        with self._lock:
+            self.events += 1
+            actions = self._match(event)
+            self.fired += len(actions)
+
+        for action in actions:
+            try:
+                action()
+            except Exception as e:
+                self.logger.error('Error running the rule action for %s', event, exc_info=e)
+        return len(actions)
+
+    def _match(self, event: ProcessEvent) -> List[Callable[[], None]]:
+        kind = event.kind
+        if kind in ('seen', 'start'):
+            key = event.pid, event.created
+            if key in self._pids or event.name is None:
+                return []
+            name = self._pids[key] = normalize_name(event.name)
+            self._running[name] += 1
+            if kind == 'seen' or self._running[name] > 1:
+                return []
+            return self._index.get(('start', name), [])
+
+        if kind == 'exit':
+            name = self._pids.pop((event.pid, event.created), None)
+            if name is None:
+                return []
+            self._running[name] -= 1
+            if self._running[name] > 0:
+                return []
+            del self._running[name]
+            return self._index.get(('exit', name), [])
+
+        if kind == 'focus':
+            name = self._pids.get((event.pid, event.created))
+            if name is None and event.name is not None:
+                name = normalize_name(event.name)
+            if name == self._focused:
+                return []
+            blurred, self._focused = self._focused, name
+            return self._index.get(('blur', blurred), []) + self._index.get(('focus', name), [])
+
+        self.logger.warning('Unknown process event %s', event)
+        return []
+
+
+class ProcessSource(ABC):
+    @abstractmethod
+    def start(self, callback: Callable[[ProcessEvent], object], watches: Callable[[str], bool] | None=None):
+        # `watches` names the processes whose exit and start matter, see SnapshotProcessSource
+        ...
+
+    @abstractmethod
+    def stop(self):
+        ...
+
+    def rewatch(self):
+        # Called after the rules change, for sources that keep per-process state about `watches`
+        pass
+
+
+def process_name(pid: int) -> str | None:
+    import psutil
+
+    try:
+        return psutil.Process(pid).name()
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return None
+
+
+def process_created(pid: int) -> float | None:
+    import psutil
+
+    try:
+        return psutil.Process(pid).create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return None
+
+
+def _psutil_pids() -> List[int]:
+    import psutil
+
+    return psutil.pids()
+
+
+# Diffs pid listings, only new ids and watched names are looked up, so reused ids are caught
+class SnapshotProcessSource(ProcessSource):
+    def __init__(self, interval: float=POLL_INTERVAL, list_pids: Callable[[], Iterable[int]] | None=None,
+                 get_name: Callable[[int], str | None] | None=None,
+                 get_created: Callable[[int], float | None] | None=None):
+        self._list_pids = _psutil_pids if list_pids is None else list_pids
+        self._get_name = process_name if get_name is None else get_name
+        self._get_created = process_created if get_created is None else get_created
+        self._worker = PeriodicWorker('ProcessSnapshot', self.poll, interval)
+        self._callback: Callable[[ProcessEvent], object] | None = None
+        self._watches: Callable[[str], bool] | None = None
+        self._known: Set[int] = set()
+        # Creation time and name by id, for every process, and the creation time of the watched ones
+        self._created: Dict[int, float | None] = {}
+        self._names: Dict[int, str] = {}
+        self._watched: Dict[int, float | None] = {}
+        self._seeded = False
+        self.lookups = 0
+
+    def start(self, callback: Callable[[ProcessEvent], object], watches: Callable[[str], bool] | None=None):
+        if self._callback is not None:
+            return
+        self._callback = callback
+        self._watches = watches
+        self._known = set()
+        self._created = {}
+        self._names = {}
+        self._watched = {}
+        self._seeded = False
+        self._worker.start()
+
+    def stop(self):
+        self._worker.stop()
+        self._callback = None
+
+    def rewatch(self):
+        # A rule added for a process that is already running gets the reuse check too
+        watches = self._watches
+        if watches is None:
+            return
+        self._watched = {pid: self._created.get(pid) for pid, name in list(self._names.items()) if watches(name)}
+
+    def poll(self):
+        callback = self._callback
+        if callback is None:
+            return
+        pids = set(self._list_pids())
+        new = pids - self._known
+        created_at = self._created
+        # Exits first, a new process may reuse an id
+        for pid in self._known - pids:
+            callback(ProcessEvent('exit', pid, created=created_at.pop(pid, None)))
+            self._names.pop(pid, None)
+            self._watched.pop(pid, None)
+        for pid, created in list(self._watched.items()):
+            if self._get_created(pid) != created:
+                callback(ProcessEvent('exit', pid, created=created))
+                self._watched.pop(pid, None)
+                self._names.pop(pid, None)
+                new.add(pid)
+        kind = 'start' if self._seeded else 'seen'
+        watches = self._watches
+        for pid in new:
+            self.lookups += 1
+            name = self._get_name(pid)
+            created = created_at[pid] = self._get_created(pid) if name is not None else None
+            if name is not None:
+                self._names[pid] = name
+                if watches is not None and watches(name):
+                    self._watched[pid] = created
+                callback(ProcessEvent(kind, pid, name, created))
+        self._known = pids
+        self._seeded = True
+
+
+# Feeds scripted process events, for tests and benchmarks
+class SyntheticProcessSource(ProcessSource):
+    def __init__(self):
+        self._callback = None
+
+    def start(self, callback: Callable[[ProcessEvent], object], watches: Callable[[str], bool] | None=None):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def send(self, event: ProcessEvent):
+        if self._callback is not None:
+            self._callback(event)
+
+    def started(self, pid: int, name: str):
+        self.send(ProcessEvent('start', pid, name))
+
+    def exited(self, pid: int):
+        self.send(ProcessEvent('exit', pid))
+
+    def focused(self, pid: int, name: str | None=None):
+        self.send(ProcessEvent('focus', pid, name))
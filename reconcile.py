@@ -0,0 +1,92 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List
+
+
+@dataclass
+class ReconcileResult:
+    desired: bool
+    devices: int = 0
+    writes: int = 0
+    saved: int = 0
+    unconverged: List[str] = field(default_factory=list)
+
+    @property
+    def converged(self) -> bool:
+        return not self.unconverged
+
+
+# Writes only the devices that differ from the desired state, per role or for all, and verifies each write
+class MuteReconciler:
+    def __init__(self, retries: int=1):
+        self.logger = logging.getLogger('MuteReconciler')
+        self.retries = retries
+        self._desired: Dict[Hashable, bool] = {}
+        self.writes = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+
+    def desired(self, scope: Hashable=None) -> bool | None:
+        return self._desired.get(scope, self._desired.get(None))
+
+    def reconcile(self, devices: Iterable, desired: bool, scope: Hashable=None) -> ReconcileResult:
+        with self._lock:
+            if scope is None:
+                self._desired = {None: desired}
+            else:
+                self._desired[scope] = desired
+            return self._reconcile(devices, desired)
+
+    def apply(self, devices: Iterable, scope: Hashable=None) -> ReconcileResult | None:
+        # Bring (new) devices in line with the scope's desired state, if there is one
+        with self._lock:
+            desired = self.desired(scope)
+            if desired is None:
+                return None
+            return self._reconcile(devices, desired)
+
+    def _reconcile(self, devices: Iterable, desired: bool) -> ReconcileResult:
+        result = ReconcileResult(desired)
+        seen = set()
+        pending = []
+        for dev in devices:
+            if dev.destroyed() or dev.id in seen:
+                continue
+            seen.add(dev.id)
+            pending.append(dev)
+        result.devices = len(pending)
+
+        attempt = 0
+        while pending and attempt <= self.retries:
+            written = []
+            for dev in pending:
+                try:
+                    if (dev.is_muted() if attempt == 0 else dev.read_muted()) == desired:
+                        # Written on an earlier attempt is not a saved write
+                        if attempt == 0:
+                            result.saved += 1
+                        continue
+                    dev.set_mute(desired)
+                    result.writes += 1
+                    written.append(dev)
+                except Exception as e:
+                    self.logger.warning('Failed to set %s mute=%s', dev, desired, exc_info=e)
+                    written.append(dev)
+            pending = written
+            attempt += 1
+
+        for dev in pending:
+            try:
+                if dev.read_muted() == desired:
+                    continue
+            except Exception as e:
+                self.logger.warning('Failed to verify %s', dev, exc_info=e)
+            result.unconverged.append(dev.id)
+
+        self.writes += result.writes
+        self.saved += result.saved
+
+        self.logger.debug('reconcile(muted=%s) -> devices=%d writes=%d saved=%d unconverged=%d',
+                          desired, result.devices, result.writes, result.saved, len(result.unconverged))
+        return result
@@ -8,8 +8,18 @@ DEFAULT = {
     "hotkey_unmute": "",
     "hotkey_toggle": "ctrl+alt+m",
     "status_corner": "top-right",
+    "status_screens": "primary",
     "start_on_startup": False,
-    "show_level": False
+    "show_level": False,
+    "hotkeys": {},
+    "auto_mute": [],
+    "device_timeout_ms": 500,
+    "api_port": 0,
+    "level_feed_hz": 0,
+    "timeline": True,
+    "mute_ramp_ms": 0,
+    "silence_mute_s": 0,
+    "silence_floor_db": -50
 }
 
 class _Settings:
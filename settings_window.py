@@ -78,6 +78,11 @@ class SettingsWindow(QDialog):
         self.corner_combo.setCurrentText(self.settings.get('status_corner', 'top-right'))
         self.corner_combo.setToolTip("Choose the screen corner for the status icon")
         icon_layout.addRow(QLabel('Status Icon Corner:'), self.corner_combo)
+        self.screens_combo = QComboBox()
+        self.screens_combo.addItems(['primary', 'all', 'focused'])
+        self.screens_combo.setCurrentText(self.settings.get('status_screens', 'primary'))
+        self.screens_combo.setToolTip("Show the status icon on the primary screen, on every screen, or on the screen of the focused window")
+        icon_layout.addRow(QLabel('Status Icon Screens:'), self.screens_combo)
         icon_group.setLayout(icon_layout)
         main_layout.addWidget(icon_group)
 
@@ -121,6 +126,7 @@ class SettingsWindow(QDialog):
         self.settings['hotkey_unmute'] = self.unmute_edit.text()
         self.settings['hotkey_toggle'] = self.toggle_edit.text()
         self.settings['status_corner'] = self.corner_combo.currentText()
+        self.settings['status_screens'] = self.screens_combo.currentText()
         self.settings['start_on_startup'] = self.startup_checkbox.isChecked()
         self.settings['show_level'] = self.level_checkbox.isChecked()
         
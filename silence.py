@@ -0,0 +1,131 @@
+import logging
+import math
+import threading
+import time
+
+from audio_control import AudioController
+from commons import MicStatus
+from settings import Settings
+
+# Threshold never goes below this, so a perfectly silent input still counts as silence
+DEFAULT_FLOOR_DB = -50.0
+# How far above the background level, at least, a sample has to be to count as voice
+SPEECH_MARGIN_DB = 10.0
+# Background noise up to this many standard deviations above its mean is not voice either
+NOISE_SPREAD = 3.0
+# Samples within this many standard deviations of the background, clamped to
+# MIN_GATE_DB..MAX_GATE_DB, adapt it with BACKGROUND_TAU. Further ones count as if
+# they were at the gate, so no outlier can blow the spread up
+GATE_SPREAD = 2.0
+MIN_GATE_DB = 3.0
+MAX_GATE_DB = 6.0
+BACKGROUND_TAU = 30.0
+# Louder samples raise it only over BACKGROUND_RISE_TAU: a room that got noisier
+# is learnt in minutes, speech barely moves it
+BACKGROUND_RISE_TAU = 120.0
+MIN_DB = -100.0
+
+
+def to_db(level: float) -> float:
+    return 20 * math.log10(level) if level > 1e-5 else MIN_DB
+
+
+# Quiet means below a time-weighted running mean and variance of the background, in dB
+class SilenceDetector:
+    def __init__(self, timeout: float, floor_db: float=DEFAULT_FLOOR_DB):
+        self.timeout = timeout
+        self.floor_db = floor_db
+        # Until it has been measured the room is assumed quiet, voice then reads as voice
+        self.mean = floor_db - SPEECH_MARGIN_DB
+        self.var = 0.0
+        self._last: float | None = None
+        self._quiet_since = 0.0
+
+    def threshold(self) -> float:
+        return max(self.floor_db, self.mean + max(SPEECH_MARGIN_DB, NOISE_SPREAD * math.sqrt(self.var)))
+
+    def arm(self, now: float):
+        # The silence timer restarts, the background estimate is kept
+        self._last = None
+        self._quiet_since = now
+
+    def quiet_for(self, now: float) -> float:
+        return now - self._quiet_since
+
+    def feed(self, level: float, now: float) -> bool:
+        # True once the input has been quiet for `timeout` seconds
+        db = to_db(level)
+        dt = 0.0 if self._last is None else now - self._last
+        self._last = now
+
+        if db >= self.threshold():
+            self._quiet_since = now
+
+        gate = min(MAX_GATE_DB, max(MIN_GATE_DB, GATE_SPREAD * math.sqrt(self.var)))
+        diff = min(gate, max(-gate, db - self.mean))
+        weight = 1 - math.exp(-dt / (BACKGROUND_TAU if db - self.mean <= gate else BACKGROUND_RISE_TAU))
+        self.mean += weight * diff
+        self.var = (1 - weight) * (self.var + weight * diff * diff)
+        return now - self._quiet_since >= self.timeout
+
+
+# Fed by the controller's level samples, only runs while the main microphone is unmuted
+class SilenceMuter:
+    def __init__(self, controller=None):
+        self.logger = logging.getLogger('SilenceMuter')
+        self.controller = AudioController if controller is None else controller
+        self.detector: SilenceDetector | None = None
+        self.timeout = 0
+        self.floor_db = DEFAULT_FLOOR_DB
+        self._armed = False
+        self._lock = threading.Lock()
+        self.mutes = 0
+        Settings.add_listener(self.update_settings)
+
+    def update_settings(self, settings):
+        timeout = settings.get('silence_mute_s', 0)
+        floor_db = settings.get('silence_floor_db', DEFAULT_FLOOR_DB)
+        if timeout == self.timeout and floor_db == self.floor_db:
+            return
+        self.stop()
+        if timeout > 0:
+            self.start(timeout, floor_db)
+
+    def start(self, timeout: float, floor_db: float=DEFAULT_FLOOR_DB):
+        if self.detector is not None:
+            return
+        self.timeout, self.floor_db = timeout, floor_db
+        self.detector = SilenceDetector(timeout, floor_db)
+        self._armed = False
+        self.controller.add_status_listener(self.on_status)
+        self.controller.add_level_listener(self.on_level)
+        self.logger.info('Muting after %ss below %sdB', timeout, floor_db)
+
+    def stop(self):
+        if self.detector is None:
+            return
+        self.controller.remove_level_listener(self.on_level)
+        self.controller.remove_status_listener(self.on_status)
+        self.detector = None
+        self.timeout = 0
+        self.logger.info('Stopped muting on silence')
+
+    def on_status(self, _status: MicStatus):
+        # Every role reports, the main microphone decides; only its change to unmuted restarts the timer
+        armed = self.controller.status() == MicStatus.UNMUTED
+        with self._lock:
+            detector = self.detector
+            if detector is not None and armed and not self._armed:
+                detector.arm(time.monotonic())
+            self._armed = armed
+
+    def on_level(self, level: float):
+        with self._lock:
+            detector = self.detector
+            # Muted devices read as 0, which is not the room
+            if detector is None or not self._armed or not detector.feed(level, time.monotonic()):
+                return
+            self._armed = False
+            self.mutes += 1
+        self.logger.info('No voice for %ss (threshold %.1fdB), muting', self.timeout, detector.threshold())
+        self.controller.mute()
@@ -0,0 +1,258 @@
+"""In-process stand-in for the parts of pycaw/comtypes Better Mute uses.
+
+Selected by `BETTER_MUTE_BACKEND=sim`. It exposes the same names
+`audio_control` imports from pycaw and comtypes, plus `SYSTEM`, a
+`SimAudioSystem` that benchmarks and tools use to add endpoints, switch
+defaults, inject latency and count calls.
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+from enum import Enum
+from typing import Dict, List
+
+
+class EDataFlow(Enum):
+    eRender  = 0
+    eCapture = 1
+    eAll     = 2
+
+
+class ERole(Enum):
+    eConsole        = 0
+    eMultimedia     = 1
+    eCommunications = 2
+
+
+CLSCTX_ALL = 23
+COINIT_MULTITHREADED = 0
+
+
+def CoInitializeEx(flags=None):
+    pass
+
+
+def CoUninitialize():
+    pass
+
+
+class COMError(Exception):
+    pass
+
+
+class GUID:
+    def __init__(self, name: str | None=None):
+        self._name = (name or '{%s}' % uuid.uuid4()).upper()
+
+    def __eq__(self, value: object) -> bool:
+        return isinstance(value, GUID) and value._name == self._name
+
+    def __hash__(self) -> int:
+        return hash(self._name)
+
+    def __repr__(self) -> str:
+        return 'GUID("%s")' % self._name
+
+
+class COMObject:
+    def __init__(self):
+        pass
+
+
+class IAudioEndpointVolumeCallback:
+    pass
+
+
+class IMMNotificationClient:
+    pass
+
+
+class IMMDevice:
+    pass
+
+
+class IAudioEndpointVolume:
+    _iid_ = GUID('{5CDF2C82-841E-4546-9722-0CF74078229A}')
+
+
+class IAudioMeterInformation:
+    _iid_ = GUID('{C02216F6-8C67-4B5B-9D00-D008E73E0064}')
+
+
+class AUDIO_VOLUME_NOTIFICATION_DATA:
+    def __init__(self, guidEventContext: GUID, bMuted: int, fMasterVolume: float):
+        self.guidEventContext = guidEventContext
+        self.bMuted = bMuted
+        self.fMasterVolume = fMasterVolume
+        self.nChannels = 1
+
+
+class _Pointer:
+    def __init__(self, contents):
+        self.contents = contents
+
+
+# A capture endpoint acting as IMMDevice, IAudioEndpointVolume and IAudioMeterInformation at once
+class SimEndpoint:
+    def __init__(self, system: 'SimAudioSystem', id: str, muted: bool=False, volume: float=1.0, peak: float=0.0):
+        self.system = system
+        self.id = id
+        self.muted = muted
+        self.volume = volume
+        self.peak = peak
+        # method name -> seconds to block before answering
+        self.delays: Dict[str, float] = {}
+        self._callbacks = []
+
+    def _call(self, name: str):
+        self.system._count(name)
+        delay = self.delays.get(name) or self.delays.get('*')
+        if delay:
+            time.sleep(delay)
+
+    # IMMDevice
+    def GetId(self) -> str:
+        self._call('GetId')
+        return self.id
+
+    def Activate(self, iid, clsctx, params):
+        self._call('Activate')
+        return self
+
+    def QueryInterface(self, interface):
+        return self
+
+    # IAudioEndpointVolume
+    def GetMute(self) -> int:
+        self._call('GetMute')
+        return int(self.muted)
+
+    def SetMute(self, muted: int, context: GUID | None=None):
+        self._call('SetMute')
+        changed = bool(muted) != self.muted
+        self.muted = bool(muted)
+        if changed:
+            self._notify(context)
+
+    def GetMasterVolumeLevelScalar(self) -> float:
+        self._call('GetMasterVolumeLevelScalar')
+        return self.volume
+
+    def SetMasterVolumeLevelScalar(self, level: float, context: GUID | None=None):
+        self._call('SetMasterVolumeLevelScalar')
+        changed = level != self.volume
+        self.volume = level
+        if changed:
+            self._notify(context)
+
+    def RegisterControlChangeNotify(self, callback):
+        self._call('RegisterControlChangeNotify')
+        self._callbacks.append(callback)
+
+    def UnregisterControlChangeNotify(self, callback):
+        self._call('UnregisterControlChangeNotify')
+        self._callbacks.remove(callback)
+
+    # IAudioMeterInformation
+    def GetPeakValue(self) -> float:
+        self._call('GetPeakValue')
+        return self.peak
+
+    def _notify(self, context: GUID | None):
+        data = _Pointer(AUDIO_VOLUME_NOTIFICATION_DATA(context or GUID(), int(self.muted), self.volume))
+        for callback in list(self._callbacks):
+            callback.OnNotify(data)
+
+    def external_set_mute(self, muted: bool, context: GUID | None=None):
+        # A mute change made by another application
+        self.muted = muted
+        self._notify(context)
+
+    def callback_count(self) -> int:
+        return len(self._callbacks)
+
+    def __repr__(self) -> str:
+        return '<SimEndpoint id=%s muted=%s>' % (self.id, self.muted)
+
+
+class SimEnumerator:
+    def __init__(self, system: 'SimAudioSystem'):
+        self.system = system
+
+    def GetDefaultAudioEndpoint(self, flow: int, role: int) -> SimEndpoint:
+        self.system._count('GetDefaultAudioEndpoint')
+        dev = self.system.defaults.get(ERole(role)) if flow == EDataFlow.eCapture.value else None
+        if dev is None:
+            raise COMError('Element not found')
+        return dev
+
+    def RegisterEndpointNotificationCallback(self, client):
+        self.system._count('RegisterEndpointNotificationCallback')
+        if client not in self.system.clients:
+            self.system.clients.append(client)
+
+    def UnregisterEndpointNotificationCallback(self, client):
+        self.system._count('UnregisterEndpointNotificationCallback')
+        self.system.clients.remove(client)
+
+
+class SimAudioSystem:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.calls: Counter = Counter()
+        self.endpoints: Dict[str, SimEndpoint] = {}
+        self.defaults: Dict[ERole, SimEndpoint | None] = {role: None for role in ERole}
+        self.clients: List = []
+        self.enumerator = SimEnumerator(self)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+
+    def add_device(self, id: str | None=None, **kwargs) -> SimEndpoint:
+        if id is None:
+            self._next_id += 1
+            id = '{0.0.1.00000000}.{%s}' % uuid.UUID(int=self._next_id)
+        dev = SimEndpoint(self, id, **kwargs)
+        self.endpoints[id] = dev
+        return dev
+
+    def remove_device(self, id: str, notify: bool=True):
+        dev = self.endpoints.pop(id)
+        for role, default in self.defaults.items():
+            if default is dev:
+                self.set_default(role, None, notify=notify)
+
+    def set_default(self, role: ERole, id: str | None, notify: bool=True):
+        self.defaults[role] = None if id is None else self.endpoints[id]
+        if notify:
+            for client in list(self.clients):
+                client.OnDefaultDeviceChanged(EDataFlow.eCapture.value, role.value, id)
+
+    def set_default_all(self, id: str | None, notify: bool=True):
+        for role in ERole:
+            self.set_default(role, id, notify=notify)
+
+    def reset(self, devices: int=1) -> List[SimEndpoint]:
+        # Fresh system with `devices` endpoints spread over the roles, communications first
+        self.calls.clear()
+        self.endpoints.clear()
+        self.clients.clear()
+        self._next_id = 0
+        devs = [self.add_device() for _ in range(devices)]
+        roles = [ERole.eCommunications, ERole.eMultimedia, ERole.eConsole]
+        for i, role in enumerate(roles):
+            self.defaults[role] = devs[min(i, len(devs) - 1)] if devs else None
+        return devs
+
+
+class AudioUtilities:
+    @staticmethod
+    def GetDeviceEnumerator() -> SimEnumerator:
+        return SYSTEM.enumerator
+
+
+SYSTEM = SimAudioSystem()
+SYSTEM.reset()
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import threading
+from getpass import getuser
+from pathlib import Path
+from tempfile import gettempdir
+from typing import Dict
+
+VERSION = 1
+# Changes close together are written once
+SAVE_DELAY = 1.0
+
+
+def default_path() -> Path:
+    return Path(gettempdir()) / f'better-mute-{getuser()}.state.json'
+
+
+def default_ramps_path() -> Path:
+    return Path(gettempdir()) / f'better-mute-{getuser()}.ramps.json'
+
+
+# Last known device id and status per role, written SAVE_DELAY after a change or by save()
+class StateCache:
+    def __init__(self, path: Path | None=None):
+        self.logger = logging.getLogger('StateCache')
+        self.path = default_path() if path is None else Path(path)
+        self._roles: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self.saves = 0
+
+    def load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != VERSION:
+                raise ValueError('version %s' % data.get('version'))
+            roles = {name: {'id': entry['id'], 'status': entry['status']} for name, entry in data['roles'].items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.logger.warning('Ignoring unreadable state cache %s: %s', self.path, e)
+            return {}
+        with self._lock:
+            self._roles = {name: dict(entry) for name, entry in roles.items()}
+        return roles
+
+    def record(self, role: str, dev_id: str | None, status: str):
+        entry = {'id': dev_id, 'status': status}
+        with self._lock:
+            if self._roles.get(role) == entry:
+                return
+            self._roles[role] = entry
+            if self._timer is None:
+                self._timer = threading.Timer(SAVE_DELAY, self.save)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def save(self):
+        with self._lock:
+            timer, self._timer = self._timer, None
+            data = {'version': VERSION, 'roles': dict(self._roles)}
+        if timer is not None:
+            timer.cancel()
+        temp = self.path.with_name(self.path.name + '.tmp')
+        try:
+            with open(temp, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp, self.path)
+            self.saves += 1
+        except OSError as e:
+            self.logger.warning('Could not save the state cache to %s', self.path, exc_info=e)
+
+
+# Volumes of microphones in the middle of a ramp, rewritten in place so the next load() can restore them
+class RampVolumes:
+    def __init__(self, path: Path | None=None):
+        self.logger = logging.getLogger('RampVolumes')
+        self.path = default_ramps_path() if path is None else Path(path)
+        self._volumes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._fd: int | None = None
+        self._size = 0
+
+    def load(self) -> Dict[str, float]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != VERSION:
+                raise ValueError('version %s' % data.get('version'))
+            volumes = {str(dev_id): float(volume) for dev_id, volume in data['volumes'].items()}
+        except FileNotFoundError:
+            volumes = {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.logger.warning('Ignoring unreadable ramp volumes %s: %s', self.path, e)
+            volumes = {}
+        with self._lock:
+            self._volumes = volumes
+        return dict(volumes)
+
+    def begin(self, dev_id: str, volume: float):
+        with self._lock:
+            if self._volumes.get(dev_id) == volume:
+                return
+            self._volumes[dev_id] = volume
+            self._save()
+
+    def end(self, dev_id: str):
+        with self._lock:
+            if self._volumes.pop(dev_id, None) is None:
+                return
+            self._save()
+
+    def _save(self):
+        data = json.dumps({'version': VERSION, 'volumes': self._volumes}).encode()
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._size = os.fstat(self._fd).st_size
+            # Never shorter than before, a kill between two calls cannot leave half a file
+            data = data.ljust(self._size)
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            os.write(self._fd, data)
+            self._size = len(data)
+        except OSError as e:
+            self.logger.warning('Could not save the ramp volumes to %s', self.path, exc_info=e)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
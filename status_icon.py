@@ -1,9 +1,12 @@
-from PySide6.QtWidgets import QWidget
-from PySide6.QtCore import Qt, QRect, QTimer, Slot
-from PySide6.QtGui import QPainter
+from PySide6.QtWidgets import QApplication, QWidget
+from PySide6.QtCore import QObject, Qt, QRectF, QTimer, Signal, Slot
+from PySide6.QtGui import QColor, QPainter, QPixmap, QScreen
 import logging
+from typing import Dict, List, Tuple
 
+import tracing
 from audio_control import AudioController, MicStatus
+from foreground import ForegroundWatcher
 from settings import Settings
 
 
@@ -14,29 +17,49 @@ CORNER_POSITIONS = {
     'bottom-right': (1, 1),
 }
 
+# Which screens get an indicator
+SCREEN_MODES = ('primary', 'all', 'focused')
+
 MARGIN = 2
 DOT_SIZE = 10
+MAX_WIDTH = DOT_SIZE * 10
 LEVEL_POLLING_INTERVAL_MS = 1
 
-class StatusIcon(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.logger = logging.getLogger('StatusIcon')
-        
-        self.status = MicStatus.DISABLED
-        self.corner = (1, 0)
-        self.level = 0.0
-        self.show_level = False
+# (rgba, width, device pixel ratio) -> rendered dot, shared by every screen's indicator
+_PIXMAPS: Dict[Tuple[int, int, float], QPixmap] = {}
 
-        self.level_timer = QTimer(self, interval=LEVEL_POLLING_INTERVAL_MS)
-        self.level_timer.timeout.connect(self.fetch_level)
+
+def dot_pixmap(color: QColor, width: int, dpr: float) -> QPixmap:
+    key = (color.rgba(), width, dpr)
+    pixmap = _PIXMAPS.get(key)
+    if pixmap is None:
+        pixmap = QPixmap(round(width * dpr), round(DOT_SIZE * dpr))
+        pixmap.setDevicePixelRatio(dpr)
+        pixmap.fill(Qt.transparent)
+        with QPainter(pixmap) as painter:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setBrush(color)
+            painter.setPen(Qt.NoPen)
+            painter.drawRoundedRect(QRectF(0, 0, width, DOT_SIZE), DOT_SIZE / 2, DOT_SIZE / 2)
+        _PIXMAPS[key] = pixmap
+    return pixmap
+
+
+# The indicator on one screen, only moved by place() and repainted from a shared pixmap
+class ScreenDot(QWidget):
+    def __init__(self, indicator: 'StatusIcon', screen: QScreen):
+        super().__init__()
+        self.indicator = indicator
+        self.target = screen
+        self.right = True
+        self.places = 0
 
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.Tool | Qt.WindowType.WindowDoesNotAcceptFocus)
         self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setScreen(screen)
+        self._watch(screen, True)
 
-        AudioController.add_status_listener(self.update_status)
-        Settings.add_listener(self.update_settings)
-        
+        self.place()
         self.show()
 
         # Try to make the window click-through (optional, Windows only)
@@ -48,7 +71,141 @@ class StatusIcon(QWidget):
         except Exception:
             pass
 
-    def update_status(self, status: MicStatus):
+    def _watch(self, screen: QScreen, on: bool):
+        for signal in (screen.geometryChanged, screen.logicalDotsPerInchChanged, screen.physicalDotsPerInchChanged):
+            if on:
+                signal.connect(self.place)
+            else:
+                signal.disconnect(self.place)
+
+    def move_to(self, screen: QScreen):
+        # Keeps the native window, only its position changes
+        self._watch(self.target, False)
+        self.target = screen
+        self.setScreen(screen)
+        self._watch(screen, True)
+        self.place()
+
+    @Slot()
+    def place(self, *_):
+        area = self.target.geometry()
+        self.places += 1
+        x_factor, y_factor = CORNER_POSITIONS.get(self.indicator.corner, (1, 0))
+        w, h = MAX_WIDTH + MARGIN * 2, DOT_SIZE + MARGIN * 2
+        x = area.left() + MARGIN if x_factor == 0 else area.right() - w - MARGIN
+        y = area.top() + MARGIN if y_factor == 0 else area.bottom() - h - MARGIN
+        self.right = x_factor == 1
+        self.setFixedSize(w, h)
+        self.move(x, y)
+
+    def paintEvent(self, _):
+        with tracing.adopt(self.indicator.paint_cid), tracing.span('status_icon.paint'), QPainter(self) as painter:
+            width = self.indicator.width if self is self.indicator.meter else DOT_SIZE
+            pixmap = dot_pixmap(MicStatus.toColor(self.indicator.status), width, self.devicePixelRatioF())
+            # A level grows the dot away from its corner
+            painter.drawPixmap(MAX_WIDTH - width if self.right else 0, 0, pixmap)
+
+
+# One dot per screen in use, only the one on the focused or primary screen shows the level
+class StatusIcon(QObject):
+    # Status listeners are called from COM and loader threads, the signal queues them onto the GUI thread
+    # along with the correlation id of the action behind the change
+    status_changed = Signal(object, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.logger = logging.getLogger('StatusIcon')
+
+        self.status = MicStatus.DISABLED
+        self.corner = 'top-right'
+        self.level = 0.0
+        self.width = DOT_SIZE
+        self.show_level = False
+        self.mode = 'primary'
+        self.focused: str | None = None
+        # Correlation id of the status change the next repaint shows
+        self.paint_cid = 0
+        self.dots: Dict[QScreen, ScreenDot] = {}
+        # The dot that shows the level
+        self.meter: ScreenDot | None = None
+
+        self.level_timer = QTimer(self, interval=LEVEL_POLLING_INTERVAL_MS)
+        self.level_timer.timeout.connect(self.fetch_level)
+
+        app = QApplication.instance()
+        app.screenAdded.connect(self.sync_screens)
+        app.screenRemoved.connect(self.on_screen_removed)
+        app.primaryScreenChanged.connect(self.sync_screens)
+
+        self.status_changed.connect(self.update_status)
+        self.sync_screens()
+        AudioController.add_status_listener(self._on_status)
+        Settings.add_listener(self.update_settings)
+
+    def screens(self, removed: QScreen | None=None) -> List[QScreen]:
+        app = QApplication.instance()
+        screens = [screen for screen in app.screens() if screen is not removed]
+        if self.mode == 'all':
+            return screens
+        if self.mode == 'focused':
+            for screen in screens:
+                if screen.name() == self.focused:
+                    return [screen]
+        primary = app.primaryScreen()
+        return [] if primary is None or primary is removed else [primary]
+
+    @Slot(QScreen)
+    def on_screen_removed(self, screen: QScreen):
+        # Still listed by the application while the signal is delivered
+        self.sync_screens(removed=screen)
+
+    @Slot()
+    def sync_screens(self, *_, removed: QScreen | None=None):
+        wanted = self.screens(removed)
+        spare = [self.dots.pop(screen) for screen in list(self.dots) if screen not in wanted]
+        for screen in wanted:
+            if screen in self.dots:
+                continue
+            if spare:
+                dot = spare.pop()
+                dot.move_to(screen)
+                self.dots[screen] = dot
+            else:
+                self.dots[screen] = ScreenDot(self, screen)
+        for dot in spare:
+            dot.hide()
+            dot.deleteLater()
+        self._pick_meter()
+        self.logger.debug('Showing the indicator on %s', [screen.name() for screen in self.dots])
+
+    def _pick_meter(self):
+        primary = QApplication.instance().primaryScreen()
+        meter = next((dot for screen, dot in self.dots.items() if screen.name() == self.focused), None)
+        if meter is None:
+            meter = self.dots.get(primary, next(iter(self.dots.values()), None))
+        if meter is not self.meter:
+            previous, self.meter = self.meter, meter
+            for dot in (previous, meter):
+                if dot is not None and dot in self.dots.values():
+                    dot.update()
+
+    def on_foreground(self, monitor: str):
+        self.focused = monitor
+        if self.mode == 'focused':
+            self.sync_screens()
+        else:
+            self._pick_meter()
+
+    def _on_status(self, status: MicStatus):
+        self.status_changed.emit(status, tracing.current())
+
+    def update_status(self, status: MicStatus, cid: int=0):
+        with tracing.adopt(cid), tracing.span('status_icon.update_status', status=status.name):
+            self._update_status(status, cid)
+
+    def _update_status(self, status: MicStatus, cid: int=0):
+        # Every role reports, and a warm start is confirmed with the same status, repaint only on a change
+        changed = status != self.status
         self.status = status
         self.logger.debug('update_status(%s)', self.status)
 
@@ -57,52 +214,71 @@ class StatusIcon(QWidget):
         elif not self.level_timer.isActive() and self.show_level and status == MicStatus.UNMUTED:
             self.level_timer.start()
 
-        self.update()
+        if changed:
+            self.paint_cid = cid
+            self.update()
 
     def update_level(self, level: float):
         self.level = level
         # self.logger.debug('update_level() -> level=%.2f', self.level)
-        self.update()
-    
+        self._apply_level()
+
     @Slot()
     def fetch_level(self):
         self.level = AudioController.level()
-        self.update()
+        self._apply_level()
+
+    def _apply_level(self):
+        # The dot only changes with its width, most samples repaint nothing
+        width = min(MAX_WIDTH, max(DOT_SIZE, int(DOT_SIZE * 10 * self.level)))
+        if width == self.width:
+            return
+        self.width = width
+        self.paint_cid = 0
+        if self.meter is not None:
+            self.meter.update()
 
     def update_settings(self, settings):
-        self.corner = settings.get('status_corner', 'top-right')
+        corner = settings.get('status_corner', 'top-right')
+        mode = settings.get('status_screens', 'primary')
+        if mode not in SCREEN_MODES:
+            self.logger.warning('Unknown status_screens %r, using primary', mode)
+            mode = 'primary'
 
         self.show_level = settings.get('show_level', False)
-        
+
         if self.show_level and not self.level_timer.isActive():
             self.level_timer.start()
         elif not self.show_level and self.level_timer.isActive():
             self.level_timer.stop()
             self.level = 0.0
-        
-        self.logger.debug('update_settings({status_corner: %s, show_level: %s})', self.corner, self.show_level)
+            self.width = DOT_SIZE
+
+        if corner != self.corner:
+            self.corner = corner
+            for dot in self.dots.values():
+                dot.place()
+
+        if mode != self.mode:
+            # The level follows the focused screen when there is more than one dot to choose from
+            if mode != 'primary':
+                ForegroundWatcher.add_listener(self.on_foreground)
+            else:
+                ForegroundWatcher.remove_listener(self.on_foreground)
+            self.mode = mode
+            self.sync_screens()
+
+        self.logger.debug('update_settings({status_corner: %s, status_screens: %s, show_level: %s})', self.corner, self.mode, self.show_level)
         self.update()
 
-    def paintEvent(self, _):
-        with QPainter(self) as painter:
-            # Colors
-            color = MicStatus.toColor(self.status)
-            screen = self.screen().geometry()
+    def update(self):
+        for dot in self.dots.values():
+            dot.update()
 
-            painter.setRenderHint(QPainter.Antialiasing)
-            painter.setBrush(color)
-            painter.setPen(Qt.NoPen)
-            
-            # Size
-            width = max(DOT_SIZE, int(DOT_SIZE * 10 * self.level))
-            self.setFixedSize(width + MARGIN * 2, DOT_SIZE + MARGIN * 2)
-
-            # Position
-            x_factor, y_factor = CORNER_POSITIONS.get(self.corner, (1, 0))
-            x = screen.left() + MARGIN if x_factor == 0 else screen.right() - self.width() - MARGIN
-            y = screen.top() + MARGIN if y_factor == 0 else screen.bottom() - self.height() - MARGIN
-            self.move(x, y)
-            
-            # Shape
-            rect = QRect(0, 0, width, DOT_SIZE)
-            painter.drawRoundedRect(rect, DOT_SIZE  / 2, DOT_SIZE / 2)
+    def repaint(self):
+        for dot in self.dots.values():
+            dot.repaint()
+
+    def hide(self):
+        for dot in self.dots.values():
+            dot.hide()
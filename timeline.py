@@ -0,0 +1,352 @@
+"""Persistent timeline of mute status changes and device switches, and reports over it.
+
+One file per UTC day, `YYYY-MM-DD.tl`, in the timeline directory (little endian):
+    header: b'BMTL', version u8, 11 pad bytes
+    record: t u64 (unix ns), kind u8, role u8, status u8, 1 pad byte, device u32
+
+Records are fixed size and in time order, so a time is found by bisecting
+the memory-mapped file; the file names index the days. Device ids are
+stored as their crc32, `devices.txt` maps them back. Each day starts with
+the statuses and devices in effect at midnight, so reading a day needs
+nothing from the days before it.
+
+Recording only appends tuples to a list, a writer thread packs and writes
+them once per FLUSH_INTERVAL.
+"""
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+MAGIC = b'BMTL'
+VERSION = 1
+HEADER = struct.Struct('<4sB11x')
+RECORD = struct.Struct('<QBBBxI')
+NS_PER_DAY = 86400 * 10**9
+SUFFIX = '.tl'
+# Set for an engine process, which then records instead of the application
+ENV = 'BETTER_MUTE_TIMELINE'
+DEVICES_FILE = 'devices.txt'
+
+FLUSH_INTERVAL = 1.0
+# Written when nothing else was, so a crash loses at most this much of the last interval
+MARK_INTERVAL = 600.0
+
+START   = 1
+STOP    = 2
+STATUS  = 3  # role, status = MicStatus value
+DEVICE  = 4  # role, device = crc32 of the id, 0 when there is no device
+MARK    = 5
+
+# Values of commons.MicStatus and ERole, without importing Qt or COM for a report
+STATUS_NAMES = {0: 'DISABLED', 1: 'UNMUTED', 2: 'INUSE', 3: 'MUTED'}
+COMMUNICATIONS = 2
+
+
+def default_directory() -> Path:
+    base = os.environ.get('LOCALAPPDATA') or Path.home() / '.local' / 'share'
+    return Path(base) / 'better-mute' / 'timeline'
+
+
+def device_key(dev_id: str | None) -> int:
+    return zlib.crc32(dev_id.encode('utf-8')) if dev_id else 0
+
+
+def day_name(day: int) -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime(day * 86400)) + SUFFIX
+
+
+class TimelineWriter:
+    def __init__(self, directory: Path, flush_interval: float=FLUSH_INTERVAL):
+        self.logger = logging.getLogger('TimelineWriter')
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[int, int, int, int, int]] = []
+        self._names: List[str] = []
+        self._last_t = 0
+        self._last_write = time.monotonic()
+        # Last status per role as recorded, to drop repeats
+        self._statuses: Dict[int, int] = {}
+        self._keys = self._load_keys()
+        # Written state per (kind, role), repeated at the start of every day
+        self._state: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self._day: int | None = None
+        self._file = None
+        self._stop = threading.Event()
+        self.written = 0
+        self._append(START, 0, 0, 0)
+        self._thread = threading.Thread(target=self._run, name='TimelineWriter', daemon=True)
+        self._thread.start()
+
+    def _load_keys(self) -> set:
+        try:
+            with open(self.directory / DEVICES_FILE, encoding='utf-8') as f:
+                return {int(line.split('\t', 1)[0]) for line in f if '\t' in line}
+        except (OSError, ValueError):
+            return set()
+
+    # Status path, never touches the disk
+
+    def _append(self, kind: int, role: int, status: int, device: int, name: str | None=None):
+        with self._lock:
+            # Clock steps back are clamped, every day file stays sorted
+            t = self._last_t = max(time.time_ns(), self._last_t)
+            self._pending.append((t, kind, role, status, device))
+            if name is not None:
+                self._names.append('%d\t%s\n' % (device, name))
+
+    def status(self, role: int, status: int):
+        if self._statuses.get(role) == status:
+            return
+        self._statuses[role] = status
+        self._append(STATUS, role, status, 0)
+
+    def device(self, role: int, dev_id: str | None):
+        key = device_key(dev_id)
+        new = key and key not in self._keys
+        if new:
+            self._keys.add(key)
+        self._append(DEVICE, role, 0, key, dev_id if new else None)
+
+    # Writer thread
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            if time.monotonic() - self._last_write > MARK_INTERVAL:
+                self._append(MARK, 0, 0, 0)
+            try:
+                self.flush()
+            except OSError as e:
+                self.logger.error('Could not write the timeline to %s', self.directory, exc_info=e)
+
+    def _open(self, day: int):
+        if self._file is not None:
+            self._file.close()
+        path = self.directory / day_name(day)
+        self._file = open(path, 'ab')
+        if not self._file.tell():
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+        self._day = day
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            names, self._names = self._names, []
+        if names:
+            with open(self.directory / DEVICES_FILE, 'a', encoding='utf-8') as f:
+                f.writelines(names)
+        if not pending:
+            return
+
+        out = bytearray()
+        for record in pending:
+            t, kind, role, status, device = record
+            day = t // NS_PER_DAY
+            if day != self._day:
+                if out:
+                    self._file.write(out)
+                    out.clear()
+                self._open(day)
+                midnight = day * NS_PER_DAY
+                for (state_kind, state_role), (state_status, state_device) in self._state.items():
+                    out += RECORD.pack(midnight, state_kind, state_role, state_status, state_device)
+            if kind == START:
+                self._state.clear()
+            elif kind in (STATUS, DEVICE):
+                self._state[kind, role] = (status, device)
+            out += RECORD.pack(*record)
+        self._file.write(out)
+        self._file.flush()
+        self.written += len(pending)
+        self._last_write = time.monotonic()
+
+    def close(self):
+        self._append(STOP, 0, 0, 0)
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_writer: TimelineWriter | None = None
+
+
+def start(directory: Path | None=None) -> TimelineWriter | None:
+    global _writer
+    stop()
+    try:
+        _writer = TimelineWriter(default_directory() if directory is None else directory)
+    except OSError as e:
+        logging.getLogger('TimelineWriter').error('Could not open the timeline', exc_info=e)
+    return _writer
+
+
+def stop():
+    global _writer
+    writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+
+
+def recording() -> bool:
+    return _writer is not None
+
+
+def record_status(role: int, status: int):
+    if _writer is not None:
+        _writer.status(role, status)
+
+
+def record_device(role: int, dev_id: str | None):
+    if _writer is not None:
+        _writer.device(role, dev_id)
+
+
+@dataclass
+class Report:
+    since: int
+    until: int
+    durations: Counter = field(default_factory=Counter)
+    changes: int = 0
+    switches: Counter = field(default_factory=Counter)
+    devices: Dict[int, str] = field(default_factory=dict)
+    records: int = 0
+
+
+class _Totals:
+    def __init__(self, report: Report, role: int):
+        self.report = report
+        self.role = role
+        self.status: int | None = None
+        self.status_at = 0
+        self.device: int | None = None
+        self.last = 0
+
+    def close(self, t: int):
+        if self.status is not None:
+            start, end = max(self.status_at, self.report.since), min(t, self.report.until)
+            if end > start:
+                self.report.durations[self.status] += end - start
+
+    def add(self, t: int, kind: int, role: int, status: int, device: int):
+        counted = t >= self.report.since
+        if kind == STATUS and role == self.role:
+            if status != self.status:
+                self.close(t)
+                if counted and self.status is not None:
+                    self.report.changes += 1
+                self.status, self.status_at = status, t
+        elif kind == DEVICE and role == self.role:
+            if counted and self.device is not None and device != self.device:
+                self.report.switches[device] += 1
+            self.device = device
+        elif kind == STOP:
+            self.close(t)
+            self.status = self.device = None
+        elif kind == START:
+            # Without a STOP the previous run crashed, it is counted up to its last record
+            self.close(self.last)
+            self.status = self.device = None
+        self.last = t
+
+
+def _bisect(buf, count: int, t: int) -> int:
+    # Index of the first record after t
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if RECORD.unpack_from(buf, HEADER.size + mid * RECORD.size)[0] <= t:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _scan(buf, end: int, totals: _Totals):
+    view = memoryview(buf)[HEADER.size:HEADER.size + end * RECORD.size]
+    for record in RECORD.iter_unpack(view):
+        totals.add(*record)
+
+
+def report(directory: Path | None=None, since: int=0, until: int | None=None, role: int=COMMUNICATIONS) -> Report:
+    directory = default_directory() if directory is None else Path(directory)
+    until = time.time_ns() if until is None else until
+    result = Report(since=since, until=until)
+    totals = _Totals(result, role)
+    first_day, last_day = day_name(since // NS_PER_DAY), day_name(until // NS_PER_DAY)
+
+    cut = False
+    paths = sorted(p for p in directory.glob('*' + SUFFIX) if first_day <= p.name <= last_day) if directory.exists() else []
+    for path in paths:
+        if path.stat().st_size < HEADER.size + RECORD.size:
+            continue
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if HEADER.unpack_from(buf) != (MAGIC, VERSION):
+                continue
+            # A record cut short by a crash is ignored
+            count = (len(buf) - HEADER.size) // RECORD.size
+            end = _bisect(buf, count, until) if path.name == last_day else count
+            cut = end < count
+            _scan(buf, end, totals)
+            result.records += end
+    # The interval still open goes on past `until`, or is counted up to the last record,
+    # at most MARK_INTERVAL behind a running instance
+    totals.close(until if cut else totals.last)
+
+    try:
+        with open(directory / DEVICES_FILE, encoding='utf-8') as f:
+            for line in f:
+                key, _, name = line.rstrip('\n').partition('\t')
+                result.devices[int(key)] = name
+    except (OSError, ValueError):
+        pass
+    return result
+
+
+def parse_since(text: str) -> int:
+    # 7d, 12h, 30m or an ISO date/time in local time
+    match = re.fullmatch(r'(\d+)([dhm])', text.strip())
+    if match:
+        unit = {'d': 'days', 'h': 'hours', 'm': 'minutes'}[match.group(2)]
+        moment = datetime.now(timezone.utc) - timedelta(**{unit: int(match.group(1))})
+    else:
+        try:
+            moment = datetime.fromisoformat(text.strip()).astimezone()
+        except ValueError:
+            raise ValueError('expected e.g. 7d, 12h or 2024-05-01, got "%s"' % text)
+    return int(moment.timestamp()) * 10**9
+
+
+def format_duration(ns: int) -> str:
+    minutes = ns // (60 * 10**9)
+    return '%dh %02dm' % divmod(minutes, 60)
+
+
+def format_report(result: Report) -> str:
+    since = datetime.fromtimestamp(result.since / 1e9).strftime('%Y-%m-%d %H:%M') if result.since else 'the beginning'
+    lines = ['Communications microphone since %s' % since]
+    total = sum(result.durations.values())
+    for status, name in STATUS_NAMES.items():
+        ns = result.durations.get(status, 0)
+        if ns:
+            lines.append('  %-10s %10s  %5.1f%%' % (name, format_duration(ns), 100 * ns / total))
+    if not total:
+        lines.append('  no recorded time')
+    lines.append('Mute state changes: %d' % result.changes)
+    lines.append('Device switches: %d' % sum(result.switches.values()))
+    for key, count in result.switches.most_common():
+        lines.append('  %4d  %s' % (count, result.devices.get(key, 'no microphone' if not key else '#%08x' % key)))
+    return '\n'.join(lines)
@@ -0,0 +1,216 @@
+"""Latency spans that follow one user action across threads.
+
+A hotkey starts an `action()`, which gets a new correlation id. Spans on the
+same thread carry it, as does a span that encloses the start of the action
+on its thread. Work handed to another thread takes the id with it and runs
+under `adopt(cid)`: device guard jobs, the OnNotify of a write, the Qt
+status signal and the repaint it schedules. `export_chrome()` writes Chrome
+trace-event JSON, to be opened in chrome://tracing or https://ui.perfetto.dev.
+
+Disabled, `span()` and `action()` return one shared no-op object.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+MAX_EVENTS = 100_000
+WALL_OFFSET = time.time_ns() - time.perf_counter_ns()
+
+_enabled = False
+# (name, start ns, duration ns, thread id, correlation id, args)
+_events: deque = deque(maxlen=MAX_EVENTS)
+_threads: Dict[int, str] = {}
+_ids = itertools.count(1)
+
+
+class _Local(threading.local):
+    # The correlation id in effect, and the last action started on this thread
+    cid = 0
+    action = 0
+    action_at = 0
+
+
+_local = _Local()
+
+
+def enable(max_events: int=MAX_EVENTS):
+    global _enabled, _events
+    _events = deque(maxlen=max_events)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def now() -> int:
+    return time.perf_counter_ns()
+
+
+def from_wall(seconds: float) -> int:
+    # time.time() based timestamps, e.g. from the keyboard hook, on the span clock
+    return int(seconds * 1e9) - WALL_OFFSET
+
+
+def current() -> int:
+    return _local.cid
+
+
+def _attributed(start: int) -> int:
+    # A span without an id of its own belongs to an action started inside it on this thread
+    cid = _local.cid
+    if cid:
+        return cid
+    return _local.action if _local.action_at >= start else 0
+
+
+def record(name: str, start: int, end: int, args: dict | None=None):
+    if not _enabled:
+        return
+    thread = threading.current_thread()
+    _threads[thread.ident] = thread.name
+    _events.append((name, start, end - start, thread.ident, _attributed(start), args))
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        # The correlation id is taken at the end, a span may enclose the start of an action
+        record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class _Action(_Span):
+    __slots__ = ('cid', 'previous')
+
+    def __enter__(self):
+        self.cid = next(_ids)
+        self.previous = _local.cid
+        _local.cid = _local.action = self.cid
+        _local.action_at = time.perf_counter_ns()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        _local.cid = self.previous
+        return False
+
+
+class _Adopt:
+    __slots__ = ('cid', 'previous')
+
+    def __init__(self, cid: int):
+        self.cid = cid
+
+    def __enter__(self):
+        self.previous = _local.cid
+        _local.cid = self.cid
+        return self
+
+    def __exit__(self, *_):
+        _local.cid = self.previous
+        return False
+
+
+def adopt(cid: int):
+    # Continues an action handed over from another thread
+    if not _enabled or not cid:
+        return NULL_SPAN
+    return _Adopt(cid)
+
+
+def span(name: str, **args):
+    if not _enabled:
+        return NULL_SPAN
+    return _Span(name, args)
+
+
+def action(name: str, **args):
+    if not _enabled:
+        return NULL_SPAN
+    return _Action(name, args)
+
+
+def events(cid: int | None=None) -> List[tuple]:
+    return [e for e in list(_events) if cid is None or e[4] == cid]
+
+
+def slowest_action(name: str | None=None) -> int | None:
+    # Correlation id of the action whose spans cover the longest time, from first start to last end
+    extent: Dict[int, List[int]] = {}
+    roots = set()
+    for event_name, start, duration, _, cid, _ in list(_events):
+        if not cid:
+            continue
+        first, last = extent.setdefault(cid, [start, start + duration])
+        extent[cid] = [min(first, start), max(last, start + duration)]
+        if name is None or event_name == name:
+            roots.add(cid)
+    candidates = [cid for cid in extent if cid in roots]
+    return max(candidates, key=lambda cid: extent[cid][1] - extent[cid][0], default=None)
+
+
+def export_chrome(path: str, cid: int | None=None) -> int:
+    selected = events(cid)
+    origin = min((e[1] for e in selected), default=0)
+    pid = os.getpid()
+    trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+             for tid, name in _threads.items()]
+
+    flows: Dict[int, List[tuple]] = {}
+    for name, start, duration, tid, event_cid, args in selected:
+        trace.append({
+            'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+            'ts': (start - origin) / 1000, 'dur': duration / 1000,
+            'args': dict(args or {}, cid=event_cid),
+        })
+        if event_cid:
+            flows.setdefault(event_cid, []).append((start, tid))
+
+    # Arrows from span to span of one action, across threads
+    for flow_cid, steps in flows.items():
+        if len(steps) < 2:
+            continue
+        steps.sort()
+        for i, (start, tid) in enumerate(steps):
+            phase = 's' if i == 0 else 'f' if i == len(steps) - 1 else 't'
+            step = {'name': 'action', 'cat': 'action', 'ph': phase, 'id': flow_cid, 'pid': pid, 'tid': tid,
+                    'ts': (start - origin) / 1000}
+            if phase == 'f':
+                step['bp'] = 'e'
+            trace.append(step)
+
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+    return len(selected)
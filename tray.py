@@ -1,9 +1,10 @@
-from PySide6.QtCore import QCoreApplication
+from PySide6.QtCore import QCoreApplication, Signal
 from PySide6.QtWidgets import QSystemTrayIcon, QMenu
 from PySide6.QtGui import QIcon, QPixmap, QPainter, QColor, QAction
 from settings_window import SettingsWindow
 from settings import Settings
 import logging
+import tracing
 
 from audio_control import AudioController
 from commons import MicStatus
@@ -21,6 +22,8 @@ def create_dot_icon(color: QColor):
     return QIcon(pixmap)
 
 class TrayIcon(QSystemTrayIcon):
+    status_changed = Signal(object, int)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.logger = logging.getLogger('TrayIcon')
@@ -56,10 +59,18 @@ class TrayIcon(QSystemTrayIcon):
         self.setContextMenu(self.menu)
         self.setToolTip('Better Mute')
 
-        AudioController.add_status_listener(self.update_status)
+        self.status: MicStatus | None = None
+        self.status_changed.connect(self.update_status)
+        AudioController.add_status_listener(self._on_status)
         self.show()
 
-    def update_status(self, status: MicStatus):
+    def _on_status(self, status: MicStatus):
+        self.status_changed.emit(status, tracing.current())
+
+    def update_status(self, status: MicStatus, cid: int=0):
+        if status == self.status:
+            return
+        self.status = status
         # Update tray icon and tooltip based on mute status
         icon = None
         tooltip = None
@@ -78,8 +89,9 @@ class TrayIcon(QSystemTrayIcon):
                 icon = self.icon_disabled
                 tooltip = 'disabled'
 
-        self.setIcon(icon)
-        self.setToolTip('Microphone is ' + tooltip)
+        with tracing.adopt(cid), tracing.span('tray.set_icon', status=status.name):
+            self.setIcon(icon)
+            self.setToolTip('Microphone is ' + tooltip)
 
     def _on_mute(self):
         self.logger.info('Mute action triggered from tray')
@@ -0,0 +1,222 @@
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from typing import BinaryIO
+
+import api_token
+from settings import Settings
+
+FLUSH_INTERVAL = 0.05
+# Lines held while the consumer is not reading, level samples are dropped first, then superseded status changes
+MAX_PENDING = 1024
+CONNECT_TIMEOUT = 0.5
+
+
+# emit() only buffers, a behind consumer loses old levels first and the latest status last
+class NdjsonWriter:
+    def __init__(self, stream: BinaryIO, flush_interval: float=FLUSH_INTERVAL, max_pending: int=MAX_PENDING):
+        self.logger = logging.getLogger('NdjsonWriter')
+        self.stream = stream
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._pending_levels = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.closed = threading.Event()
+        self.written = 0
+        self.writes = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='NdjsonWriter', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def emit(self, event: str, **fields):
+        line = json.dumps({'t': round(time.time(), 3), 'event': event, **fields}, separators=(',', ':')).encode('utf-8') + b'\n'
+        kind = 'level' if event in ('level', 'levels') else event
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                if kind == 'level':
+                    self.dropped += 1
+                    return
+                self._make_room()
+            self._pending.append((kind, line))
+            if kind == 'level':
+                self._pending_levels += 1
+
+    def _make_room(self):
+        self.dropped += 1
+        if self._pending_levels:
+            self._pending_levels -= 1
+            self._drop_oldest('level')
+        elif not self._drop_oldest('status'):
+            self._pending.popleft()
+
+    def _drop_oldest(self, kind: str) -> bool:
+        for i, (pending_kind, _) in enumerate(self._pending):
+            if pending_kind == kind:
+                del self._pending[i]
+                return True
+        return False
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+            self._pending_levels = 0
+        if not pending:
+            return
+        self.stream.write(b''.join(line for _, line in pending))
+        self.stream.flush()
+        self.written += len(pending)
+        self.writes += 1
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.flush_interval):
+                self.flush()
+            self.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            # The consumer went away, e.g. piped into `head`
+            pass
+        self.closed.set()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# Events straight from an audio controller in this process
+class ControllerSource:
+    name = 'standalone'
+
+    def __init__(self, controller, writer: NdjsonWriter, level_hz: float, device_levels: bool=False):
+        self.controller = controller
+        self.writer = writer
+        self.level_hz = level_hz
+        self.device_levels = device_levels
+        self.closed = threading.Event()
+
+    def _on_status(self, status):
+        self.writer.emit('status', status=status.name)
+
+    def _on_level(self, level: float):
+        self.writer.emit('level', level=round(level, 4))
+
+    def _on_device_levels(self, levels: dict):
+        self.writer.emit('levels', levels={dev_id: round(level, 4) for dev_id, level in levels.items()})
+
+    def start(self):
+        self.controller.add_status_listener(self._on_status)
+        if self.level_hz > 0:
+            if self.device_levels:
+                self.controller.add_device_level_listener(self._on_device_levels, 1 / self.level_hz)
+            else:
+                self.controller.add_level_listener(self._on_level, 1 / self.level_hz)
+
+    def stop(self):
+        self.controller.remove_status_listener(self._on_status)
+        self.controller.remove_level_listener(self._on_level)
+        self.controller.remove_device_level_listener(self._on_device_levels)
+
+
+# Events from a running instance through its local API
+class InstanceSource:
+    name = 'instance'
+
+    def __init__(self, sock: socket.socket, token: str, writer: NdjsonWriter, level_hz: float):
+        self.logger = logging.getLogger('InstanceSource')
+        self.sock = sock
+        self.token = token
+        self.writer = writer
+        self.level_hz = level_hz
+        self._last_level = 0.0
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self.closed = threading.Event()
+
+    @classmethod
+    def connect(cls, writer: NdjsonWriter, level_hz: float) -> 'InstanceSource | None':
+        port = Settings.load_settings().get('api_port', 0)
+        try:
+            token = api_token.load()
+        except OSError as e:
+            logging.getLogger('InstanceSource').warning('Not attaching to the instance: %s', e)
+            return None
+        if not port or token is None:
+            return None
+        try:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=CONNECT_TIMEOUT)
+        except OSError:
+            return None
+        sock.settimeout(None)
+        return cls(sock, token, writer, level_hz)
+
+    def start(self):
+        self.sock.sendall(json.dumps({'cmd': 'auth', 'token': self.token}).encode() + b'\n')
+        if self.level_hz > 0:
+            self.sock.sendall(b'{"cmd":"levels","on":true}\n')
+        self._thread = threading.Thread(target=self._run, name='InstanceSource', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for line in self.sock.makefile('rb'):
+                message = json.loads(line)
+                event = message.get('event')
+                if event == 'status':
+                    self.writer.emit('status', status=message['status'])
+                elif event == 'level':
+                    # The instance samples at its own rate, thin it out to the one asked for
+                    now = time.monotonic()
+                    if now - self._last_level >= 1 / self.level_hz:
+                        self._last_level = now
+                        self.writer.emit('level', level=message['level'])
+        except (OSError, ValueError) as e:
+            if not self._stopping:
+                self.logger.warning('Lost connection to the running instance', exc_info=e)
+        self.writer.emit('closed')
+        self.closed.set()
+
+    def stop(self):
+        self._stopping = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def watch(level_hz: float=0.0, stream: BinaryIO | None=None, device_levels: bool=False) -> int:
+    writer = NdjsonWriter(sys.stdout.buffer if stream is None else stream)
+    # The local API only carries the main level, per-device levels need the microphones opened here
+    source = None if device_levels else InstanceSource.connect(writer, level_hz)
+    if source is None:
+        from audio_control import AudioController
+
+        AudioController.load()
+        AudioController.start()
+        source = ControllerSource(AudioController, writer, level_hz, device_levels)
+
+    writer.emit('watch', source=source.name, level_hz=level_hz)
+    writer.start()
+    source.start()
+    try:
+        while not writer.closed.wait(0.2) and not source.closed.is_set():
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.stop()
+        writer.stop()
+    return 0